@@ -0,0 +1,107 @@
+"""
+Compare the history-aware solver with the old random shuffle.
+
+    python benchmarks/bench_assignment.py
+
+Reports solve time per size and, for a simulated half year, how often members
+repeat the task they had the week before and how uneven task counts get.
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.solver import build_cost_matrix, solve_assignment  # noqa: E402
+
+
+def random_shuffle(n_members: int, required_people: list[int]) -> list[list[int]]:
+    """The previous shuffle_assignments pool logic, without the database."""
+    total_required = sum(required_people)
+    member_pool = list(range(n_members))
+    extended_pool = []
+    while len(extended_pool) < total_required:
+        random.shuffle(member_pool)
+        extended_pool.extend(member_pool)
+
+    result = []
+    pool_index = 0
+    for required in required_people:
+        result.append(extended_pool[pool_index:pool_index + required])
+        pool_index += required
+    return result
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def bench_speed():
+    print("Solve time (best of 5, ms)")
+    print(f"{'members':>8} {'slots':>6} {'history':>8} {'shuffle':>9} {'solver':>9}")
+    rng = np.random.default_rng(0)
+    for n_members, n_tasks, per_task in [(6, 4, 1), (100, 20, 2), (1_000, 200, 2), (10_000, 500, 2)]:
+        required = [per_task] * n_tasks
+        n_history = n_members * 26
+        h_members = rng.integers(0, n_members, n_history)
+        h_tasks = rng.integers(0, n_tasks, n_history)
+        h_ages = rng.integers(1, 27, n_history)
+
+        def solver():
+            cost = build_cost_matrix(n_members, n_tasks, h_members, h_tasks, h_ages)
+            solve_assignment(cost, required, rng)
+
+        print(
+            f"{n_members:>8} {sum(required):>6} {n_history:>8} "
+            f"{timed(lambda: random_shuffle(n_members, required)):>9.2f} {timed(solver):>9.2f}"
+        )
+
+
+def simulate(strategy: str, n_members: int, n_tasks: int, weeks: int) -> tuple[float, float]:
+    """Return (share of repeated tasks week-over-week, std of per-member task counts)."""
+    rng = np.random.default_rng(1)
+    random.seed(1)
+    required = [1] * n_tasks
+    counts = np.zeros((n_members, n_tasks))
+    history: list[tuple[int, int, int]] = []
+    previous: set[tuple[int, int]] = set()
+    repeats = 0
+
+    for week in range(weeks):
+        if strategy == "shuffle":
+            slots = random_shuffle(n_members, required)
+        else:
+            arr = np.array([(m, t, week - w) for m, t, w in history], dtype=np.int64).reshape(-1, 3)
+            cost = build_cost_matrix(n_members, n_tasks, arr[:, 0], arr[:, 1], arr[:, 2])
+            slots = solve_assignment(cost, required, rng)
+
+        current = {(m, t) for t, members in enumerate(slots) for m in members}
+        repeats += len(current & previous)
+        previous = current
+        for m, t in current:
+            counts[m, t] += 1
+            history.append((m, t, week))
+
+    return repeats / (weeks * n_tasks), float(counts.std())
+
+
+def bench_fairness():
+    print()
+    print("Fairness over 26 weeks (6 members, 4 tasks)")
+    print(f"{'strategy':>9} {'repeats':>8} {'count std':>10}")
+    for strategy in ("shuffle", "solver"):
+        repeat_rate, spread = simulate(strategy, 6, 4, 26)
+        print(f"{strategy:>9} {repeat_rate:>7.1%} {spread:>10.2f}")
+
+
+if __name__ == "__main__":
+    bench_speed()
+    bench_fairness()
@@ -0,0 +1,92 @@
+"""
+Measure how responsive the event loop stays while a large household is shuffled.
+
+    python benchmarks/bench_loop_lag.py [--members 2000] [--tasks 400] [--runs 5]
+
+Runs `shuffle_assignments` with each CPU_EXECUTOR ("inline", "thread",
+"process") while a 5 ms ticker on the same loop records how late it wakes
+up, the way `metrics.watch_event_loop` does. Reports the median shuffle
+time, the median of each shuffle's worst lag (robust to the odd garbage
+collection pause) and the overall worst lag per executor. Uses an in-memory
+SQLite database.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from config import config  # noqa: E402
+from database import Base, Household  # noqa: E402
+from loadtest.generator import seed  # noqa: E402
+from services import cpu  # noqa: E402
+from services.assignment import shuffle_assignments  # noqa: E402
+
+TICK = 0.005
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--members", type=int, default=2000)
+    parser.add_argument("--tasks", type=int, default=400)
+    parser.add_argument("--runs", type=int, default=5, help="shuffles measured per executor")
+    return parser.parse_args()
+
+
+async def ticker(lags: list[float]) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(TICK)
+        lags.append(max(loop.time() - start - TICK, 0.0))
+
+
+async def measure(factory, household_id: int, runs: int) -> tuple[float, float, float]:
+    """Return (median shuffle ms, median worst lag ms, worst lag ms) over `runs` shuffles."""
+    # Warm up the pool and scipy's import
+    async with factory() as session:
+        await shuffle_assignments(session, household_id)
+
+    durations, worst_lags = [], []
+    for _ in range(runs):
+        run_lags: list[float] = []
+        watcher = asyncio.create_task(ticker(run_lags))
+        await asyncio.sleep(TICK * 2)
+        start = time.perf_counter()
+        async with factory() as session:
+            await shuffle_assignments(session, household_id)
+        durations.append(time.perf_counter() - start)
+        watcher.cancel()
+        # A loop that never let the ticker run lagged for the whole shuffle
+        worst_lags.append(max(run_lags, default=durations[-1]))
+    return statistics.median(durations) * 1000, statistics.median(worst_lags) * 1000, max(worst_lags) * 1000
+
+
+async def run(args: argparse.Namespace) -> None:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    factory = async_sessionmaker(engine, expire_on_commit=False)
+    await seed(factory, 1, args.members, args.tasks)
+    async with factory() as session:
+        household_id = (await session.execute(select(Household.id))).scalar_one()
+
+    print(f"Shuffle of {args.members} members / {args.tasks} tasks ({args.runs} runs)")
+    print(f"{'executor':>9} {'shuffle ms':>11} {'lag ms':>8} {'worst ms':>9}")
+    for executor in ("inline", "thread", "process"):
+        config.CPU_EXECUTOR = executor
+        cpu.shutdown_executor()
+        shuffle_ms, lag, worst = await measure(factory, household_id, args.runs)
+        print(f"{executor:>9} {shuffle_ms:>11.0f} {lag:>8.1f} {worst:>9.1f}")
+    cpu.shutdown_executor()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,116 @@
+"""
+Compare ORM entity loading with the Core projections in services/read_models.py.
+
+    python benchmarks/bench_read_path.py [--repeat 200]
+
+For the schedule screen and the member management list, reports SQL
+statements, allocated KiB and time per tap (caches bypassed), for a typical
+and a large household. Uses an in-memory SQLite database.
+"""
+import argparse
+import asyncio
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import event, select  # noqa: E402
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import selectinload  # noqa: E402
+
+from database import Assignment, Base, Household, Member  # noqa: E402
+from loadtest.generator import seed  # noqa: E402
+from services.assignment import get_current_yearweek  # noqa: E402
+from services.read_models import get_member_rows, week_rows_query  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="taps measured per path")
+    return parser.parse_args()
+
+
+async def orm_schedule(session, household_id: int) -> dict[str, list[str]]:
+    """The previous get_formatted_schedule read: entities plus two selectinloads."""
+    result = await session.execute(
+        select(Assignment)
+        .options(selectinload(Assignment.member), selectinload(Assignment.task))
+        .where(Assignment.household_id == household_id, Assignment.yearweek == get_current_yearweek())
+    )
+    schedule: dict[str, list[str]] = {}
+    for assignment in result.scalars().all():
+        schedule.setdefault(assignment.task.name, []).append(assignment.member.name)
+    return schedule
+
+
+async def projection_schedule(session, household_id: int) -> dict[str, list[str]]:
+    """The production read: `week_rows_query`, one joined projection."""
+    schedule: dict[str, list[str]] = {}
+    result = await session.execute(week_rows_query(household_id, get_current_yearweek()))
+    for task_name, member_name, _ in result.all():
+        schedule.setdefault(task_name, []).append(member_name)
+    return schedule
+
+
+async def orm_members(session, household_id: int) -> list[tuple[int, str]]:
+    """The previous management list read."""
+    result = await session.execute(
+        select(Member).where(Member.household_id == household_id).order_by(Member.name)
+    )
+    return [(member.id, member.name) for member in result.scalars().all()]
+
+
+async def projection_members(session, household_id: int) -> list[tuple[int, str]]:
+    return [(row.id, row.name) for row in await get_member_rows(session, household_id)]
+
+
+async def measure(engine, factory, household_id: int, read, repeat: int) -> tuple[float, float, float]:
+    """Return (statements, KiB allocated, microseconds) per tap, each tap in a fresh session."""
+    statements = []
+
+    def on_execute(*args):
+        statements.append(1)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", on_execute)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        async with factory() as session:
+            await read(session, household_id)
+    elapsed = time.perf_counter() - start
+    event.remove(engine.sync_engine, "before_cursor_execute", on_execute)
+
+    # Peak allocations of one more tap, traced separately so tracing does not skew the timing
+    tracemalloc.start()
+    async with factory() as session:
+        await read(session, household_id)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(statements) / repeat, peak / 1024, elapsed / repeat * 1e6
+
+
+async def run(args: argparse.Namespace) -> None:
+    print(f"Read path per tap ({args.repeat} taps, caches bypassed)")
+    print(f"{'household':>10} {'screen':>9} {'path':>11} {'queries':>8} {'KiB':>8} {'µs':>8}")
+    for members, tasks in [(8, 5), (60, 30)]:
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(engine, expire_on_commit=False)
+        await seed(factory, 1, members, tasks)
+        async with factory() as session:
+            household_id = (await session.execute(select(Household.id))).scalar_one()
+
+        for screen, paths in [
+            ("schedule", [("orm", orm_schedule), ("projection", projection_schedule)]),
+            ("members", [("orm", orm_members), ("projection", projection_members)]),
+        ]:
+            for name, read in paths:
+                queries, kib, micros = await measure(engine, factory, household_id, read, args.repeat)
+                print(f"{f'{members}m/{tasks}t':>10} {screen:>9} {name:>11} {queries:>8.0f} {kib:>8.1f} {micros:>8.0f}")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
@@ -0,0 +1,116 @@
+"""
+Measure how long the bot takes to become ready after a (re)start.
+
+    python benchmarks/bench_startup.py [--runs 3] [--database-url URL]
+
+Starts `bot.py` in polling mode against a local fake Bot API and times
+from process start to its first getUpdates call. Reports the first boot on
+an empty database, restarts whose schema fingerprint matches (no DDL), and
+restarts that had to run create_all because the fingerprint was missing.
+Also reports the bare `import bot` time. Uses a fresh SQLite file unless
+--database-url is given.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from loadtest.fake_api import FakeBotAPI  # noqa: E402
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="restarts measured per scenario")
+    parser.add_argument("--database-url", help="database to use instead of a temporary SQLite file")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    return parser.parse_args()
+
+
+def bot_env(database_url: str, api_url: str = "") -> dict[str, str]:
+    return {
+        **os.environ,
+        "BOT_TOKEN": "42:BENCHMARK",
+        "BOT_MODE": "polling",
+        "BOT_API_URL": api_url,
+        "DATABASE_URL": database_url,
+        "METRICS_PORT": "0",
+        "GROUP_CHAT_ID": "0",
+    }
+
+
+def time_import(database_url: str) -> float:
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import bot"], cwd=ROOT, env=bot_env(database_url), check=True)
+    return time.perf_counter() - start
+
+
+async def time_ready(api: FakeBotAPI, env: dict[str, str], timeout: float) -> float:
+    """Seconds from spawning bot.py until it first polls for updates."""
+    api.calls.clear()
+    start = time.perf_counter()
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "bot.py", cwd=ROOT, env=env,
+        stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL
+    )
+    try:
+        while not api.calls.get("getUpdates"):
+            if process.returncode is not None or time.perf_counter() - start > timeout:
+                raise RuntimeError("bot.py exited or timed out before polling")
+            await asyncio.sleep(0.005)
+        return time.perf_counter() - start
+    finally:
+        process.terminate()
+        await process.wait()
+
+
+async def forget_fingerprint(database_url: str) -> None:
+    """Drop the stored fingerprint so the next start runs create_all, like every start used to."""
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM schema_version"))
+    await engine.dispose()
+
+
+async def run(args: argparse.Namespace) -> None:
+    from aiohttp import web
+
+    database_url = args.database_url or f"sqlite+aiosqlite:///{Path(tempfile.mkdtemp()) / 'startup.db'}"
+    api = FakeBotAPI()
+    runner = web.AppRunner(api.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    env = bot_env(database_url, f"http://127.0.0.1:{port}")
+
+    results: dict[str, list[float]] = {
+        "import bot": [time_import(database_url) for _ in range(args.runs)],
+        "first boot": [await time_ready(api, env, args.timeout)],
+        "restart, schema up to date": [],
+        "restart, create_all": [],
+    }
+    for _ in range(args.runs):
+        results["restart, schema up to date"].append(await time_ready(api, env, args.timeout))
+        await forget_fingerprint(database_url)
+        results["restart, create_all"].append(await time_ready(api, env, args.timeout))
+    await runner.cleanup()
+
+    print(f"Startup time (seconds, {args.runs} runs)")
+    print(f"{'scenario':<28} {'median':>7} {'min':>7} {'max':>7}")
+    for scenario, times in results.items():
+        print(f"{scenario:<28} {statistics.median(times):>7.2f} {min(times):>7.2f} {max(times):>7.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
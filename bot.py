@@ -1,15 +1,17 @@
 import asyncio
+import importlib
 import logging
 import sys
-
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
+from typing import TYPE_CHECKING
 
 from config import config
-from database import init_db
-from handlers import common, admin
-from scheduler import setup_scheduler, start_scheduler, stop_scheduler
+
+if TYPE_CHECKING:
+    from aiogram import Bot, Dispatcher
+
+# Imported in the background while the database starts up; aiogram alone
+# takes seconds to import, mostly building its pydantic models
+APP_MODULES = ("aiogram", "handlers.common", "handlers.admin", "middlewares", "fsm_storage", "scheduler")
 
 
 # Configure logging
@@ -21,39 +23,134 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+def import_app_modules() -> None:
+    """Import the modules polling and webhook mode need (runs in a worker thread)."""
+    for name in APP_MODULES:
+        importlib.import_module(name)
+    if config.BOT_MODE == "webhook":
+        importlib.import_module("webhook")
+
+
+def create_bot() -> "Bot":
+    """Create the Bot, optionally talking to a custom Bot API server."""
+    from aiogram import Bot
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.enums import ParseMode
+    
+    from middlewares import BotApiMetricsMiddleware
+    
+    session = None
+    if config.BOT_API_URL:
+        session = AiohttpSession(api=TelegramAPIServer.from_base(config.BOT_API_URL))
+    bot = Bot(
+        token=config.BOT_TOKEN,
+        session=session,
+        default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
+    )
+    # Time outbound calls separately from our own processing
+    bot.session.middleware(BotApiMetricsMiddleware())
+    return bot
+
+
+def create_dispatcher() -> "Dispatcher":
+    """Create the Dispatcher with its storage, middlewares and routers."""
+    from aiogram import Dispatcher
+    
+    from fsm_storage import DatabaseStorage
+    from handlers import admin, common
+    from middlewares import (
+        DbSessionMiddleware, HandlerMetricsMiddleware, IdentityMiddleware, UpdateMetricsMiddleware
+    )
+    
+    # Conversation state lives in the database so it survives restarts and replicas
+    dp = Dispatcher(storage=DatabaseStorage())
+    
+    # One lazily connected session per update, then resolve the caller once
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.update.outer_middleware(DbSessionMiddleware())
+    dp.update.outer_middleware(IdentityMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
+    
+    # Register routers
+    dp.include_router(common.router)
+    dp.include_router(admin.router)
+    return dp
+
+
 async def main():
     # Validate config
     if not config.BOT_TOKEN:
         logger.error("BOT_TOKEN is not set! Please set it in .env file")
         sys.exit(1)
     
+    if config.BOT_MODE == "webhook" and not config.WEBHOOK_BASE_URL:
+        logger.error("WEBHOOK_BASE_URL is required in webhook mode!")
+        sys.exit(1)
+    
+    if config.BOT_MODE == "webhook" and not config.WEBHOOK_SECRET:
+        logger.error("WEBHOOK_SECRET is required in webhook mode, or anyone can post fake updates!")
+        sys.exit(1)
+    
     if not config.SUPERUSER_ID:
         logger.warning("SUPERUSER_ID is not set! Admin commands will be disabled.")
     
+    from database import async_session, engine, init_db
+    from metrics import watch_event_loop
+    from services.cpu import shutdown_executor
+    from services.household import ensure_default_household
+    from services.settings import settings_store
+    
+    # Import aiogram and the handlers while the database starts up
+    app_modules = asyncio.create_task(asyncio.to_thread(import_app_modules))
+    
     # Initialize database
     await init_db()
+    async with async_session() as session:
+        await ensure_default_household(session)
     logger.info("Database initialized")
+    await app_modules
     
-    # Initialize bot and dispatcher
-    bot = Bot(
-        token=config.BOT_TOKEN,
-        default=DefaultBotProperties(parse_mode=ParseMode.MARKDOWN)
-    )
-    dp = Dispatcher()
+    from scheduler import setup_scheduler, start_scheduler, stop_scheduler
+    from services.outbox import run_outbox_worker
     
-    # Register routers
-    dp.include_router(common.router)
-    dp.include_router(admin.router)
+    # Initialize bot and dispatcher
+    bot = create_bot()
+    dp = create_dispatcher()
     
     # Setup scheduler
-    setup_scheduler(bot)
+    setup_scheduler()
     start_scheduler()
     logger.info("Scheduler started")
     
+    # Pick up settings changed by other replicas
+    settings_watcher = asyncio.create_task(settings_store.watch(async_session, engine))
+    # Deliver queued notifications
+    outbox_worker = asyncio.create_task(run_outbox_worker(bot, async_session))
+    # Report event loop stalls
+    loop_watchdog = asyncio.create_task(watch_event_loop())
+    
+    metrics_runner = None
     try:
-        logger.info("Starting bot...")
-        await dp.start_polling(bot)
+        if config.METRICS_PORT:
+            from metrics import start_metrics_server
+            metrics_runner = await start_metrics_server()
+        if config.BOT_MODE == "webhook":
+            from webhook import run_webhook
+            logger.info("Starting bot in webhook mode...")
+            await run_webhook(dp, bot)
+        else:
+            logger.info("Starting bot...")
+            await dp.start_polling(bot)
     finally:
+        settings_watcher.cancel()
+        outbox_worker.cancel()
+        loop_watchdog.cancel()
+        shutdown_executor()
+        if metrics_runner:
+            await metrics_runner.cleanup()
         stop_scheduler()
         await bot.session.close()
 
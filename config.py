@@ -11,6 +11,94 @@ class Config:
     NOTIFICATION_DAY: int = int(os.getenv("NOTIFICATION_DAY", "0"))  # Monday
     NOTIFICATION_HOUR: int = int(os.getenv("NOTIFICATION_HOUR", "9"))
     TIMEZONE: str = os.getenv("TIMEZONE", "UTC")
+    # How many past weeks the assignment solver looks at
+    ASSIGNMENT_HISTORY_WEEKS: int = int(os.getenv("ASSIGNMENT_HISTORY_WEEKS", "26"))
+    # Weeks of raw assignments kept before they are rolled up into per-year summaries
+    # (never less than ASSIGNMENT_HISTORY_WEEKS), rows moved per batch, and the UTC hour
+    # the daily retention job runs at
+    ASSIGNMENT_RETENTION_WEEKS: int = int(os.getenv("ASSIGNMENT_RETENTION_WEEKS", "104"))
+    RETENTION_BATCH_SIZE: int = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+    RETENTION_HOUR: int = int(os.getenv("RETENTION_HOUR", "3"))
+    # Weeks planned ahead by the nightly precompute job (0 disables it) and its UTC hour
+    PRECOMPUTE_WEEKS: int = int(os.getenv("PRECOMPUTE_WEEKS", "4"))
+    PRECOMPUTE_HOUR: int = int(os.getenv("PRECOMPUTE_HOUR", "2"))
+    # Create `assignments` partitioned by year (Postgres, new databases only)
+    ASSIGNMENT_PARTITIONING: bool = os.getenv("ASSIGNMENT_PARTITIONING", "false").lower() in ("1", "true", "yes")
+    # Rendered schedule cache: max entries and seconds before an entry expires
+    # (the TTL bounds staleness on other replicas; 0 disables it)
+    SCHEDULE_CACHE_SIZE: int = int(os.getenv("SCHEDULE_CACHE_SIZE", "1024"))
+    SCHEDULE_CACHE_TTL: int = int(os.getenv("SCHEDULE_CACHE_TTL", "300"))
+    # Caller identity (household, membership, role) cache: max entries and TTL in seconds
+    IDENTITY_CACHE_SIZE: int = int(os.getenv("IDENTITY_CACHE_SIZE", "10000"))
+    IDENTITY_CACHE_TTL: int = int(os.getenv("IDENTITY_CACHE_TTL", "300"))
+    # Conversation state: seconds until an abandoned one expires, seconds a read is
+    # cached in-process (keep it short, another replica may get the next message),
+    # and rows deleted per batch when purging expired states
+    FSM_STATE_TTL: int = int(os.getenv("FSM_STATE_TTL", "86400"))
+    FSM_CACHE_TTL: float = float(os.getenv("FSM_CACHE_TTL", "2"))
+    FSM_PURGE_BATCH: int = int(os.getenv("FSM_PURGE_BATCH", "1000"))
+    # Weekly due-queue: seconds between scans, households claimed per batch, concurrent runs
+    DISPATCH_INTERVAL: int = int(os.getenv("DISPATCH_INTERVAL", "30"))
+    DISPATCH_BATCH_SIZE: int = int(os.getenv("DISPATCH_BATCH_SIZE", "100"))
+    DISPATCH_WORKERS: int = int(os.getenv("DISPATCH_WORKERS", "10"))
+    # Claimed runs allowed to wait for a worker, and the window (seconds) after the
+    # notification time that households' runs are spread across
+    DISPATCH_QUEUE_SIZE: int = int(os.getenv("DISPATCH_QUEUE_SIZE", "20"))
+    DISPATCH_SPREAD_SECONDS: int = int(os.getenv("DISPATCH_SPREAD_SECONDS", "900"))
+    # Seconds before a household whose weekly run failed is dispatched again
+    DISPATCH_RETRY_SECONDS: int = int(os.getenv("DISPATCH_RETRY_SECONDS", "300"))
+    # Seconds between settings reloads when LISTEN/NOTIFY is unavailable
+    SETTINGS_POLL_INTERVAL: int = int(os.getenv("SETTINGS_POLL_INTERVAL", "30"))
+    # Seconds after which a scheduled run whose replica went silent may be taken over
+    JOB_LEASE_SECONDS: int = int(os.getenv("JOB_LEASE_SECONDS", "3600"))
+    # Update delivery: "polling" or "webhook"
+    BOT_MODE: str = os.getenv("BOT_MODE", "polling")
+    # Public base URL Telegram posts updates to, e.g. https://bot.example.com
+    WEBHOOK_BASE_URL: str = os.getenv("WEBHOOK_BASE_URL", "")
+    WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    # Required in webhook mode: Telegram echoes it so forged updates are rejected
+    WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+    # Max updates processed concurrently before new requests wait
+    WEBHOOK_MAX_IN_FLIGHT: int = int(os.getenv("WEBHOOK_MAX_IN_FLIGHT", "100"))
+    WEB_SERVER_HOST: str = os.getenv("WEB_SERVER_HOST", "0.0.0.0")
+    WEB_SERVER_PORT: int = int(os.getenv("WEB_SERVER_PORT", "8080"))
+    # Outgoing message limits: messages per second and concurrent sends. Only one
+    # replica drains the outbox at a time, so the rate applies to the whole deployment
+    BROADCAST_RATE: float = float(os.getenv("BROADCAST_RATE", "25"))
+    BROADCAST_CONCURRENCY: int = int(os.getenv("BROADCAST_CONCURRENCY", "20"))
+    # Notification outbox: messages sent per batch, seconds between scans, seconds a
+    # claimed batch is reserved for one replica, attempts before a message is
+    # dead-lettered, retry backoff (base and cap in seconds), days sent messages
+    # are kept and rows deleted per batch when purging them
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "100"))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+    OUTBOX_LEASE_SECONDS: int = int(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+    OUTBOX_BACKOFF_BASE: float = float(os.getenv("OUTBOX_BACKOFF_BASE", "10"))
+    OUTBOX_BACKOFF_MAX: float = float(os.getenv("OUTBOX_BACKOFF_MAX", "3600"))
+    OUTBOX_RETENTION_DAYS: int = int(os.getenv("OUTBOX_RETENTION_DAYS", "7"))
+    OUTBOX_PURGE_BATCH: int = int(os.getenv("OUTBOX_PURGE_BATCH", "1000"))
+    # Pool for CPU-bound work (solver, rendering): "thread", "process" or "inline", and its size
+    CPU_EXECUTOR: str = os.getenv("CPU_EXECUTOR", "thread")
+    CPU_WORKERS: int = int(os.getenv("CPU_WORKERS", "2"))
+    # Event loop watchdog: seconds between checks, and lag (seconds) logged as a stall
+    LOOP_LAG_INTERVAL: float = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+    LOOP_LAG_THRESHOLD: float = float(os.getenv("LOOP_LAG_THRESHOLD", "0.1"))
+    # Alternative Bot API server (local server or a fake one for testing)
+    BOT_API_URL: str = os.getenv("BOT_API_URL", "")
+    # Connection pool (Postgres): size, extra connections under bursts, seconds to wait
+    # for a free connection, and seconds after which connections are recycled
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "10"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    # Statements slower than this (milliseconds) are logged and counted
+    SLOW_QUERY_MS: float = float(os.getenv("SLOW_QUERY_MS", "250"))
+    # Prometheus metrics endpoint, served on its own host and port in both modes and
+    # never on the public webhook listener (port 0 disables it)
+    METRICS_PATH: str = os.getenv("METRICS_PATH", "/metrics")
+    METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT: int = int(os.getenv("METRICS_PORT", "9100"))
     # Default to Postgres in Docker, fallback to sqlite locally if needed
     DATABASE_URL: str = os.getenv(
         "DATABASE_URL", 
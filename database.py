@@ -1,26 +1,105 @@
+import hashlib
+import logging
+import secrets
 from datetime import datetime
-from sqlalchemy import BigInteger, Boolean, ForeignKey, Integer, String, DateTime, select
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
+from sqlalchemy import (
+    JSON, BigInteger, Boolean, ForeignKey, Index, Integer, String, Text, DateTime, UniqueConstraint, delete,
+    insert, inspect, select, text, update
+)
+from sqlalchemy.engine import Connection, Dialect
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import CreateIndex, CreateTable
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import (
+    AsyncAttrs, AsyncConnection, AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 from config import config
+from metrics import instrument_engine, pool_options
+
+logger = logging.getLogger(__name__)
 
 
 class Base(AsyncAttrs, DeclarativeBase):
     pass
 
 
+def pack_yearweek(year: int, week: int) -> int:
+    """Pack an ISO (year, week) pair into one sortable integer, e.g. 2025, 7 -> 202507."""
+    return year * 100 + week
+
+
+def new_join_token() -> str:
+    """Random token for a household's join link."""
+    return secrets.token_urlsafe(16)
+
+
+def _default_yearweek(context) -> int:
+    params = context.get_current_parameters()
+    return pack_yearweek(params["year"], params["week_number"])
+
+
+class Household(Base):
+    """A flat sharing one cleaning rota, keyed by its Telegram group chat."""
+    __tablename__ = "households"
+    __table_args__ = (
+        # Due-queue scan for the weekly dispatcher
+        Index("ix_households_next_run_at", "next_run_at"),
+        Index("ix_households_join_token", "join_token", unique=True),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
+    title: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    admin_id: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    active: Mapped[bool] = mapped_column(Boolean, default=True)
+    # Secret part of the join link; group chat ids are not secret
+    join_token: Mapped[str] = mapped_column(String(32), nullable=False, default=new_join_token)
+    # Weekly notification time; NULL falls back to the bot-wide defaults
+    notification_day: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    notification_hour: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    timezone: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    # Next weekly run in UTC
+    next_run_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    # Lease on the due slot held by the replica running it; next_run_at only
+    # moves on once the run succeeded
+    claimed_until: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    
+    members: Mapped[list["Member"]] = relationship(
+        "Member", back_populates="household", cascade="all, delete-orphan"
+    )
+    tasks: Mapped[list["Task"]] = relationship(
+        "Task", back_populates="household", cascade="all, delete-orphan"
+    )
+    
+    def __repr__(self) -> str:
+        return f"<Household {self.title} ({self.chat_id})>"
+
+
 class Member(Base):
     __tablename__ = "members"
+    __table_args__ = (
+        UniqueConstraint("household_id", "telegram_id", name="uq_members_household_telegram"),
+        Index("ix_members_household_name", "household_id", "name"),
+        Index("ix_members_telegram_id", "telegram_id"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
+    household_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("households.id", ondelete="CASCADE"), nullable=False
+    )
+    telegram_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     username: Mapped[str | None] = mapped_column(String(100), nullable=True)
     active: Mapped[bool] = mapped_column(Boolean, default=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     
-    assignments: Mapped[list["Assignment"]] = relationship("Assignment", back_populates="member")
+    household: Mapped["Household"] = relationship("Household", back_populates="members")
+    assignments: Mapped[list["Assignment"]] = relationship(
+        "Assignment", back_populates="member", cascade="all, delete-orphan"
+    )
     
     def __repr__(self) -> str:
         return f"<Member {self.name} ({self.telegram_id})>"
@@ -28,26 +107,59 @@ class Member(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        UniqueConstraint("household_id", "name", name="uq_tasks_household_name"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    name: Mapped[str] = mapped_column(String(100), unique=True, nullable=False)
+    household_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("households.id", ondelete="CASCADE"), nullable=False
+    )
+    name: Mapped[str] = mapped_column(String(100), nullable=False)
     required_people: Mapped[int] = mapped_column(Integer, default=1)
     active: Mapped[bool] = mapped_column(Boolean, default=True)
     
-    assignments: Mapped[list["Assignment"]] = relationship("Assignment", back_populates="task")
+    household: Mapped["Household"] = relationship("Household", back_populates="tasks")
+    assignments: Mapped[list["Assignment"]] = relationship(
+        "Assignment", back_populates="task", cascade="all, delete-orphan"
+    )
     
     def __repr__(self) -> str:
         return f"<Task {self.name} ({self.required_people} people)>"
 
 
+# Yearly range partitions need the partition key in the primary key
+PARTITION_ASSIGNMENTS = config.ASSIGNMENT_PARTITIONING and config.DATABASE_URL.startswith("postgresql")
+
+
 class Assignment(Base):
     __tablename__ = "assignments"
+    __table_args__ = (
+        # Covering indexes for the "Full Schedule" and "My Schedule" reads
+        Index(
+            "ix_assignments_household_yearweek", "household_id", "yearweek",
+            postgresql_include=["member_id", "task_id"]
+        ),
+        Index(
+            "ix_assignments_member_yearweek", "member_id", "yearweek",
+            postgresql_include=["task_id"]
+        ),
+        {"postgresql_partition_by": "RANGE (year)"} if PARTITION_ASSIGNMENTS else {},
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    member_id: Mapped[int] = mapped_column(Integer, ForeignKey("members.id"), nullable=False)
-    task_id: Mapped[int] = mapped_column(Integer, ForeignKey("tasks.id"), nullable=False)
+    household_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("households.id", ondelete="CASCADE"), nullable=False
+    )
+    member_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("members.id", ondelete="CASCADE"), nullable=False
+    )
+    task_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("tasks.id", ondelete="CASCADE"), nullable=False
+    )
     week_number: Mapped[int] = mapped_column(Integer, nullable=False)
-    year: Mapped[int] = mapped_column(Integer, nullable=False)
+    year: Mapped[int] = mapped_column(Integer, nullable=False, primary_key=PARTITION_ASSIGNMENTS)
+    yearweek: Mapped[int] = mapped_column(Integer, nullable=False, default=_default_yearweek)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     
     member: Mapped["Member"] = relationship("Member", back_populates="assignments")
@@ -57,23 +169,291 @@ class Assignment(Base):
         return f"<Assignment {self.member.name} -> {self.task.name} (Week {self.week_number}/{self.year})>"
 
 
+class AssignmentSummary(Base):
+    """Per-year assignment counts for weeks that retention rolled out of `assignments`."""
+    __tablename__ = "assignment_summaries"
+    __table_args__ = (
+        Index("ix_assignment_summaries_household_year", "household_id", "year"),
+    )
+    
+    member_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("members.id", ondelete="CASCADE"), primary_key=True
+    )
+    task_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True
+    )
+    year: Mapped[int] = mapped_column(Integer, primary_key=True)
+    household_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("households.id", ondelete="CASCADE"), nullable=False
+    )
+    times_assigned: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Latest week rolled into this row
+    last_yearweek: Mapped[int] = mapped_column(Integer, nullable=False)
+
+
+class MemberTaskStats(Base):
+    """All-time count and latest week of each member doing each task, kept up to date by every shuffle."""
+    __tablename__ = "member_task_stats"
+    __table_args__ = (
+        Index("ix_member_task_stats_household", "household_id"),
+    )
+    
+    member_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("members.id", ondelete="CASCADE"), primary_key=True
+    )
+    task_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("tasks.id", ondelete="CASCADE"), primary_key=True
+    )
+    household_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("households.id", ondelete="CASCADE"), nullable=False
+    )
+    times_assigned: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    last_yearweek: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+
 class Settings(Base):
     __tablename__ = "settings"
+    __table_args__ = (
+        UniqueConstraint("household_id", "key", name="uq_settings_household_key"),
+    )
     
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    key: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
+    # NULL household_id holds the bot-wide defaults
+    household_id: Mapped[int | None] = mapped_column(
+        Integer, ForeignKey("households.id", ondelete="CASCADE"), nullable=True
+    )
+    key: Mapped[str] = mapped_column(String(50), nullable=False)
     value: Mapped[str] = mapped_column(String(200), nullable=False)
 
 
+class JobRun(Base):
+    """Ledger of scheduled job runs, so each (job, period) runs once across replicas."""
+    __tablename__ = "job_runs"
+    __table_args__ = (
+        UniqueConstraint("job", "period", name="uq_job_runs_job_period"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    job: Mapped[str] = mapped_column(String(100), nullable=False)
+    period: Mapped[str] = mapped_column(String(50), nullable=False)
+    status: Mapped[str] = mapped_column(String(20), nullable=False)  # running, done, failed
+    owner: Mapped[str] = mapped_column(String(100), nullable=False)
+    started_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class FsmState(Base):
+    """Conversation (FSM) state shared by all replicas; rows expire after FSM_STATE_TTL."""
+    __tablename__ = "fsm_states"
+    __table_args__ = (
+        Index("ix_fsm_states_expires_at", "expires_at"),
+    )
+    
+    bot_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    chat_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    # 0 outside forum topics
+    thread_id: Mapped[int] = mapped_column(BigInteger, primary_key=True, default=0)
+    state: Mapped[str | None] = mapped_column(String(100), nullable=True)
+    data: Mapped[dict | None] = mapped_column(JSON(none_as_null=True), nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+
+class OutboxMessage(Base):
+    """A message waiting to be sent to Telegram, written in the transaction that produced it."""
+    __tablename__ = "outbox"
+    __table_args__ = (
+        # Worker scan for due messages
+        Index("ix_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    # Enqueueing the same message twice is a no-op
+    idempotency_key: Mapped[str] = mapped_column(String(200), unique=True, nullable=False)
+    chat_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+    parse_mode: Mapped[str | None] = mapped_column(String(20), nullable=True)
+    status: Mapped[str] = mapped_column(String(20), nullable=False, default="pending")  # pending, sent, dead
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    sent_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+class SchemaVersion(Base):
+    """Fingerprint of the schema `init_db` last created, so unchanged restarts skip the DDL."""
+    __tablename__ = "schema_version"
+    
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+
+
 # Database engine and session
-engine = create_async_engine(config.DATABASE_URL, echo=False)
+engine = create_async_engine(config.DATABASE_URL, echo=False, **pool_options(config.DATABASE_URL))
+instrument_engine(engine.sync_engine)
 async_session = async_sessionmaker(engine, expire_on_commit=False)
 
 
-async def init_db():
-    """Initialize database tables."""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+# Bump when `upgrade_schema` learns a new step, so databases whose fingerprint was
+# stored before it get upgraded on the next start
+SCHEMA_UPGRADES = 1
+
+# Single-column unique constraints of the tables before households existed
+LEGACY_UNIQUE_CONSTRAINTS = {
+    "members": ("members_telegram_id_key", "telegram_id"),
+    "tasks": ("tasks_name_key", "name"),
+    "settings": ("settings_key_key", "key"),
+}
+
+
+def schema_fingerprint(dialect: Dialect) -> str:
+    """Hash of the CREATE TABLE/INDEX statements of every model for `dialect`."""
+    ddl = [f"upgrades {SCHEMA_UPGRADES}"]
+    for table in Base.metadata.sorted_tables:
+        ddl.append(str(CreateTable(table).compile(dialect=dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            ddl.append(str(CreateIndex(index).compile(dialect=dialect)))
+    return hashlib.sha256("\n".join(ddl).encode()).hexdigest()
+
+
+async def stored_fingerprint(bind: AsyncEngine) -> str | None:
+    """The fingerprint recorded by the last `init_db`, or None on a new database."""
+    async with bind.connect() as conn:
+        try:
+            result = await conn.execute(select(SchemaVersion.fingerprint).where(SchemaVersion.id == 1))
+        except DBAPIError:
+            return None
+        return result.scalar_one_or_none()
+
+
+async def init_db(bind: AsyncEngine | None = None) -> bool:
+    """
+    Initialize database tables. Restarts with an unchanged schema only
+    compare the stored fingerprint and skip create_all and its reflection.
+    Returns whether DDL was run.
+    """
+    bind = bind or engine
+    fingerprint = schema_fingerprint(bind.dialect)
+    if await stored_fingerprint(bind) == fingerprint:
+        logger.info("Database schema is up to date")
+        created = False
+    else:
+        async with bind.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(upgrade_schema)
+            await conn.execute(delete(SchemaVersion))
+            await conn.execute(insert(SchemaVersion).values(id=1, fingerprint=fingerprint))
+        logger.info(f"Database schema created or updated ({fingerprint[:12]})")
+        created = True
+    
+    if PARTITION_ASSIGNMENTS:
+        year = datetime.utcnow().isocalendar()[0]
+        async with bind.begin() as conn:
+            await create_assignment_partitions(conn, [year, year + 1])
+    return created
+
+
+def upgrade_schema(conn: Connection) -> None:
+    """
+    Bring tables created by older versions up to the models. create_all only
+    creates missing tables, so columns added since (households, yearweek,
+    join tokens) are added here, backfilled, and their indexes and unique
+    constraints created. Runs in init_db's transaction, before the new
+    fingerprint is stored; every step is idempotent, so an upgrade that
+    failed half-way (SQLite commits DDL on its own) is finished next start.
+    """
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            # Added as nullable: existing rows get their values from the backfill below
+            ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(conn.dialect)}"
+            for fk in column.foreign_keys:
+                ddl += f" REFERENCES {fk.column.table.name} ({fk.column.name})"
+                if fk.ondelete:
+                    ddl += f" ON DELETE {fk.ondelete}"
+            logger.info(f"Upgrading schema: adding {table.name}.{column.name}")
+            conn.execute(text(ddl))
+    
+    backfill_upgraded_columns(conn)
+    
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        unique = inspector.get_unique_constraints(table.name)
+        existing |= {constraint["name"] for constraint in unique}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(conn)
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint) and constraint.name and constraint.name not in existing:
+                columns = ", ".join(column.name for column in constraint.columns)
+                conn.execute(text(f"CREATE UNIQUE INDEX {constraint.name} ON {table.name} ({columns})"))
+        
+        if table.name not in LEGACY_UNIQUE_CONSTRAINTS:
+            continue
+        name, column = LEGACY_UNIQUE_CONSTRAINTS[table.name]
+        if conn.dialect.name == "postgresql":
+            conn.execute(text(f"ALTER TABLE {table.name} DROP CONSTRAINT IF EXISTS {name}"))
+        elif any(constraint["column_names"] == [column] for constraint in unique):
+            # SQLite cannot drop a column constraint without rebuilding the table
+            logger.warning(
+                f"{table.name}.{column} is still unique across households; "
+                "recreate the database to allow the same value in several households"
+            )
+
+
+def backfill_upgraded_columns(conn: Connection) -> None:
+    """Fill the columns `upgrade_schema` added to rows written by older versions."""
+    for household_id in conn.execute(select(Household.id).where(Household.join_token.is_(None))).scalars().all():
+        conn.execute(update(Household).where(Household.id == household_id).values(join_token=new_join_token()))
+    
+    # Rows from before households belong to the household of GROUP_CHAT_ID; settings
+    # without a household stay the bot-wide defaults
+    scoped = [
+        model for model in (Member, Task, Assignment)
+        if conn.execute(select(model.id).where(model.household_id.is_(None)).limit(1)).first() is not None
+    ]
+    if scoped:
+        if not config.GROUP_CHAT_ID:
+            raise RuntimeError("Set GROUP_CHAT_ID to upgrade a database created before households")
+        household_id = conn.execute(
+            select(Household.id).where(Household.chat_id == config.GROUP_CHAT_ID)
+        ).scalar_one_or_none()
+        if household_id is None:
+            household_id = conn.execute(
+                insert(Household)
+                .values(chat_id=config.GROUP_CHAT_ID, admin_id=config.SUPERUSER_ID or None)
+                .returning(Household.id)
+            ).scalar_one()
+        for model in scoped:
+            conn.execute(update(model).where(model.household_id.is_(None)).values(household_id=household_id))
+    
+    conn.execute(
+        update(Assignment)
+        .where(Assignment.yearweek.is_(None))
+        .values(yearweek=Assignment.year * 100 + Assignment.week_number)
+    )
+
+
+async def create_assignment_partitions(conn: AsyncConnection, years: list[int]) -> None:
+    """Create the yearly partitions of a partitioned `assignments` table if missing."""
+    for year in years:
+        await conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS assignments_y{year:d} PARTITION OF assignments "
+            f"FOR VALUES FROM ({year:d}) TO ({year + 1:d})"
+        ))
+
+
+def dialect_insert(session: AsyncSession, model):
+    """INSERT construct with ON CONFLICT support for the session's database."""
+    if session.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
 
 
 async def get_session():
@@ -0,0 +1,146 @@
+from collections.abc import Mapping
+from datetime import datetime, timedelta
+from typing import Any
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from sqlalchemy import and_, case, delete, select, tuple_, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from config import config
+from database import FsmState, async_session, dialect_insert
+from services.cache import LRUCache
+
+
+class DatabaseStorage(BaseStorage):
+    """
+    FSM storage in the `fsm_states` table, so conversations survive restarts
+    and can continue on any replica. State and data are read together in one
+    primary-key lookup and cached for FSM_CACHE_TTL seconds, which covers
+    the repeated reads aiogram makes while handling one update.
+    """
+    
+    def __init__(
+        self,
+        session_factory: async_sessionmaker = async_session,
+        state_ttl: int = config.FSM_STATE_TTL,
+        cache_ttl: float = config.FSM_CACHE_TTL
+    ):
+        self.session_factory = session_factory
+        self.state_ttl = state_ttl
+        self.cache = LRUCache(10_000, ttl=cache_ttl or None)
+    
+    @staticmethod
+    def _key(key: StorageKey) -> tuple[int, int, int, int]:
+        return key.bot_id, key.chat_id, key.user_id, key.thread_id or 0
+    
+    @staticmethod
+    def _where(row_key: tuple[int, int, int, int]):
+        bot_id, chat_id, user_id, thread_id = row_key
+        return and_(
+            FsmState.bot_id == bot_id,
+            FsmState.chat_id == chat_id,
+            FsmState.user_id == user_id,
+            FsmState.thread_id == thread_id
+        )
+    
+    async def _read(self, key: StorageKey) -> tuple[str | None, dict[str, Any]]:
+        row_key = self._key(key)
+        entry = self.cache.get(row_key)
+        if entry is not None:
+            return entry
+        
+        async with self.session_factory() as session:
+            result = await session.execute(
+                select(FsmState.state, FsmState.data)
+                .where(self._where(row_key), FsmState.expires_at > datetime.utcnow())
+            )
+            row = result.one_or_none()
+        entry = (row.state, row.data or {}) if row else (None, {})
+        self.cache.set(row_key, entry)
+        return entry
+    
+    async def _write(self, key: StorageKey, column: str, value: Any, other: str) -> None:
+        """Set one column; delete the row instead once both state and data are empty."""
+        row_key = self._key(key)
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.state_ttl)
+        # An expired row's other half is stale: drop it instead of reviving it
+        other_value = case((FsmState.expires_at <= now, None), else_=getattr(FsmState, other))
+        
+        async with self.session_factory() as session:
+            if value is None:
+                result = await session.execute(
+                    delete(FsmState).where(self._where(row_key), getattr(FsmState, other).is_(None))
+                )
+                if result.rowcount == 0:
+                    await session.execute(
+                        update(FsmState)
+                        .where(self._where(row_key))
+                        .values({column: None, other: other_value, "expires_at": expires_at})
+                    )
+            else:
+                bot_id, chat_id, user_id, thread_id = row_key
+                await session.execute(
+                    dialect_insert(session, FsmState)
+                    .values(
+                        bot_id=bot_id, chat_id=chat_id, user_id=user_id, thread_id=thread_id,
+                        expires_at=expires_at, **{column: value}
+                    )
+                    .on_conflict_do_update(
+                        index_elements=["bot_id", "chat_id", "user_id", "thread_id"],
+                        set_={column: value, other: other_value, "expires_at": expires_at}
+                    )
+                )
+            await session.commit()
+        
+        # Write through if we already hold the other half, otherwise re-read next time
+        entry = self.cache.get(row_key)
+        if entry is not None:
+            state, data = entry
+            if column == "state":
+                self.cache.set(row_key, (value, data))
+            else:
+                self.cache.set(row_key, (state, value or {}))
+    
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._write(key, "state", value, other="data")
+    
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = await self._read(key)
+        return state
+    
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._write(key, "data", dict(data) or None, other="state")
+    
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = await self._read(key)
+        # Callers (e.g. update_data) mutate the result; keep the cached copy intact
+        return dict(data)
+    
+    async def close(self) -> None:
+        self.cache.clear()
+
+
+async def purge_expired_states(
+    session_factory: async_sessionmaker = async_session, batch_size: int = config.FSM_PURGE_BATCH
+) -> int:
+    """Delete expired states in batches of `batch_size`. Returns the number deleted."""
+    columns = (FsmState.bot_id, FsmState.chat_id, FsmState.user_id, FsmState.thread_id)
+    deleted = 0
+    while True:
+        async with session_factory() as session:
+            result = await session.execute(
+                select(*columns).where(FsmState.expires_at <= datetime.utcnow()).limit(batch_size)
+            )
+            keys = [tuple(row) for row in result]
+            if not keys:
+                return deleted
+            
+            await session.execute(delete(FsmState).where(tuple_(*columns).in_(keys)))
+            await session.commit()
+        deleted += len(keys)
+        if len(keys) < batch_size:
+            return deleted
+
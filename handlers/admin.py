@@ -1,14 +1,27 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
+from datetime import datetime
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from config import config
-from database import async_session, Member, Task, Settings
-from services.assignment import shuffle_assignments, format_assignments_table
-from services.notifier import send_weekly_notification
+from database import Member, Task, Settings, Household
+from services.assignment import (
+    format_assignments_table, format_upcoming_schedule, get_upcoming_assignments, shuffle_assignments
+)
+from services.cache import identity_cache, invalidate_identity, invalidate_schedule
+from services.cpu import run_cpu
+from services.dispatcher import household_next_run
+from services.household import get_join_payload
+from services.identity import Identity
+from services.notifier import queue_weekly_notification
+from services.outbox import wake_outbox
+from services.read_models import get_member_rows, get_task_rows
+from services.settings import settings_store
 from keyboards import get_admin_panel, get_member_management_keyboard, get_task_management_keyboard
 
 router = Router()
@@ -19,16 +32,12 @@ class AddTaskStates(StatesGroup):
     waiting_for_count = State()
 
 
-def is_superuser(user_id: int) -> bool:
-    return user_id == config.SUPERUSER_ID
-
-
 @router.callback_query(F.data == "admin_panel")
-async def cb_admin_panel(callback: CallbackQuery):
-    if not is_superuser(callback.from_user.id):
+async def cb_admin_panel(callback: CallbackQuery, identity: Identity):
+    if not identity.manages_household:
         await callback.answer("⛔ Admins only!", show_alert=True)
         return
-        
+    
     await callback.message.edit_text(
         "⚙️ *Admin Panel*", 
         reply_markup=get_admin_panel(),
@@ -39,9 +48,14 @@ async def cb_admin_panel(callback: CallbackQuery):
 # ============== Member Management ==============
 
 @router.callback_query(F.data == "share_join")
-async def cb_share_join(callback: CallbackQuery):
+async def cb_share_join(callback: CallbackQuery, identity: Identity, session: AsyncSession):
+    if not identity.manages_household:
+        await callback.answer("⛔ Admins only!", show_alert=True)
+        return
+    
+    household = await session.get(Household, identity.household_id)
     bot_info = await callback.bot.get_me()
-    link = f"https://t.me/{bot_info.username}?start=register"
+    link = f"https://t.me/{bot_info.username}?start={get_join_payload(household)}"
     
     await callback.message.answer(
         f"🔗 *Share this link with your roommates:*\n\n`{link}`\n\nThey just need to click it and press Start.",
@@ -51,40 +65,52 @@ async def cb_share_join(callback: CallbackQuery):
 
 
 @router.callback_query(F.data == "manage_members")
-async def cb_manage_members(callback: CallbackQuery):
-    async with async_session() as session:
-        result = await session.execute(select(Member).order_by(Member.name))
-        members = result.scalars().all()
-        
-        await callback.message.edit_text(
-            "👥 *Tap a member to remove them:*",
-            reply_markup=get_member_management_keyboard(members),
-            parse_mode="Markdown"
-        )
+async def cb_manage_members(callback: CallbackQuery, identity: Identity, session: AsyncSession):
+    if not identity.manages_household:
+        await callback.answer("⛔ Admins only!", show_alert=True)
+        return
+    
+    members = await get_member_rows(session, identity.household_id)
+    
+    await callback.message.edit_text(
+        "👥 *Tap a member to remove them:*",
+        reply_markup=get_member_management_keyboard(members),
+        parse_mode="Markdown"
+    )
 
 
 @router.callback_query(F.data.startswith("remove_member_"))
-async def cb_remove_member(callback: CallbackQuery):
+async def cb_remove_member(callback: CallbackQuery, identity: Identity, session: AsyncSession):
     member_id = int(callback.data.split("_")[2])
     
-    async with async_session() as session:
-        member = await session.get(Member, member_id)
-        if member:
-            await session.delete(member)
-            await session.commit()
-            await callback.answer(f"Removed {member.name}")
-        else:
-            await callback.answer("Member not found")
-            
+    if not identity.manages_household:
+        await callback.answer("⛔ Admins only!", show_alert=True)
+        return
+    
+    member = await session.get(Member, member_id)
+    if member and member.household_id == identity.household_id:
+        await session.delete(member)
+        await session.commit()
+        invalidate_schedule(identity.household_id)
+        invalidate_identity(member.telegram_id)
+        await callback.answer(f"Removed {member.name}")
+    else:
+        await callback.answer("Member not found")
+    
     # Refresh list
-    await cb_manage_members(callback)
+    await cb_manage_members(callback, identity, session)
 
 
 # ============== Task Management ==============
 
 @router.callback_query(F.data == "add_task")
-async def cb_add_task_start(callback: CallbackQuery, state: FSMContext):
+async def cb_add_task_start(callback: CallbackQuery, state: FSMContext, identity: Identity):
+    if not identity.manages_household:
+        await callback.answer("⛔ Admins only!", show_alert=True)
+        return
+    
     await callback.message.answer("📝 Enter the name of the new task:")
+    await state.update_data(household_id=identity.household_id)
     await state.set_state(AddTaskStates.waiting_for_name)
     await callback.answer()
 
@@ -97,124 +123,224 @@ async def process_task_name(message: Message, state: FSMContext):
 
 
 @router.message(AddTaskStates.waiting_for_count)
-async def process_task_count(message: Message, state: FSMContext):
+async def process_task_count(message: Message, state: FSMContext, session: AsyncSession):
     try:
         count = int(message.text)
         if count < 1: raise ValueError()
     except ValueError:
         await message.answer("❌ Please enter a valid positive number.")
         return
-
+    
     data = await state.get_data()
     name = data['name']
+    household_id = data['household_id']
+    
+    existing = await session.execute(
+        select(Task).where(Task.household_id == household_id, Task.name == name)
+    )
+    if existing.scalar_one_or_none():
+        await message.answer(f"⚠️ Task '{name}' already exists.")
+    else:
+        task = Task(household_id=household_id, name=name, required_people=count)
+        session.add(task)
+        await session.commit()
+        invalidate_schedule(household_id)
+        await message.answer(f"✅ Created task: *{name}* ({count} people)", parse_mode="Markdown")
     
-    async with async_session() as session:
-        existing = await session.execute(select(Task).where(Task.name == name))
-        if existing.scalar_one_or_none():
-            await message.answer(f"⚠️ Task '{name}' already exists.")
-        else:
-            task = Task(name=name, required_people=count)
-            session.add(task)
-            await session.commit()
-            await message.answer(f"✅ Created task: *{name}* ({count} people)", parse_mode="Markdown")
-            
     await state.clear()
     # Go back to admin panel
     await message.answer("⚙️ *Admin Panel*", reply_markup=get_admin_panel(), parse_mode="Markdown")
 
 
 @router.callback_query(F.data == "remove_task")
-async def cb_remove_task_list(callback: CallbackQuery):
-    async with async_session() as session:
-        result = await session.execute(select(Task).order_by(Task.name))
-        tasks = result.scalars().all()
-        
-        await callback.message.edit_text(
-            "📝 *Tap a task to remove it:*",
-            reply_markup=get_task_management_keyboard(tasks),
-            parse_mode="Markdown"
-        )
+async def cb_remove_task_list(callback: CallbackQuery, identity: Identity, session: AsyncSession):
+    if not identity.manages_household:
+        await callback.answer("⛔ Admins only!", show_alert=True)
+        return
+    
+    tasks = await get_task_rows(session, identity.household_id)
+    
+    await callback.message.edit_text(
+        "📝 *Tap a task to remove it:*",
+        reply_markup=get_task_management_keyboard(tasks),
+        parse_mode="Markdown"
+    )
 
 
 @router.callback_query(F.data.startswith("remove_task_"))
-async def cb_remove_task_action(callback: CallbackQuery):
+async def cb_remove_task_action(callback: CallbackQuery, identity: Identity, session: AsyncSession):
     task_id = int(callback.data.split("_")[2])
     
-    async with async_session() as session:
-        task = await session.get(Task, task_id)
-        if task:
-            await session.delete(task)
-            await session.commit()
-            await callback.answer(f"Removed {task.name}")
-            
-    await cb_remove_task_list(callback)
+    if not identity.manages_household:
+        await callback.answer("⛔ Admins only!", show_alert=True)
+        return
+    
+    task = await session.get(Task, task_id)
+    if task and task.household_id == identity.household_id:
+        await session.delete(task)
+        await session.commit()
+        invalidate_schedule(identity.household_id)
+        await callback.answer(f"Removed {task.name}")
+    
+    await cb_remove_task_list(callback, identity, session)
 
 
 # ============== Shuffle & Actions ==============
 
 @router.message(Command("shuffle"))
-async def cmd_shuffle(message: Message):
+async def cmd_shuffle(message: Message, identity: Identity, session: AsyncSession):
     """Manually trigger assignment shuffle."""
-    if not is_superuser(message.from_user.id):
+    if not identity.manages_household:
         await message.answer("⛔ This command is for admins only.")
         return
     
-    async with async_session() as session:
-        assignments = await shuffle_assignments(session)
+    target_week = identity.current_week
+    assignments = await shuffle_assignments(session, identity.household_id, target_week=target_week)
+    
+    if not assignments:
+        # Check why it failed
+        from services.assignment import get_active_members, get_active_tasks
+        members = await get_active_members(session, identity.household_id)
+        tasks = await get_active_tasks(session, identity.household_id)
         
-        if not assignments:
-            # Check why it failed
-            from services.assignment import get_active_members, get_active_tasks
-            members = await get_active_members(session)
-            tasks = await get_active_tasks(session)
-            
-            error_msg = "⚠️ *Cannot shuffle yet!*"
-            if not members:
-                error_msg += "\n• No active members found. Share the join link!"
-            if not tasks:
-                error_msg += "\n• No tasks found. Add some tasks first."
-                
-            await message.answer(error_msg, parse_mode="Markdown")
-            return
-
-        schedule = format_assignments_table(assignments)
+        error_msg = "⚠️ *Cannot shuffle yet!*"
+        if not members:
+            error_msg += "\n• No active members found. Share the join link!"
+        if not tasks:
+            error_msg += "\n• No tasks found. Add some tasks first."
         
-        await message.answer(
-            f"🔀 *Assignments Shuffled!*\n\n{schedule}",
-            parse_mode="Markdown"
-        )
+        await message.answer(error_msg, parse_mode="Markdown")
+        return
+    
+    schedule = await run_cpu(format_assignments_table, assignments, target_week)
+    
+    await message.answer(
+        f"🔀 *Assignments Shuffled!*\n\n{schedule}",
+        parse_mode="Markdown"
+    )
 
 
 @router.callback_query(F.data == "shuffle_now")
-async def cb_shuffle_now(callback: CallbackQuery):
-    async with async_session() as session:
-        assignments = await shuffle_assignments(session)
+async def cb_shuffle_now(callback: CallbackQuery, identity: Identity, session: AsyncSession):
+    if not identity.manages_household:
+        await callback.answer("⛔ Admins only!", show_alert=True)
+        return
+    
+    target_week = identity.current_week
+    assignments = await shuffle_assignments(session, identity.household_id, target_week=target_week)
+    
+    if not assignments:
+        # Check why it failed
+        from services.assignment import get_active_members, get_active_tasks
+        members = await get_active_members(session, identity.household_id)
+        tasks = await get_active_tasks(session, identity.household_id)
+        
+        error_msg = "⚠️ *Cannot shuffle yet!*"
+        if not members:
+            error_msg += "\n• No active members found. Share the join link!"
+        if not tasks:
+            error_msg += "\n• No tasks found. Add some tasks first."
         
-        if not assignments:
-            # Check why it failed
-            from services.assignment import get_active_members, get_active_tasks
-            members = await get_active_members(session)
-            tasks = await get_active_tasks(session)
-            
-            error_msg = "⚠️ *Cannot shuffle yet!*"
-            if not members:
-                error_msg += "\n• No active members found. Share the join link!"
-            if not tasks:
-                error_msg += "\n• No tasks found. Add some tasks first."
-            
-            await callback.message.answer(error_msg, parse_mode="Markdown")
-        else:
-            schedule = format_assignments_table(assignments)
-            await callback.message.answer(
-                f"🔀 *Assignments Shuffled!*\n\n{schedule}",
-                parse_mode="Markdown"
-            )
+        await callback.message.answer(error_msg, parse_mode="Markdown")
+    else:
+        schedule = await run_cpu(format_assignments_table, assignments, target_week)
+        await callback.message.answer(
+            f"🔀 *Assignments Shuffled!*\n\n{schedule}",
+            parse_mode="Markdown"
+        )
     await callback.answer()
 
 
+@router.callback_query(F.data == "upcoming_weeks")
+async def cb_upcoming_weeks(callback: CallbackQuery, identity: Identity, session: AsyncSession):
+    if not identity.manages_household:
+        await callback.answer("⛔ Admins only!", show_alert=True)
+        return
+    
+    upcoming = await get_upcoming_assignments(session, identity.household_id, max(config.PRECOMPUTE_WEEKS, 1))
+    await callback.message.edit_text(
+        await run_cpu(format_upcoming_schedule, upcoming),
+        reply_markup=get_admin_panel(),
+        parse_mode="Markdown"
+    )
+
+
 @router.callback_query(F.data == "test_notification")
-async def cb_test_notification(callback: CallbackQuery):
-    async with async_session() as session:
-        await send_weekly_notification(callback.bot, session)
-        await callback.answer("Notification sent!")
+async def cb_test_notification(callback: CallbackQuery, identity: Identity, session: AsyncSession):
+    if not identity.manages_household:
+        await callback.answer("⛔ Admins only!", show_alert=True)
+        return
+    
+    household = await session.get(Household, identity.household_id)
+    await queue_weekly_notification(session, household, f"test:{callback.id}")
+    await session.commit()
+    wake_outbox()
+    await callback.answer("Notification queued!")
+
 
+# ============== Settings ==============
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+@router.message(Command("schedule"))
+async def cmd_schedule(message: Message, command: CommandObject, identity: Identity, session: AsyncSession):
+    """Set the household's weekly notification time: /schedule <day 0-6> <hour 0-23> [timezone]."""
+    usage = "Usage: `/schedule <day 0-6> <hour 0-23> [timezone]`\ne.g. `/schedule 0 9 Europe/Berlin`"
+    
+    if not identity.manages_household:
+        await message.answer("⛔ This command is for admins only.")
+        return
+    
+    household = await session.get(Household, identity.household_id)
+    args = (command.args or "").split()
+    try:
+        day, hour = int(args[0]), int(args[1])
+        if not (0 <= day <= 6 and 0 <= hour <= 23):
+            raise ValueError()
+        tz_name = args[2] if len(args) > 2 else household.timezone
+        if tz_name:
+            ZoneInfo(tz_name)
+    except (IndexError, ValueError, ZoneInfoNotFoundError):
+        await message.answer(usage, parse_mode="Markdown")
+        return
+    
+    household.notification_day = day
+    household.notification_hour = hour
+    household.timezone = tz_name
+    household.next_run_at = household_next_run(household, (day, hour), datetime.utcnow())
+    await session.commit()
+    # Cached identities carry the timezone; changes are rare, so drop them all
+    identity_cache.clear()
+    
+    await message.answer(
+        f"⏰ Weekly schedule set to *{DAY_NAMES[day]} {hour:02d}:00*"
+        f"{f' ({tz_name})' if tz_name else ''}.",
+        parse_mode="Markdown"
+    )
+
+
+@router.message(Command("default_schedule"))
+async def cmd_default_schedule(message: Message, command: CommandObject, session: AsyncSession):
+    """Set the bot-wide default notification time: /default_schedule <day 0-6> <hour 0-23>."""
+    if not config.SUPERUSER_ID or message.from_user.id != config.SUPERUSER_ID:
+        await message.answer("⛔ This command is for the bot owner only.")
+        return
+    
+    args = (command.args or "").split()
+    try:
+        day, hour = int(args[0]), int(args[1])
+        if not (0 <= day <= 6 and 0 <= hour <= 23):
+            raise ValueError()
+    except (IndexError, ValueError):
+        await message.answer("Usage: `/default_schedule <day 0-6> <hour 0-23>`", parse_mode="Markdown")
+        return
+    
+    # Households without their own time are rescheduled by the settings change callback
+    await settings_store.set(session, "notification_day", day)
+    await settings_store.set(session, "notification_hour", hour)
+    
+    await message.answer(
+        f"⏰ Default weekly schedule set to *{DAY_NAMES[day]} {hour:02d}:00*.",
+        parse_mode="Markdown"
+    )
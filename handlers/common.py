@@ -1,99 +1,144 @@
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command, CommandStart, CommandObject
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import async_session, select, Member
-from services.assignment import get_formatted_schedule, get_member_assignments
+from database import select, Member
+from services.cache import invalidate_identity
+from services.assignment import get_current_yearweek, get_formatted_schedule, get_member_task_names
+from services.household import get_join_household, get_or_create_household, is_household_admin, is_join_payload
+from services.identity import Identity
+from services.stats import format_stats, get_household_stats
 from keyboards import get_main_menu
-from config import config
 
 router = Router()
 
+NO_HOUSEHOLD_TEXT = (
+    "🏠 You are not part of a household yet.\n\n"
+    "Ask your admin for a join link, or add me to your group chat and send /start there."
+)
+
 
 @router.message(CommandStart())
-async def cmd_start(message: Message, command: CommandObject):
+async def cmd_start(message: Message, command: CommandObject, identity: Identity, session: AsyncSession):
     """Handle /start command. Supports deep linking for registration."""
     # Check for deep link parameters
     args = command.args
-    
-    if args == "register":
+    if is_join_payload(args):
         # Registration flow
         telegram_id = message.from_user.id
         name = message.from_user.first_name
         username = message.from_user.username
         
-        async with async_session() as session:
-            existing = await session.execute(
-                select(Member).where(Member.telegram_id == telegram_id)
+        household = await get_join_household(session, args)
+        if household is None:
+            await message.answer("❌ This join link is no longer valid.")
+            return
+        
+        existing = await session.execute(
+            select(Member).where(
+                Member.household_id == household.id,
+                Member.telegram_id == telegram_id
+            )
+        )
+        if existing.scalar_one_or_none():
+            await message.answer("✅ You are already registered!")
+        else:
+            member = Member(
+                household_id=household.id, telegram_id=telegram_id, name=name, username=username
             )
-            if existing.scalar_one_or_none():
-                await message.answer("✅ You are already registered!")
-            else:
-                member = Member(telegram_id=telegram_id, name=name, username=username)
-                session.add(member)
-                await session.commit()
-                await message.answer(f"✅ Welcome *{name}*! You have been added to the cleaning rota.", parse_mode="Markdown")
+            session.add(member)
+            await session.commit()
+            invalidate_identity(telegram_id)
+            await message.answer(f"✅ Welcome *{name}*! You have been added to the cleaning rota.", parse_mode="Markdown")
         
         # Show main menu after registration
         await message.answer(
             "🏠 *Main Menu*",
-            reply_markup=get_main_menu(is_admin=message.from_user.id == config.SUPERUSER_ID),
+            reply_markup=get_main_menu(is_admin=is_household_admin(household, telegram_id)),
             parse_mode="Markdown"
         )
         return
-
+    
+    is_admin = identity.is_admin
+    if message.chat.id != message.from_user.id and identity.household_id is None:
+        # Group chat seen for the first time: the chat itself becomes the household
+        household = await get_or_create_household(
+            session, message.chat.id, title=message.chat.title, admin_id=message.from_user.id
+        )
+        invalidate_identity(chat_id=message.chat.id)
+        is_admin = is_household_admin(household, message.from_user.id)
+    
     # Normal start
     await message.answer(
         "👋 *Welcome to CleanrBot!*\n\n"
         "I help manage weekly apartment cleaning duties.",
-        reply_markup=get_main_menu(is_admin=message.from_user.id == config.SUPERUSER_ID),
+        reply_markup=get_main_menu(is_admin=is_admin),
         parse_mode="Markdown"
     )
 
 
 @router.callback_query(F.data == "main_menu")
-async def cb_main_menu(callback: CallbackQuery):
+async def cb_main_menu(callback: CallbackQuery, identity: Identity):
     await callback.message.edit_text(
         "🏠 *Main Menu*",
-        reply_markup=get_main_menu(is_admin=callback.from_user.id == config.SUPERUSER_ID),
+        reply_markup=get_main_menu(is_admin=identity.is_admin),
         parse_mode="Markdown"
     )
 
 @router.callback_query(F.data == "full_schedule")
-async def cb_schedule(callback: CallbackQuery):
-    async with async_session() as session:
-        schedule = await get_formatted_schedule(session)
-        # Append "Back" button by creating a temporary keyboard or just sending a new message
-        # For simplicity, edit message and keep main menu button? 
-        # Better: Send as answer-alert or edit text and add Back button.
-        
-        # Let's edit text and add a Back button
-        from keyboards import get_main_menu # simplified back flow
-        back_kb = get_main_menu(is_admin=callback.from_user.id == config.SUPERUSER_ID)
-        
-        await callback.message.edit_text(schedule, reply_markup=back_kb, parse_mode="Markdown")
+async def cb_schedule(callback: CallbackQuery, identity: Identity, session: AsyncSession):
+    if identity.household_id is None:
+        await callback.answer(NO_HOUSEHOLD_TEXT, show_alert=True)
+        return
+    
+    schedule = await get_formatted_schedule(session, identity.household_id, target_week=identity.current_week)
+    # Append "Back" button by creating a temporary keyboard or just sending a new message
+    # For simplicity, edit message and keep main menu button?
+    # Better: Send as answer-alert or edit text and add Back button.
+    
+    # Let's edit text and add a Back button
+    from keyboards import get_main_menu # simplified back flow
+    back_kb = get_main_menu(is_admin=identity.is_admin)
+    
+    await callback.message.edit_text(schedule, reply_markup=back_kb, parse_mode="Markdown")
 
 
 @router.callback_query(F.data == "my_schedule")
-async def cb_my_tasks(callback: CallbackQuery):
-    async with async_session() as session:
-        assignments = await get_member_assignments(session, callback.from_user.id)
-        
-        back_kb = get_main_menu(is_admin=callback.from_user.id == config.SUPERUSER_ID)
-        
-        if not assignments:
-            await callback.message.edit_text(
-                "✨ You have no tasks assigned this week!",
-                reply_markup=back_kb,
-                parse_mode="Markdown"
-            )
-            return
-        
-        tasks = [a.task.name for a in assignments]
-        tasks_list = "\n".join(f"• {task}" for task in tasks)
-        
+async def cb_my_tasks(callback: CallbackQuery, identity: Identity, session: AsyncSession):
+    if identity.household_id is None:
+        await callback.answer(NO_HOUSEHOLD_TEXT, show_alert=True)
+        return
+    
+    tasks = await get_member_task_names(
+        session, identity.household_id, callback.from_user.id, target_week=identity.current_week
+    )
+    
+    back_kb = get_main_menu(is_admin=identity.is_admin)
+    
+    if not tasks:
         await callback.message.edit_text(
-            f"🧹 *Your Tasks This Week:*\n\n{tasks_list}",
+            "✨ You have no tasks assigned this week!",
             reply_markup=back_kb,
             parse_mode="Markdown"
         )
+        return
+    
+    tasks_list = "\n".join(f"• {task}" for task in tasks)
+    
+    await callback.message.edit_text(
+        f"🧹 *Your Tasks This Week:*\n\n{tasks_list}",
+        reply_markup=back_kb,
+        parse_mode="Markdown"
+    )
+
+
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, identity: Identity, session: AsyncSession):
+    """Show how often each member did each task."""
+    if identity.household_id is None:
+        await message.answer(NO_HOUSEHOLD_TEXT)
+        return
+    
+    rows = await get_household_stats(session, identity.household_id, get_current_yearweek())
+    await message.answer(format_stats(rows), parse_mode="Markdown")
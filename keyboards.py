@@ -32,6 +32,7 @@ def get_admin_panel() -> InlineKeyboardMarkup:
         InlineKeyboardButton(text="🔀 Shuffle Now", callback_data="shuffle_now"),
         InlineKeyboardButton(text="🔔 Test Notification", callback_data="test_notification")
     )
+    builder.row(InlineKeyboardButton(text="🗓 Upcoming Weeks", callback_data="upcoming_weeks"))
     builder.row(InlineKeyboardButton(text="🔙 Back", callback_data="main_menu"))
     
     return builder.as_markup()
@@ -0,0 +1,122 @@
+"""
+End-to-end load test against a fake Telegram Bot API.
+
+    python -m loadtest --households 50 --members 8 --duration 30
+
+Seeds a database with synthetic households, starts a local fake Bot API,
+runs the real Dispatcher (bot.create_dispatcher) in polling mode against
+it and lets every simulated member tap the menus in keyboards.py. Each
+member waits for the bot's reply before tapping again. Prints sustained
+updates/sec and latency percentiles; --json writes them for comparison
+between runs.
+
+Runs offline. Uses a fresh SQLite file unless --database-url is given.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--households", type=int, default=20)
+    parser.add_argument("--members", type=int, default=8, help="members per household")
+    parser.add_argument("--tasks", type=int, default=5, help="tasks per household")
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds to generate load")
+    parser.add_argument("--think", type=float, default=2.0, help="mean seconds between a member's taps")
+    parser.add_argument("--timeout", type=float, default=10.0, help="seconds before a tap counts as lost")
+    parser.add_argument("--writes", action="store_true", help="also tap write-heavy buttons (Shuffle Now)")
+    parser.add_argument("--database-url", help="database to use instead of a temporary SQLite file")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="write the summary to this file")
+    return parser.parse_args()
+
+
+async def simulate_member(user, api, report, deadline: float, args, rng: random.Random) -> None:
+    from loadtest.generator import next_tap
+    
+    # Spread the first taps out instead of starting everyone at once
+    await asyncio.sleep(rng.uniform(0, args.think))
+    while time.perf_counter() < deadline:
+        button, update = next_tap(user, rng, args.writes)
+        try:
+            end_to_end, processing = await asyncio.wait_for(api.push(update, user.telegram_id), args.timeout)
+            report.record(button, end_to_end, processing)
+        except asyncio.TimeoutError:
+            report.record_timeout(button)
+        think = rng.expovariate(1 / args.think) if args.think else 0
+        await asyncio.sleep(max(min(think, deadline - time.perf_counter()), 0))
+
+
+async def run(args: argparse.Namespace) -> None:
+    from aiohttp import web
+    
+    from bot import create_bot, create_dispatcher
+    from config import config
+    from database import async_session, engine, init_db
+    from loadtest.fake_api import FakeBotAPI
+    from loadtest.generator import seed
+    from loadtest.report import LoadReport
+    
+    # Per-update INFO logs would dominate the run
+    logging.getLogger().setLevel(logging.WARNING)
+    await init_db()
+    users = await seed(async_session, args.households, args.members, args.tasks)
+    print(f"Seeded {args.households} households, {len(users)} members")
+    
+    api = FakeBotAPI()
+    runner = web.AppRunner(api.create_app())
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    
+    config.BOT_API_URL = f"http://127.0.0.1:{port}"
+    config.BOT_TOKEN = "42:LOADTEST"
+    bot = create_bot()
+    dp = create_dispatcher()
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+    
+    report = LoadReport()
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    deadline = start + args.duration
+    await asyncio.gather(*(
+        simulate_member(user, api, report, deadline, args, random.Random(rng.random()))
+        for user in users
+    ))
+    report.duration = time.perf_counter() - start
+    report.api_calls = dict(api.calls)
+    
+    await dp.stop_polling()
+    await polling
+    await bot.session.close()
+    await runner.cleanup()
+    await engine.dispose()
+    
+    print(report.format())
+    if args.json:
+        report.write_json(args.json)
+
+
+def main() -> None:
+    args = parse_args()
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        path = Path(tempfile.mkdtemp()) / "loadtest.db"
+        os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{path}"
+    
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
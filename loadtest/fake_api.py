@@ -0,0 +1,123 @@
+"""
+Local stand-in for the Telegram Bot API.
+
+Serves getUpdates from an in-memory queue and answers the methods our
+handlers call. Every outgoing call that targets a chat (or a callback
+query) resolves the pending tap of that user, which is how the harness
+measures end-to-end latency.
+"""
+import asyncio
+import json
+import time
+from collections import defaultdict
+from typing import Any
+
+from aiohttp import web
+
+BOT_USER = {"id": 42, "is_bot": True, "first_name": "CleanrBot", "username": "cleanr_test_bot"}
+
+
+class FakeBotAPI:
+    """In-memory Bot API: queue updates with `push` and await the returned future."""
+    
+    def __init__(self):
+        self._updates: list[dict[str, Any]] = []
+        self._new_updates = asyncio.Event()
+        self._pending: dict[int, tuple[asyncio.Future, int, float, str | None]] = {}
+        self._callbacks: dict[str, int] = {}
+        self._next_update_id = 1
+        self._next_message_id = 1
+        self.calls: dict[str, int] = defaultdict(int)
+        self.delivered: dict[int, float] = {}
+    
+    def push(self, update: dict[str, Any], user_id: int) -> asyncio.Future:
+        """
+        Queue an update from `user_id`. The returned future resolves to
+        (seconds since queued, seconds since the bot fetched it) on the bot's first reply.
+        """
+        update["update_id"] = self._next_update_id
+        self._next_update_id += 1
+        callback_id = update.get("callback_query", {}).get("id")
+        if callback_id:
+            self._callbacks[callback_id] = user_id
+        
+        future = asyncio.get_running_loop().create_future()
+        self._pending[user_id] = (future, update["update_id"], time.perf_counter(), callback_id)
+        self._updates.append(update)
+        self._new_updates.set()
+        return future
+    
+    def _resolve(self, user_id: int | None) -> None:
+        if user_id is None:
+            return
+        pending = self._pending.pop(user_id, None)
+        if pending is None:
+            return
+        future, update_id, queued_at, callback_id = pending
+        self._callbacks.pop(callback_id, None)
+        if not future.done():
+            now = time.perf_counter()
+            future.set_result((now - queued_at, now - self.delivered.pop(update_id, queued_at)))
+    
+    def _message(self, chat_id: int, text: str, message_id: int | None = None) -> dict[str, Any]:
+        if message_id is None:
+            message_id = self._next_message_id
+            self._next_message_id += 1
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "group"},
+            "from": BOT_USER,
+            "text": text,
+        }
+    
+    async def _get_updates(self, params: dict[str, Any]) -> list[dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+        if not self._updates:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), float(params.get("timeout") or 0) or 0.1)
+            except asyncio.TimeoutError:
+                return []
+        
+        batch = self._updates[:int(params.get("limit") or 100)]
+        now = time.perf_counter()
+        for update in batch:
+            self.delivered.setdefault(update["update_id"], now)
+        return batch
+    
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params: dict[str, Any] = dict(request.query)
+        if request.can_read_body:
+            if request.content_type == "application/json":
+                params.update(await request.json())
+            else:
+                params.update(await request.post())
+        self.calls[method] += 1
+        
+        chat_id = int(params["chat_id"]) if "chat_id" in params else None
+        match method:
+            case "getUpdates":
+                result: Any = await self._get_updates(params)
+            case "getMe":
+                result = BOT_USER
+            case "sendMessage":
+                result = self._message(chat_id, params.get("text", ""))
+            case "editMessageText":
+                result = self._message(chat_id, params.get("text", ""), int(params.get("message_id") or 0))
+            case "answerCallbackQuery":
+                self._resolve(self._callbacks.get(params.get("callback_query_id")))
+                result = True
+            case _:
+                result = True
+        
+        self._resolve(chat_id)
+        return web.Response(text=json.dumps({"ok": True, "result": result}), content_type="application/json")
+    
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        app.router.add_get("/bot{token}/{method}", self.handle)
+        return app
@@ -0,0 +1,104 @@
+"""
+Synthetic households and the menu taps their members make.
+
+Buttons are read from keyboards.py, so new menu entries are exercised
+automatically. Buttons that start a text conversation or message the
+group are skipped; write-heavy ones only run with `writes=True`.
+"""
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from functools import cache
+from typing import Any
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database import Household, Member, Task
+from keyboards import get_admin_panel, get_main_menu
+from services.assignment import shuffle_assignments
+
+SKIPPED_BUTTONS = {"add_task", "test_notification"}
+WRITE_BUTTONS = {"shuffle_now"}
+
+
+@dataclass(frozen=True)
+class SimUser:
+    telegram_id: int
+    household_chat_id: int
+    is_admin: bool
+
+
+@cache
+def menu_buttons(is_admin: bool, writes: bool = False) -> tuple[str, ...]:
+    """Callback data of the buttons a user can reach from the main menu."""
+    markups = [get_main_menu(is_admin=is_admin)]
+    if is_admin:
+        markups.append(get_admin_panel())
+    buttons = [
+        button.callback_data
+        for markup in markups
+        for row in markup.inline_keyboard
+        for button in row
+        if button.callback_data
+    ]
+    skipped = SKIPPED_BUTTONS if writes else SKIPPED_BUTTONS | WRITE_BUTTONS
+    return tuple(data for data in dict.fromkeys(buttons) if data not in skipped)
+
+
+async def seed(
+    session_factory: async_sessionmaker, households: int, members: int, tasks: int
+) -> list[SimUser]:
+    """Create households with members and tasks, shuffle them once and return the simulated users."""
+    users = []
+    async with session_factory() as session:
+        for h in range(households):
+            chat_id = -1_000_000 - h
+            admin_id = 10_000_000 + h * members
+            session.add(Household(chat_id=chat_id, title=f"Load {h}", admin_id=admin_id))
+            for m in range(members):
+                users.append(SimUser(admin_id + m, chat_id, is_admin=m == 0))
+        await session.commit()
+        
+        ids = dict((await session.execute(select(Household.chat_id, Household.id))).all())
+        await session.execute(insert(Member), [
+            {"household_id": ids[u.household_chat_id], "telegram_id": u.telegram_id, "name": f"User {u.telegram_id}"}
+            for u in users
+        ])
+        await session.execute(insert(Task), [
+            {"household_id": household_id, "name": f"Task {t}", "required_people": 1 + t % 2}
+            for household_id in ids.values()
+            for t in range(tasks)
+        ])
+        await session.commit()
+        
+        for household_id in ids.values():
+            await shuffle_assignments(session, household_id)
+    return users
+
+
+def make_tap(user: SimUser, data: str) -> dict[str, Any]:
+    """A callback_query update for `user` tapping the button with `data` in their private chat."""
+    sender = {"id": user.telegram_id, "is_bot": False, "first_name": f"User {user.telegram_id}"}
+    return {
+        "callback_query": {
+            "id": uuid.uuid4().hex,
+            "from": sender,
+            "chat_instance": str(user.telegram_id),
+            "data": data,
+            "message": {
+                "message_id": 1,
+                "date": int(time.time()),
+                "chat": {"id": user.telegram_id, "type": "private"},
+                "from": {"id": 42, "is_bot": True, "first_name": "CleanrBot"},
+                "text": "🏠 Main Menu",
+            },
+        }
+    }
+
+
+def next_tap(user: SimUser, rng: random.Random, writes: bool = False) -> tuple[str, dict[str, Any]]:
+    """Pick a random button for `user`; returns (button, update)."""
+    data = rng.choice(menu_buttons(user.is_admin, writes))
+    return data, make_tap(user, data)
@@ -0,0 +1,86 @@
+import json
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+@dataclass
+class LoadReport:
+    """Latencies per button plus timeouts, collected during a run."""
+    duration: float = 0.0
+    # button -> [(end-to-end seconds, bot processing seconds)]
+    samples: dict[str, list[tuple[float, float]]] = field(default_factory=dict)
+    timeouts: dict[str, int] = field(default_factory=dict)
+    api_calls: dict[str, int] = field(default_factory=dict)
+    
+    def record(self, button: str, end_to_end: float, processing: float) -> None:
+        self.samples.setdefault(button, []).append((end_to_end, processing))
+    
+    def record_timeout(self, button: str) -> None:
+        self.timeouts[button] = self.timeouts.get(button, 0) + 1
+    
+    @property
+    def completed(self) -> int:
+        return sum(len(s) for s in self.samples.values())
+    
+    @property
+    def throughput(self) -> float:
+        """Sustained updates handled per second."""
+        return self.completed / self.duration if self.duration else 0.0
+    
+    @staticmethod
+    def _percentiles(values: list[float]) -> dict[str, float]:
+        if not values:
+            return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+        p50, p95, p99 = np.percentile(values, [50, 95, 99]) * 1000
+        return {"p50": float(p50), "p95": float(p95), "p99": float(p99), "max": max(values) * 1000}
+    
+    def summary(self) -> dict:
+        """Throughput and latency percentiles (ms), overall and per button."""
+        every = [s for samples in self.samples.values() for s in samples]
+        buttons = {}
+        for button in sorted(self.samples.keys() | self.timeouts.keys()):
+            samples = self.samples.get(button, [])
+            buttons[button] = {
+                "count": len(samples),
+                "timeouts": self.timeouts.get(button, 0),
+                "end_to_end_ms": self._percentiles([s[0] for s in samples]),
+                "processing_ms": self._percentiles([s[1] for s in samples]),
+            }
+        return {
+            "duration_s": round(self.duration, 2),
+            "completed": self.completed,
+            "timeouts": sum(self.timeouts.values()),
+            "updates_per_s": round(self.throughput, 1),
+            "end_to_end_ms": self._percentiles([s[0] for s in every]),
+            "processing_ms": self._percentiles([s[1] for s in every]),
+            "buttons": buttons,
+            "api_calls": dict(self.api_calls),
+        }
+    
+    def format(self) -> str:
+        """Human-readable table of the summary."""
+        summary = self.summary()
+        lines = [
+            f"{summary['completed']} updates in {summary['duration_s']}s "
+            f"({summary['updates_per_s']} updates/s), {summary['timeouts']} timeouts",
+            "",
+            f"{'button':<16} {'count':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}   (processing ms)",
+        ]
+        rows = list(summary["buttons"].items()) + [("all", {"count": summary["completed"], **summary})]
+        for button, stats in rows:
+            p = stats["processing_ms"]
+            lines.append(
+                f"{button:<16} {stats['count']:>7} {p['p50']:>8.1f} {p['p95']:>8.1f} {p['p99']:>8.1f} {p['max']:>8.1f}"
+            )
+        e = summary["end_to_end_ms"]
+        lines.append("")
+        lines.append(
+            f"End to end incl. queueing: p50 {e['p50']:.1f} ms, p95 {e['p95']:.1f} ms, "
+            f"p99 {e['p99']:.1f} ms, max {e['max']:.1f} ms"
+        )
+        return "\n".join(lines)
+    
+    def write_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
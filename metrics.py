@@ -0,0 +1,236 @@
+"""
+Prometheus metrics.
+
+Statements are timed with SQLAlchemy cursor events and labelled with the
+service function that issued them (see `db_operation`). Pool checkouts
+are timed by `InstrumentedQueuePool`. Handler latency, errors and Bot API
+time are recorded by the middlewares in `middlewares.metrics`, the weekly
+dispatcher reports its queue depth and lag, and `watch_event_loop` reports
+how late the event loop runs timers. `CacheCollector` reads the in-process
+caches' counters at scrape time.
+Everything is served in the Prometheus text format at METRICS_PATH.
+"""
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from aiohttp import web
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from config import config
+from services.cache import identity_cache, member_tasks_index, schedule_cache
+
+logger = logging.getLogger(__name__)
+
+# Service function currently talking to the database
+current_operation: ContextVar[str] = ContextVar("current_operation", default="other")
+# Seconds spent in the database and the Bot API by the current handler, see `track_time`
+time_spent: ContextVar[dict[str, float] | None] = ContextVar("time_spent", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement latency",
+    ["operation", "statement"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+DB_SLOW_QUERIES = Counter("db_slow_queries_total", "Statements slower than SLOW_QUERY_MS", ["operation"])
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+DB_POOL_OVERFLOW = Counter("db_pool_overflow_connections_total", "Connections opened beyond pool_size")
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Checkouts that timed out waiting for a connection")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out")
+
+UPDATES = Counter("bot_updates_total", "Updates received", ["type"])
+HANDLER_SECONDS = Histogram(
+    "bot_handler_duration_seconds", "End-to-end handler latency", ["handler"], buckets=LATENCY_BUCKETS
+)
+HANDLER_PART_SECONDS = Histogram(
+    "bot_handler_time_spent_seconds",
+    "Handler latency split into db, bot_api and own processing time",
+    ["handler", "part"],
+    buckets=LATENCY_BUCKETS
+)
+HANDLER_ERRORS = Counter("bot_handler_errors_total", "Handlers that raised", ["handler", "error"])
+BOT_API_SECONDS = Histogram(
+    "bot_api_request_duration_seconds", "Outbound Bot API call latency", ["method"], buckets=LATENCY_BUCKETS
+)
+BOT_API_ERRORS = Counter("bot_api_errors_total", "Failed Bot API calls", ["method", "error"])
+
+OUTBOX_MESSAGES = Counter("outbox_messages_total", "Outbox delivery attempts by outcome", ["result"])
+
+DISPATCH_QUEUE_DEPTH = Gauge("dispatch_queue_depth", "Claimed weekly runs waiting for a worker")
+DISPATCH_IN_FLIGHT = Gauge("dispatch_in_flight", "Weekly runs currently executing")
+DISPATCH_LAG_SECONDS = Histogram(
+    "dispatch_lag_seconds",
+    "Delay between a weekly run's (jittered) due time and its start",
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+)
+
+EVENT_LOOP_LAG_SECONDS = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop woke the watchdog's timer",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+EVENT_LOOP_STALLS = Counter("event_loop_stalls_total", "Event loop lags above LOOP_LAG_THRESHOLD")
+
+
+class CacheCollector(Collector):
+    """Hits, misses and size of the in-process caches, labelled by cache."""
+    
+    caches = {"schedule": schedule_cache, "member_tasks": member_tasks_index, "identity": identity_cache}
+    
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache lookups that found a value", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache lookups that found nothing", labels=["cache"])
+        size = GaugeMetricFamily("cache_entries", "Entries currently cached", labels=["cache"])
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            size.add_metric([name], stats["size"])
+        return [hits, misses, size]
+
+
+REGISTRY.register(CacheCollector())
+
+
+def track_time(part: str, seconds: float) -> None:
+    """Add time spent in `part` (db, bot_api) to the running handler's tally, if any."""
+    spent = time_spent.get()
+    if spent is not None:
+        spent[part] = spent.get(part, 0.0) + seconds
+
+
+def db_operation(func):
+    """Label the database statements issued by an async service function with its name."""
+    name = func.__name__
+    
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        token = current_operation.set(name)
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            current_operation.reset(token)
+    
+    return wrapper
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long checkouts wait and when it opens overflow connections."""
+    
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - start)
+        return conn
+    
+    def _inc_overflow(self) -> bool:
+        opened = super()._inc_overflow()
+        if opened and self._overflow > 0:
+            DB_POOL_OVERFLOW.inc()
+        return opened
+
+
+def pool_options(url: str) -> dict:
+    """Engine keyword arguments for the connection pool (SQLite keeps its default pool)."""
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attach statement timing and pool gauges to a (sync) engine."""
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+    
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        track_time("db", elapsed)
+        operation = current_operation.get()
+        DB_QUERY_SECONDS.labels(operation, statement.lstrip().split(None, 1)[0].upper()).observe(elapsed)
+        
+        if elapsed * 1000 >= config.SLOW_QUERY_MS:
+            DB_SLOW_QUERIES.labels(operation).inc()
+            logger.warning(f"Slow query in {operation} ({elapsed * 1000:.0f} ms): {statement[:500]}")
+    
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        # Keep the timing stack balanced when a statement fails
+        if context.connection is not None and context.connection.info.get("query_start"):
+            context.connection.info["query_start"].pop()
+    
+    @event.listens_for(engine.pool, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+    
+    @event.listens_for(engine.pool, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    """Serve all metrics in the Prometheus text format."""
+    return web.Response(body=generate_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+async def watch_event_loop(
+    interval: float = config.LOOP_LAG_INTERVAL, threshold: float = config.LOOP_LAG_THRESHOLD
+) -> None:
+    """
+    Sleep `interval` seconds in a loop and record how much later than asked the
+    loop woke up. Anything blocking the loop (CPU work, sync I/O) shows up as lag;
+    lags above `threshold` are logged and counted as stalls.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(loop.time() - start - interval, 0.0)
+        EVENT_LOOP_LAG_SECONDS.observe(lag)
+        if lag > threshold:
+            EVENT_LOOP_STALLS.inc()
+            logger.warning(f"Event loop stalled for {lag * 1000:.0f} ms")
+
+
+def setup_metrics(app: web.Application) -> None:
+    """Add the metrics endpoint to an aiohttp application."""
+    app.router.add_get(config.METRICS_PATH, metrics_handler)
+
+
+async def start_metrics_server() -> web.AppRunner:
+    """Serve metrics on their own host and port, away from the public webhook listener."""
+    app = web.Application()
+    setup_metrics(app)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, config.METRICS_HOST, config.METRICS_PORT).start()
+    logger.info(f"Serving metrics on {config.METRICS_HOST}:{config.METRICS_PORT}{config.METRICS_PATH}")
+    return runner
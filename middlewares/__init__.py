@@ -0,0 +1,12 @@
+# Middlewares package
+from middlewares.db import DbSessionMiddleware
+from middlewares.identity import IdentityMiddleware
+from middlewares.metrics import BotApiMetricsMiddleware, HandlerMetricsMiddleware, UpdateMetricsMiddleware
+
+__all__ = [
+    "BotApiMetricsMiddleware",
+    "DbSessionMiddleware",
+    "HandlerMetricsMiddleware",
+    "IdentityMiddleware",
+    "UpdateMetricsMiddleware",
+]
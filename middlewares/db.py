@@ -0,0 +1,37 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database import async_session
+
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Outer middleware that gives each update one session, passed to handlers
+    as `session`. The session only checks out a pooled connection on its
+    first query, so updates that never touch the database borrow none.
+    Pending work is committed after the handler and rolled back on error.
+    """
+    
+    def __init__(self, session_factory: async_sessionmaker = async_session):
+        self.session_factory = session_factory
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        async with self.session_factory() as session:
+            data["session"] = session
+            try:
+                result = await handler(event, data)
+            except Exception:
+                await session.rollback()
+                raise
+            if session.in_transaction():
+                await session.commit()
+            return result
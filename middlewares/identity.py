@@ -0,0 +1,48 @@
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from database import async_session
+from services.cache import identity_cache
+from services.identity import load_identity
+
+
+class IdentityMiddleware(BaseMiddleware):
+    """
+    Outer middleware that resolves the caller's household, membership and
+    role once per update and passes it to handlers as `identity`.
+    Identities are cached, so most updates need no database query at all.
+    Runs after DbSessionMiddleware so misses use the update's session.
+    """
+    
+    def __init__(self, session_factory: async_sessionmaker = async_session):
+        self.session_factory = session_factory
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        chat = data.get("event_chat")
+        if user is None:
+            data["identity"] = None
+            return await handler(event, data)
+        
+        key = (chat.id if chat else user.id, user.id)
+        # One lookup: the entry may expire between a membership test and a get
+        identity = identity_cache.get(key)
+        if identity is None:
+            if "session" in data:
+                # Reuse the update's session from DbSessionMiddleware
+                identity = await load_identity(data["session"], *key)
+            else:
+                async with self.session_factory() as session:
+                    identity = await load_identity(session, *key)
+            identity_cache.set(key, identity)
+        data["identity"] = identity
+        return await handler(event, data)
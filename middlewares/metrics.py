@@ -0,0 +1,83 @@
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject, Update
+
+from metrics import (
+    BOT_API_ERRORS, BOT_API_SECONDS, HANDLER_ERRORS, HANDLER_PART_SECONDS, HANDLER_SECONDS, UPDATES,
+    time_spent, track_time
+)
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """Outer update middleware counting every update by type (throughput)."""
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Update):
+            UPDATES.labels(event.event_type).inc()
+        return await handler(event, data)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Inner middleware timing each handler end to end, split into database,
+    Bot API and our own processing time, and counting errors.
+    """
+    
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any]
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(handler_object.callback, "__name__", "unknown") if handler_object else "unknown"
+        
+        spent: dict[str, float] = {}
+        token = time_spent.set(spent)
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            HANDLER_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            time_spent.reset(token)
+            HANDLER_SECONDS.labels(name).observe(elapsed)
+            db, bot_api = spent.get("db", 0.0), spent.get("bot_api", 0.0)
+            HANDLER_PART_SECONDS.labels(name, "db").observe(db)
+            HANDLER_PART_SECONDS.labels(name, "bot_api").observe(bot_api)
+            HANDLER_PART_SECONDS.labels(name, "own").observe(max(elapsed - db - bot_api, 0.0))
+
+
+class BotApiMetricsMiddleware(BaseRequestMiddleware):
+    """Bot session middleware timing outbound Bot API calls."""
+    
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType]
+    ) -> Response[TelegramType]:
+        name = method.__api_method__
+        start = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            BOT_API_ERRORS.labels(name, type(e).__name__).inc()
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            BOT_API_SECONDS.labels(name).observe(elapsed)
+            track_time("bot_api", elapsed)
@@ -1,78 +1,205 @@
-import asyncio
+import logging
+from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from aiogram import Bot
-from sqlalchemy import select
+from apscheduler.triggers.interval import IntervalTrigger
 
-from database import async_session, Settings
+from database import async_session, Household
 from config import config
-from services.assignment import shuffle_assignments
-from services.notifier import send_weekly_notification
+from fsm_storage import purge_expired_states
+from services.assignment import ensure_current_assignments, precompute_assignments
+from services.cache import invalidate_schedule
+from services.dispatcher import dispatch_due, household_week, reschedule_households
+from services.household import get_active_households
+from services.locks import claim_run, finish_run, get_run_status, leader_lock
+from services.notifier import build_weekly_messages
+from services.outbox import enqueue_messages, purge_sent_messages, wake_outbox
+from services.retention import apply_retention
+from services.stats import backfill_stats
+from services.settings import settings_store
 
+logger = logging.getLogger(__name__)
 
 scheduler = AsyncIOScheduler(timezone=config.TIMEZONE)
 
 
-async def weekly_shuffle_and_notify(bot: Bot):
-    """Weekly job: shuffle assignments and send notifications."""
+async def weekly_shuffle_and_notify(household: Household, scheduled_at: datetime | None = None) -> bool:
+    """
+    Weekly job for one household: make sure the week has a schedule and queue
+    its notifications. Weeks prepared by the nightly precompute are only read;
+    the week is shuffled here only if it is missing or no longer fits the
+    roster. The schedule, the outbox messages and the job_runs claim commit
+    together, so a household is never shuffled twice even if several replicas
+    pick it up, and a committed week always gets its notifications; the
+    outbox worker sends them afterwards. Returns whether the week is done, so
+    the dispatcher retries it otherwise.
+    """
+    # The week that starts for the household, e.g. Monday 02:00 in Tashkent is still Sunday in UTC
+    target_week = household_week(household, scheduled_at or datetime.utcnow())
+    week, year = target_week
+    period = f"{year}-W{week:02d}"
+    job = f"weekly_shuffle:{household.id}"
+    
     async with async_session() as session:
-        # Shuffle assignments
-        await shuffle_assignments(session)
+        if not await claim_run(session, job, period):
+            # Already done, or another replica is still on it
+            return await get_run_status(session, job, period) == "done"
         
-        # Send notification to group
-        await send_weekly_notification(bot, session)
+        try:
+            # Use the precomputed week, or shuffle now in this transaction
+            shuffled = await ensure_current_assignments(
+                session, household.id, commit=False, target_week=target_week
+            )
+            
+            # Group reminder plus a DM for every assigned member
+            messages = await build_weekly_messages(
+                session, household, cached=not shuffled, target_week=target_week
+            )
+            await enqueue_messages(session, messages, f"weekly:{household.id}:{period}")
+        except Exception:
+            await session.rollback()
+            await finish_run(session, job, period, ok=False)
+            raise
+        await finish_run(session, job, period)
+    
+    if shuffled:
+        invalidate_schedule(household.id)
+    wake_outbox()
+    logger.info(f"Queued {len(messages)} weekly notifications for household {household.id}")
+    return True
+
+
+async def dispatch_weekly_runs():
+    """Run the weekly job for every household that is due."""
+    defaults = await get_notification_settings()
+    async with async_session() as session:
+        await reschedule_households(session, defaults, only_unscheduled=True)
+    
+    dispatched = await dispatch_due(async_session, defaults, weekly_shuffle_and_notify)
+    if dispatched:
+        logger.info(f"Dispatched weekly runs for {dispatched} households")
 
 
 async def get_notification_settings() -> tuple[int, int]:
-    """Get notification day and hour from database or config."""
+    """Get the default notification day and hour from the settings cache."""
     async with async_session() as session:
-        day_result = await session.execute(
-            select(Settings).where(Settings.key == "notification_day")
-        )
-        hour_result = await session.execute(
-            select(Settings).where(Settings.key == "notification_hour")
-        )
-        
-        day_setting = day_result.scalar_one_or_none()
-        hour_setting = hour_result.scalar_one_or_none()
-        
-        day = int(day_setting.value) if day_setting else config.NOTIFICATION_DAY
-        hour = int(hour_setting.value) if hour_setting else config.NOTIFICATION_HOUR
-        
+        day = await settings_store.get(session, "notification_day")
+        hour = await settings_store.get(session, "notification_hour")
         return day, hour
 
 
-def setup_scheduler(bot: Bot):
-    """Setup the scheduler with weekly jobs."""
-    async def run_job():
-        await weekly_shuffle_and_notify(bot)
-    
-    async def update_schedule():
-        """Update the scheduler with current settings."""
-        day, hour = await get_notification_settings()
-        
-        # Remove existing job if any
-        try:
-            scheduler.remove_job("weekly_notification")
-        except:
-            pass
+async def on_settings_change(household_id: int | None, key: str, value):
+    """Reschedule households when the default notification time changes."""
+    if household_id is None and key in ("notification_day", "notification_hour"):
+        await update_schedule()
+
+
+async def purge_outbox():
+    """Delete delivered outbox messages past their retention."""
+    async with async_session() as session:
+        deleted = await purge_sent_messages(session)
+    if deleted:
+        logger.info(f"Purged {deleted} sent outbox messages")
+
+
+async def purge_fsm_states():
+    """Delete abandoned conversation states."""
+    deleted = await purge_expired_states(async_session)
+    if deleted:
+        logger.info(f"Purged {deleted} expired FSM states")
+
+
+async def precompute_schedules():
+    """Plan the upcoming weeks of every household off-peak (one replica at a time)."""
+    async with leader_lock("assignment_precompute") as leader:
+        if not leader:
+            return
+        async with async_session() as session:
+            households = await get_active_households(session)
         
-        # APScheduler uses 0=Monday, which matches our config
-        # CronTrigger day_of_week: 0=Monday, 6=Sunday
+        planned = 0
+        for household in households:
+            try:
+                async with async_session() as session:
+                    planned += len(await precompute_assignments(session, household.id))
+            except Exception:
+                logger.exception(f"Precomputing assignments for household {household.id} failed")
+        if planned:
+            logger.info(f"Precomputed {planned} household-weeks for {len(households)} households")
+
+
+async def run_retention():
+    """Roll old assignment weeks up into the yearly summaries (one replica at a time)."""
+    async with leader_lock("assignment_retention") as leader:
+        if leader:
+            await apply_retention(async_session)
+
+
+async def backfill_member_stats():
+    """Build the /stats counters from the existing history (once across all replicas)."""
+    await backfill_stats(async_session)
+
+
+def setup_scheduler():
+    """Setup the scheduler with the weekly due-queue dispatcher."""
+    settings_store.on_change(on_settings_change)
+    
+    scheduler.add_job(
+        dispatch_weekly_runs,
+        IntervalTrigger(seconds=config.DISPATCH_INTERVAL),
+        id="weekly_dispatch",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    scheduler.add_job(
+        purge_fsm_states,
+        IntervalTrigger(hours=1),
+        id="fsm_purge",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    scheduler.add_job(
+        purge_outbox,
+        IntervalTrigger(hours=1),
+        id="outbox_purge",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    scheduler.add_job(
+        run_retention,
+        CronTrigger(hour=config.RETENTION_HOUR, minute=17, timezone="UTC"),
+        id="assignment_retention",
+        max_instances=1,
+        coalesce=True,
+        replace_existing=True
+    )
+    if config.PRECOMPUTE_WEEKS:
         scheduler.add_job(
-            run_job,
-            CronTrigger(day_of_week=day, hour=hour, minute=0),
-            id="weekly_notification",
+            precompute_schedules,
+            CronTrigger(hour=config.PRECOMPUTE_HOUR, minute=7, timezone="UTC"),
+            id="assignment_precompute",
+            max_instances=1,
+            coalesce=True,
             replace_existing=True
         )
-        print(f"Scheduler set for day {day}, hour {hour}")
-    
-    # Schedule the update
-    asyncio.get_event_loop().create_task(update_schedule())
+    # Runs once on startup
+    scheduler.add_job(backfill_member_stats, id="stats_backfill", replace_existing=True)
     
     return scheduler
 
 
+async def update_schedule():
+    """Recompute the next run of households that use the default notification time."""
+    defaults = await get_notification_settings()
+    async with async_session() as session:
+        count = await reschedule_households(session, defaults, only_defaults=True)
+    day, hour = defaults
+    logger.info(f"Default schedule set for day {day}, hour {hour} ({count} households rescheduled)")
+
+
 def start_scheduler():
     """Start the scheduler."""
     if not scheduler.running:
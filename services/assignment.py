@@ -1,10 +1,17 @@
-import random
-from datetime import datetime
-from sqlalchemy import select, delete
+from collections import Counter
+from datetime import date, datetime, timedelta
+import numpy as np
+from sqlalchemy import select, delete, insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
 
-from database import Member, Task, Assignment
+from config import config
+from database import Member, Task, Assignment, pack_yearweek
+from metrics import db_operation
+from services.cache import schedule_cache, member_tasks_index, invalidate_schedule
+from services.cpu import run_cpu
+from services.read_models import AssignmentRow, get_week_rows
+from services.solver import solve_week
+from services.stats import record_assignment_changes
 
 
 def get_current_week() -> tuple[int, int]:
@@ -14,123 +21,409 @@ def get_current_week() -> tuple[int, int]:
     return iso_calendar[1], iso_calendar[0]  # week, year
 
 
-async def get_active_members(session: AsyncSession) -> list[Member]:
-    """Get all active members."""
+@db_operation
+async def get_active_members(session: AsyncSession, household_id: int) -> list[Member]:
+    """Get all active members of a household."""
     result = await session.execute(
-        select(Member).where(Member.active == True).order_by(Member.name)
+        select(Member)
+        .where(Member.household_id == household_id, Member.active == True)
+        .order_by(Member.name)
     )
     return list(result.scalars().all())
 
 
-async def get_active_tasks(session: AsyncSession) -> list[Task]:
-    """Get all active tasks."""
+@db_operation
+async def get_active_tasks(session: AsyncSession, household_id: int) -> list[Task]:
+    """Get all active tasks of a household."""
     result = await session.execute(
-        select(Task).where(Task.active == True).order_by(Task.name)
+        select(Task)
+        .where(Task.household_id == household_id, Task.active == True)
+        .order_by(Task.name)
     )
     return list(result.scalars().all())
 
 
-async def get_current_assignments(session: AsyncSession) -> list[Assignment]:
-    """Get assignments for the current week."""
+def get_current_yearweek() -> int:
+    """Get the current ISO week packed as a yearweek key."""
     week, year = get_current_week()
-    result = await session.execute(
-        select(Assignment)
-        .options(selectinload(Assignment.member), selectinload(Assignment.task))
-        .where(Assignment.week_number == week, Assignment.year == year)
-    )
-    return list(result.scalars().all())
+    return pack_yearweek(year, week)
 
 
-async def get_member_assignments(session: AsyncSession, telegram_id: int) -> list[Assignment]:
-    """Get current week's assignments for a specific member."""
+def yearweek_weeks_ago(weeks: int) -> int:
+    """Get the yearweek key of the week `weeks` weeks before the current one."""
     week, year = get_current_week()
+    current_monday = date.fromisocalendar(year, week, 1)
+    oldest_year, oldest_week, _ = (current_monday - timedelta(weeks=weeks)).isocalendar()
+    return pack_yearweek(oldest_year, oldest_week)
+
+
+async def load_member_tasks_index(
+    session: AsyncSession, household_id: int, yearweek: int
+) -> dict[int, tuple[str, ...]]:
+    """Load a household's week as {telegram_id: task names} in one query."""
+    index: dict[int, list[str]] = {}
+    for row in await get_week_rows(session, household_id, yearweek):
+        index.setdefault(row.telegram_id, []).append(row.task_name)
+    return {telegram_id: tuple(names) for telegram_id, names in index.items()}
+
+
+async def get_member_tasks_index(
+    session: AsyncSession, household_id: int, cached: bool = True, target_week: tuple[int, int] | None = None
+) -> dict[int, tuple[str, ...]]:
+    """
+    Get the current week's (or the (week, year) `target_week`'s) {telegram_id: task names} for a household.
+    Served from the in-memory per-member index; a cold index is loaded in bulk.
+    `cached=False` reads the session's view, e.g. uncommitted writes, without the index.
+    """
+    week, year = target_week or get_current_week()
+    key = (household_id, pack_yearweek(year, week))
+    if not cached:
+        return await load_member_tasks_index(session, household_id, key[1])
+    index = member_tasks_index.get(key)
+    if index is None:
+        index = await load_member_tasks_index(session, household_id, key[1])
+        member_tasks_index.set(key, index)
+    return index
+
+
+async def get_member_task_names(
+    session: AsyncSession, household_id: int, telegram_id: int, target_week: tuple[int, int] | None = None
+) -> list[str]:
+    """Get a member's task names for the current week or `target_week`."""
+    index = await get_member_tasks_index(session, household_id, target_week=target_week)
+    return list(index.get(telegram_id, ()))
+
+
+@db_operation
+async def get_assignment_history(
+    session: AsyncSession, household_id: int, weeks: int, before: tuple[int, int] | None = None
+) -> list[tuple[int, int, int]]:
+    """
+    Get a household's assignments from the last `weeks` weeks before the
+    current one, or before the (week, year) `before`.
+    Returns (member_id, task_id, age_in_weeks) tuples.
+    """
+    week, year = before or get_current_week()
+    reference_monday = date.fromisocalendar(year, week, 1)
+    oldest_year, oldest_week, _ = (reference_monday - timedelta(weeks=weeks)).isocalendar()
     result = await session.execute(
-        select(Assignment)
-        .join(Member)
-        .options(selectinload(Assignment.task))
+        select(Assignment.member_id, Assignment.task_id, Assignment.year, Assignment.week_number)
         .where(
-            Member.telegram_id == telegram_id,
-            Assignment.week_number == week,
-            Assignment.year == year
+            Assignment.household_id == household_id,
+            Assignment.year.between(oldest_year, year),
+            Assignment.yearweek >= pack_yearweek(oldest_year, oldest_week),
+            Assignment.yearweek < pack_yearweek(year, week)
         )
     )
-    return list(result.scalars().all())
+    
+    history = []
+    for member_id, task_id, row_year, row_week in result.all():
+        age = (reference_monday - date.fromisocalendar(row_year, row_week, 1)).days // 7
+        history.append((member_id, task_id, age))
+    return history
 
 
-async def clear_current_assignments(session: AsyncSession) -> None:
-    """Clear all assignments for the current week."""
-    week, year = get_current_week()
-    await session.execute(
-        delete(Assignment).where(
-            Assignment.week_number == week,
-            Assignment.year == year
+@db_operation
+async def clear_current_assignments(
+    session: AsyncSession, household_id: int, target_week: tuple[int, int] | None = None
+) -> None:
+    """Clear a household's assignments for the current week or `target_week` (in the caller's transaction)."""
+    week, year = target_week or get_current_week()
+    await replace_assignments(session, household_id, [(week, year)], [])
+
+
+@db_operation
+async def replace_assignments(
+    session: AsyncSession,
+    household_id: int,
+    weeks: list[tuple[int, int]],
+    rows: list[dict]
+) -> None:
+    """
+    Replace a household's assignments for the given (week, year) pairs.
+    Runs in the caller's transaction: one DELETE plus multi-row INSERT batches,
+    so readers see either the old schedule or the new one, never a gap.
+    The member/task stats are updated in the same transaction.
+    """
+    deleted = await session.execute(
+        delete(Assignment)
+        .where(
+            Assignment.household_id == household_id,
+            Assignment.year.in_({year for _, year in weeks}),
+            Assignment.yearweek.in_([pack_yearweek(year, week) for week, year in weeks])
         )
+        .returning(Assignment.member_id, Assignment.task_id, Assignment.yearweek)
+    )
+    removed = deleted.all()
+    if rows:
+        await session.execute(insert(Assignment), rows)
+    await record_assignment_changes(
+        session, household_id, removed, [(row["member_id"], row["task_id"], row["yearweek"]) for row in rows]
     )
-    await session.commit()
 
 
-async def shuffle_assignments(session: AsyncSession) -> dict[str, list[str]]:
+async def plan_week(
+    members: list[Member], tasks: list[Task], history: list[tuple[int, int, int]]
+) -> list[tuple[Task, Member]]:
     """
-    Shuffle and create new assignments for the current week.
+    Match members to one week's task slots with the history-aware solver,
+    which runs on the CPU executor. `history` holds (member_id, task_id,
+    age_in_weeks) tuples relative to that week.
+    """
+    member_index = {member.id: i for i, member in enumerate(members)}
+    task_index = {task.id: i for i, task in enumerate(tasks)}
+    known = [
+        (member_index[member_id], task_index[task_id], age)
+        for member_id, task_id, age in history
+        if member_id in member_index and task_id in task_index
+    ]
+    history_arr = np.array(known, dtype=np.int64).reshape(-1, 3)
+    slots = await run_cpu(solve_week, len(members), history_arr, [task.required_people for task in tasks])
+    return [(task, members[member_idx]) for task, member_idxs in zip(tasks, slots) for member_idx in member_idxs]
+
+
+def assignment_row(household_id: int, member: Member, task: Task, week: int, year: int) -> dict:
+    """Insert parameters of one assignment row."""
+    return {
+        "household_id": household_id,
+        "member_id": member.id,
+        "task_id": task.id,
+        "week_number": week,
+        "year": year,
+        "yearweek": pack_yearweek(year, week),
+    }
+
+
+@db_operation
+async def shuffle_assignments(
+    session: AsyncSession, household_id: int, commit: bool = True, target_week: tuple[int, int] | None = None
+) -> dict[str, list[str]]:
+    """
+    Create new assignments for a household's current week, or for the
+    (week, year) `target_week`, e.g. the week in the household's timezone.
+    Members are matched to task slots by the history-aware solver, so people
+    rotate away from tasks they did recently. With `commit=False` the rows are
+    left in the caller's transaction, who commits and then calls
+    `invalidate_schedule`.
     Returns a dict mapping task names to list of member names.
     """
-    week, year = get_current_week()
-    
-    # Clear existing assignments for this week
-    await clear_current_assignments(session)
+    week, year = target_week or get_current_week()
     
     # Get active members and tasks
-    members = await get_active_members(session)
-    tasks = await get_active_tasks(session)
+    members = await get_active_members(session, household_id)
+    tasks = await get_active_tasks(session, household_id)
     
     if not members or not tasks:
+        await clear_current_assignments(session, household_id, (week, year))
+        if commit:
+            await session.commit()
+            invalidate_schedule(household_id)
         return {}
     
-    # Calculate total required people
-    total_required = sum(task.required_people for task in tasks)
-    
-    # Create a pool of member indices that can be reused if needed
-    member_pool = list(range(len(members)))
-    random.shuffle(member_pool)
-    
-    # If we need more slots than members, we'll cycle through
-    extended_pool = []
-    while len(extended_pool) < total_required:
-        random.shuffle(member_pool)
-        extended_pool.extend(member_pool)
+    history = await get_assignment_history(
+        session, household_id, config.ASSIGNMENT_HISTORY_WEEKS, before=(week, year)
+    )
     
     # Assign members to tasks
-    result: dict[str, list[str]] = {}
-    pool_index = 0
-    
-    for task in tasks:
-        result[task.name] = []
-        for _ in range(task.required_people):
-            if pool_index < len(extended_pool):
-                member_idx = extended_pool[pool_index]
-                member = members[member_idx]
-                
-                # Create assignment
-                assignment = Assignment(
-                    member_id=member.id,
-                    task_id=task.id,
-                    week_number=week,
-                    year=year
-                )
-                session.add(assignment)
-                result[task.name].append(member.name)
-                pool_index += 1
+    result: dict[str, list[str]] = {task.name: [] for task in tasks}
+    rows: list[dict] = []
+    member_tasks: dict[int, list[str]] = {}
+    
+    for task, member in await plan_week(members, tasks, history):
+        member_tasks.setdefault(member.telegram_id, []).append(task.name)
+        rows.append(assignment_row(household_id, member, task, week, year))
+        result[task.name].append(member.name)
     
+    # Swap the week's schedule atomically
+    await replace_assignments(session, household_id, [(week, year)], rows)
+    if not commit:
+        return result
     await session.commit()
+    invalidate_schedule(household_id)
+    
+    # Rebuild the "My Schedule" index from what we just wrote
+    member_tasks_index.set(
+        (household_id, pack_yearweek(year, week)),
+        {telegram_id: tuple(names) for telegram_id, names in member_tasks.items()}
+    )
     return result
 
 
-def format_assignments_table(assignments: dict[str, list[str]]) -> str:
-    """Format assignments as a nice text table."""
+def upcoming_weeks(weeks: int) -> list[tuple[int, int]]:
+    """Get the (week, year) pairs of the `weeks` weeks after the current one."""
+    week, year = get_current_week()
+    current_monday = date.fromisocalendar(year, week, 1)
+    upcoming = []
+    for offset in range(1, weeks + 1):
+        iso_year, iso_week, _ = (current_monday + timedelta(weeks=offset)).isocalendar()
+        upcoming.append((iso_week, iso_year))
+    return upcoming
+
+
+def schedule_fits(pairs: list[tuple[int, int]], members: list[Member], tasks: list[Task]) -> bool:
+    """
+    Whether a week's (member_id, task_id) assignments still match the active
+    roster: every task has its slots, nobody inactive is assigned, and everyone
+    got a slot if there were enough of them.
+    """
+    slots = Counter({task.id: task.required_people for task in tasks})
+    if Counter(task_id for _, task_id in pairs) != +slots:
+        return False
+    assigned = {member_id for member_id, _ in pairs}
+    active = {member.id for member in members}
+    if not assigned <= active:
+        return False
+    return sum(slots.values()) < len(active) or assigned == active
+
+
+@db_operation
+async def load_weeks(
+    session: AsyncSession, household_id: int, weeks: list[tuple[int, int]]
+) -> dict[int, list[tuple[int, int]]]:
+    """Load a household's (member_id, task_id) assignments of several weeks, keyed by yearweek."""
+    yearweeks = [pack_yearweek(year, week) for week, year in weeks]
+    result = await session.execute(
+        select(Assignment.yearweek, Assignment.member_id, Assignment.task_id)
+        .where(
+            Assignment.household_id == household_id,
+            Assignment.year.in_({year for _, year in weeks}),
+            Assignment.yearweek.in_(yearweeks)
+        )
+    )
+    loaded: dict[int, list[tuple[int, int]]] = {yearweek: [] for yearweek in yearweeks}
+    for yearweek, member_id, task_id in result.all():
+        loaded[yearweek].append((member_id, task_id))
+    return loaded
+
+
+@db_operation
+async def precompute_assignments(
+    session: AsyncSession, household_id: int, weeks: int = config.PRECOMPUTE_WEEKS
+) -> list[tuple[int, int]]:
+    """
+    Plan the next `weeks` weeks of a household ahead of time. Weeks that are
+    missing or no longer fit the roster are planned one after another, each
+    seeing the ones before it as history, and written in one transaction.
+    Returns the (week, year) pairs that were planned.
+    """
+    members = await get_active_members(session, household_id)
+    tasks = await get_active_tasks(session, household_id)
+    if not members or not tasks or weeks < 1:
+        return []
+    
+    targets = upcoming_weeks(weeks)
+    existing = await load_weeks(session, household_id, targets)
+    stale = [
+        (week, year) for week, year in targets
+        if not schedule_fits(existing[pack_yearweek(year, week)], members, tasks)
+    ]
+    if not stale:
+        return []
+    
+    # History up to the last planned week as (member_id, task_id, monday), minus the weeks being replanned
+    last_week, last_year = targets[-1]
+    end_monday = date.fromisocalendar(last_year, last_week, 1) + timedelta(weeks=1)
+    end_year, end_week, _ = end_monday.isocalendar()
+    replanned = {date.fromisocalendar(year, week, 1) for week, year in stale}
+    past = []
+    for member_id, task_id, age in await get_assignment_history(
+        session, household_id, config.ASSIGNMENT_HISTORY_WEEKS + weeks, before=(end_week, end_year)
+    ):
+        monday = end_monday - timedelta(weeks=age)
+        if monday not in replanned:
+            past.append((member_id, task_id, monday))
+    
+    rows: list[dict] = []
+    for week, year in stale:
+        monday = date.fromisocalendar(year, week, 1)
+        history = [
+            (member_id, task_id, (monday - past_monday).days // 7)
+            for member_id, task_id, past_monday in past
+            if 0 < (monday - past_monday).days // 7 <= config.ASSIGNMENT_HISTORY_WEEKS
+        ]
+        for task, member in await plan_week(members, tasks, history):
+            rows.append(assignment_row(household_id, member, task, week, year))
+            past.append((member.id, task.id, monday))
+    
+    await replace_assignments(session, household_id, stale, rows)
+    await session.commit()
+    invalidate_schedule(household_id)
+    return stale
+
+
+@db_operation
+async def ensure_current_assignments(
+    session: AsyncSession, household_id: int, commit: bool = True, target_week: tuple[int, int] | None = None
+) -> bool:
+    """
+    Make sure the current week (or `target_week`) has a schedule. A
+    precomputed week that still fits the roster is kept as is; otherwise the
+    week is shuffled now (see `shuffle_assignments` for `commit`). Returns
+    whether it shuffled.
+    """
+    week, year = target_week or get_current_week()
+    members = await get_active_members(session, household_id)
+    tasks = await get_active_tasks(session, household_id)
+    existing = await load_weeks(session, household_id, [(week, year)])
+    if members and tasks and schedule_fits(existing[pack_yearweek(year, week)], members, tasks):
+        return False
+    
+    await shuffle_assignments(session, household_id, commit=commit, target_week=(week, year))
+    return True
+
+
+@db_operation
+async def get_upcoming_assignments(
+    session: AsyncSession, household_id: int, weeks: int
+) -> list[tuple[int, int, dict[str, list[str]]]]:
+    """Get the planned schedules of the next `weeks` weeks as (week, year, {task: member names})."""
+    targets = upcoming_weeks(weeks)
+    result = await session.execute(
+        select(Assignment.yearweek, Task.name, Member.name)
+        .select_from(Assignment)
+        .join(Member, Assignment.member_id == Member.id)
+        .join(Task, Assignment.task_id == Task.id)
+        .where(
+            Assignment.household_id == household_id,
+            Assignment.year.in_({year for _, year in targets}),
+            Assignment.yearweek.in_([pack_yearweek(year, week) for week, year in targets])
+        )
+        .order_by(Assignment.yearweek, Task.name, Member.name)
+    )
+    schedules: dict[int, dict[str, list[str]]] = {}
+    for yearweek, task_name, member_name in result.all():
+        schedules.setdefault(yearweek, {}).setdefault(task_name, []).append(member_name)
+    return [
+        (week, year, schedules[pack_yearweek(year, week)])
+        for week, year in targets
+        if pack_yearweek(year, week) in schedules
+    ]
+
+
+def format_upcoming_schedule(upcoming: list[tuple[int, int, dict[str, list[str]]]]) -> str:
+    """Format planned future weeks, one table per week."""
+    if not upcoming:
+        return "🗓 No upcoming weeks planned yet. They are prepared overnight."
+    
+    max_task_len = max(len(task) for _, _, schedule in upcoming for task in schedule)
+    lines = ["🗓 *Upcoming Weeks*", "", "```"]
+    for week, year, schedule in upcoming:
+        lines.append(f"Week {week}/{year}")
+        for task, members in schedule.items():
+            lines.append(f"  {task:<{max_task_len}} │ {', '.join(members)}")
+        lines.append("")
+    lines[-1] = "```"
+    return "\n".join(lines)
+
+
+def format_assignments_table(
+    assignments: dict[str, list[str]], target_week: tuple[int, int] | None = None
+) -> str:
+    """Format assignments as a nice text table headed by the current week or `target_week`."""
     if not assignments:
         return "📋 No assignments yet. Use /shuffle to create them."
     
-    week, year = get_current_week()
+    week, year = target_week or get_current_week()
     lines = [
         f"🧹 *Cleaning Schedule - Week {week}/{year}*",
         "",
@@ -148,19 +441,34 @@ def format_assignments_table(assignments: dict[str, list[str]]) -> str:
     return "\n".join(lines)
 
 
-async def get_formatted_schedule(session: AsyncSession) -> str:
-    """Get the current week's schedule formatted as a table."""
-    assignments = await get_current_assignments(session)
-    
-    if not assignments:
+def render_schedule(rows: list[AssignmentRow], target_week: tuple[int, int] | None = None) -> str:
+    """Group a week's rows by task and format them as a table."""
+    if not rows:
         return "📋 No assignments for this week. Admin can use /shuffle to create them."
     
-    # Group by task
     task_assignments: dict[str, list[str]] = {}
-    for assignment in assignments:
-        task_name = assignment.task.name
-        if task_name not in task_assignments:
-            task_assignments[task_name] = []
-        task_assignments[task_name].append(assignment.member.name)
+    for row in rows:
+        task_assignments.setdefault(row.task_name, []).append(row.member_name)
+    return format_assignments_table(task_assignments, target_week)
+
+
+async def get_formatted_schedule(
+    session: AsyncSession, household_id: int, cached: bool = True, target_week: tuple[int, int] | None = None
+) -> str:
+    """
+    Get a household's current week (or `target_week`) schedule formatted as a table (cached).
+    `cached=False` renders the session's view, e.g. uncommitted writes, without touching the cache.
+    """
+    week, year = target_week or get_current_week()
+    cache_key = (household_id, week, year)
+    if cached:
+        hit = schedule_cache.get(cache_key)
+        if hit is not None:
+            return hit
+    
+    rows = await get_week_rows(session, household_id, pack_yearweek(year, week))
+    schedule = await run_cpu(render_schedule, rows, (week, year))
     
-    return format_assignments_table(task_assignments)
+    if cached:
+        schedule_cache.set(cache_key, schedule)
+    return schedule
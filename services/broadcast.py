@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramNetworkError, TelegramRetryAfter, TelegramServerError
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """Async token bucket: `rate` tokens per second, bursting up to `capacity`."""
+    
+    def __init__(self, rate: float, capacity: float | None = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def block_for(self, seconds: float) -> None:
+        """Hand out no tokens for a while, e.g. after Telegram's flood control kicked in."""
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+        self._tokens = 0.0
+    
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+@dataclass
+class BroadcastStats:
+    """Outcome of a batch of sends; `try_send` counts flood-control retries and errors into it."""
+    total: int = 0
+    sent: int = 0
+    failed: int = 0
+    retried: int = 0
+    elapsed: float = 0.0
+    errors: dict[str, int] = field(default_factory=dict)
+    
+    @property
+    def throughput(self) -> float:
+        """Messages sent per second."""
+        return self.sent / self.elapsed if self.elapsed else 0.0
+    
+    def __str__(self) -> str:
+        return (
+            f"{self.sent}/{self.total} sent, {self.failed} failed, {self.retried} retried "
+            f"in {self.elapsed:.2f}s ({self.throughput:.1f} msg/s)"
+        )
+
+
+@dataclass
+class _ChatState:
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    last_sent: float = 0.0
+    users: int = 0
+
+
+class Broadcaster:
+    """
+    Sends messages under Telegram's rate limits: a global token bucket
+    (~30 msg/s) plus at most one message per second to the same chat.
+    Flood-control (RetryAfter) errors pause sending and are retried.
+    """
+    
+    def __init__(
+        self,
+        rate: float = config.BROADCAST_RATE,
+        per_chat_interval: float = 1.0,
+        concurrency: int = config.BROADCAST_CONCURRENCY,
+        max_retries: int = 3
+    ):
+        self.bucket = TokenBucket(rate)
+        self.per_chat_interval = per_chat_interval
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._chats: dict[int, _ChatState] = {}
+    
+    def _prune_chats(self) -> None:
+        """Forget idle chats whose per-chat interval has passed."""
+        cutoff = time.monotonic() - self.per_chat_interval
+        for chat_id in [
+            chat_id for chat_id, state in self._chats.items()
+            if not state.users and state.last_sent < cutoff
+        ]:
+            del self._chats[chat_id]
+    
+    async def send(
+        self, bot: Bot, chat_id: int, text: str, stats: BroadcastStats | None = None, **kwargs
+    ) -> bool:
+        """Send one message, honoring rate limits. Returns whether it was delivered."""
+        return await self.try_send(bot, chat_id, text, stats, **kwargs) is None
+    
+    async def try_send(
+        self, bot: Bot, chat_id: int, text: str, stats: BroadcastStats | None = None, **kwargs
+    ) -> Exception | None:
+        """Send one message, honoring rate limits. Returns the final error, or None once delivered."""
+        if len(self._chats) > 10_000:
+            self._prune_chats()
+        state = self._chats.setdefault(chat_id, _ChatState())
+        state.users += 1
+        try:
+            async with state.lock:
+                for attempt in range(self.max_retries + 1):
+                    delay = state.last_sent + self.per_chat_interval - time.monotonic()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    await self.bucket.acquire()
+                    try:
+                        await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                        state.last_sent = time.monotonic()
+                        return None
+                    except TelegramRetryAfter as e:
+                        self.bucket.block_for(e.retry_after)
+                        error = e
+                    except (TelegramNetworkError, TelegramServerError) as e:
+                        await asyncio.sleep(2 ** attempt)
+                        error = e
+                    except Exception as e:
+                        error = e
+                        break
+                    
+                    if stats is not None and attempt < self.max_retries:
+                        stats.retried += 1
+        finally:
+            state.users -= 1
+        
+        logger.warning(f"Failed to send message to {chat_id}: {error}")
+        if stats is not None:
+            name = type(error).__name__
+            stats.errors[name] = stats.errors.get(name, 0) + 1
+        return error
+
+
+# Shared by every sender in this process. The bucket is per process: the outbox
+# worker only sends from the replica holding its drain lock, so the limit also
+# holds across replicas
+broadcaster = Broadcaster()
@@ -0,0 +1,97 @@
+import time
+from collections import OrderedDict
+from collections.abc import Callable, Hashable
+from typing import Any
+
+from config import config
+
+
+class LRUCache:
+    """Bounded in-process LRU cache with optional TTL and hit/miss counters."""
+    
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._data)
+    
+    def __contains__(self, key: Hashable) -> bool:
+        return self._lookup(key) is not _MISSING
+    
+    def _lookup(self, key: Hashable) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at and expires_at < time.monotonic():
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+    
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Get a value, counting the lookup as a hit or a miss."""
+        value = self._lookup(key)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+    
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting the least recently used entry when full."""
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+    
+    def invalidate(self, key: Hashable) -> None:
+        """Drop a single key."""
+        self._data.pop(key, None)
+    
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        """Drop every key matching a predicate."""
+        for key in [key for key in self._data if predicate(key)]:
+            del self._data[key]
+    
+    def clear(self) -> None:
+        self._data.clear()
+    
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+_MISSING = object()
+
+# Rendered "Full Schedule" text keyed by (household_id, week, year)
+schedule_cache = LRUCache(config.SCHEDULE_CACHE_SIZE, ttl=config.SCHEDULE_CACHE_TTL or None)
+
+# "My Schedule" task names keyed by (household_id, yearweek) -> {telegram_id: (task, ...)}
+member_tasks_index = LRUCache(config.SCHEDULE_CACHE_SIZE, ttl=config.SCHEDULE_CACHE_TTL or None)
+
+# Resolved caller identities keyed by (chat_id, telegram_id)
+identity_cache = LRUCache(config.IDENTITY_CACHE_SIZE, ttl=config.IDENTITY_CACHE_TTL or None)
+
+
+def invalidate_schedule(household_id: int) -> None:
+    """Forget every cached schedule of a household after it changed."""
+    schedule_cache.invalidate_where(lambda key: key[0] == household_id)
+    member_tasks_index.invalidate_where(lambda key: key[0] == household_id)
+
+
+def invalidate_identity(telegram_id: int | None = None, chat_id: int | None = None) -> None:
+    """Forget cached identities of a user (e.g. after joining or removal) or of a chat."""
+    identity_cache.invalidate_where(
+        lambda key: (telegram_id is not None and key[1] == telegram_id)
+        or (chat_id is not None and key[0] == chat_id)
+    )
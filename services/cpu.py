@@ -0,0 +1,57 @@
+"""
+Executor boundary for CPU-bound work.
+
+The event loop serves every update, so pure computations that grow with a
+household (the assignment solver, rendering schedules) are handed to an
+executor with `run_cpu` instead of running on it. CPU_EXECUTOR picks the
+pool: "thread" (default; numpy and scipy release the GIL for most of their
+work), "process" (full isolation from the loop, arguments and results are
+pickled, so pass plain data and module-level functions) or "inline" (run on
+the loop, e.g. for debugging).
+"""
+import asyncio
+import logging
+import multiprocessing
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import TypeVar
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_executor: Executor | None = None
+
+
+def get_executor() -> Executor | None:
+    """The shared CPU executor, created on first use (None when running inline)."""
+    global _executor
+    if _executor is None and config.CPU_EXECUTOR != "inline":
+        if config.CPU_EXECUTOR == "process":
+            # Forking a process that runs an event loop and a connection pool is unsafe
+            _executor = ProcessPoolExecutor(config.CPU_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        elif config.CPU_EXECUTOR == "thread":
+            _executor = ThreadPoolExecutor(config.CPU_WORKERS, thread_name_prefix="cpu")
+        else:
+            raise ValueError(f"Unknown CPU_EXECUTOR: {config.CPU_EXECUTOR!r}")
+        logger.info(f"CPU work runs in a {config.CPU_EXECUTOR} pool of {config.CPU_WORKERS}")
+    return _executor
+
+
+async def run_cpu(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run a pure function on the CPU executor and wait for its result without blocking the loop."""
+    executor = get_executor()
+    if executor is None:
+        return fn(*args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(executor, partial(fn, *args, **kwargs))
+
+
+def shutdown_executor() -> None:
+    """Stop the CPU executor; the next `run_cpu` starts a new one."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
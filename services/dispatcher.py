@@ -0,0 +1,235 @@
+"""
+Due-queue for per-household weekly runs.
+
+Every household stores its next run time (UTC) in `next_run_at`: its
+notification time plus a fixed per-household offset within
+DISPATCH_SPREAD_SECONDS, so households sharing the default time do not all
+fire in the same second. A periodic dispatcher claims due households by
+leasing their slot (`claimed_until`) and feeds them to a fixed pool of
+workers. It only claims as many as it has room for, so a busy replica
+leaves the rest of the queue to others. On Postgres the claim uses FOR
+UPDATE SKIP LOCKED, so replicas split the queue instead of competing for
+the same rows. `next_run_at` moves to the next week only after the run
+succeeded: a failed run is retried after DISPATCH_RETRY_SECONDS, and the
+slot of a replica that died mid-run is taken over once its lease of
+JOB_LEASE_SECONDS runs out.
+"""
+import asyncio
+import hashlib
+import logging
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import config
+from database import Household
+from metrics import DISPATCH_IN_FLIGHT, DISPATCH_LAG_SECONDS, DISPATCH_QUEUE_DEPTH, db_operation
+
+logger = logging.getLogger(__name__)
+
+
+def compute_next_run(day: int, hour: int, tz_name: str, after: datetime) -> datetime:
+    """
+    Next occurrence of weekday `day` (0=Monday) at `hour` local time,
+    strictly after `after`. Takes and returns naive UTC datetimes.
+    """
+    tz = ZoneInfo(tz_name)
+    local = after.replace(tzinfo=timezone.utc).astimezone(tz)
+    candidate = local.replace(hour=hour, minute=0, second=0, microsecond=0)
+    candidate += timedelta(days=(day - local.weekday()) % 7)
+    if candidate <= local:
+        candidate += timedelta(days=7)
+    # zoneinfo arithmetic is wall-clock, so DST changes are applied here
+    return candidate.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def local_week(tz_name: str | None, at: datetime) -> tuple[int, int]:
+    """ISO (week, year) in timezone `tz_name` (default TIMEZONE) at the naive UTC time `at`."""
+    local = at.replace(tzinfo=timezone.utc).astimezone(ZoneInfo(tz_name or config.TIMEZONE))
+    year, week, _ = local.isocalendar()
+    return week, year
+
+
+def household_week(household: Household, at: datetime) -> tuple[int, int]:
+    """ISO (week, year) in the household's timezone at the naive UTC time `at`."""
+    return local_week(household.timezone, at)
+
+
+def household_jitter(household_id: int, window: int | None = None) -> timedelta:
+    """Stable offset of a household's runs within the first `window` seconds after its notification time."""
+    window = config.DISPATCH_SPREAD_SECONDS if window is None else window
+    if window <= 0:
+        return timedelta(0)
+    digest = hashlib.blake2b(str(household_id).encode(), digest_size=8).digest()
+    return timedelta(seconds=int.from_bytes(digest, "big") % window)
+
+
+def household_next_run(household: Household, defaults: tuple[int, int], after: datetime) -> datetime:
+    """
+    Next run of a household, falling back to the bot-wide day/hour/timezone,
+    delayed by its jitter. A slot whose jittered time is still ahead is kept.
+    """
+    default_day, default_hour = defaults
+    jitter = household_jitter(household.id)
+    return compute_next_run(
+        household.notification_day if household.notification_day is not None else default_day,
+        household.notification_hour if household.notification_hour is not None else default_hour,
+        household.timezone or config.TIMEZONE,
+        after - jitter
+    ) + jitter
+
+
+@db_operation
+async def reschedule_households(
+    session: AsyncSession,
+    defaults: tuple[int, int],
+    only_unscheduled: bool = False,
+    only_defaults: bool = False
+) -> int:
+    """
+    Recompute `next_run_at` in bulk, e.g. after the default time changed.
+    Returns the number of households updated.
+    """
+    query = select(Household).where(Household.active == True)
+    if only_unscheduled:
+        query = query.where(Household.next_run_at.is_(None))
+    if only_defaults:
+        query = query.where(
+            (Household.notification_day.is_(None)) | (Household.notification_hour.is_(None))
+        )
+    households = (await session.execute(query)).scalars().all()
+    if not households:
+        return 0
+    
+    now = datetime.utcnow()
+    await session.execute(
+        update(Household),
+        [{"id": h.id, "next_run_at": household_next_run(h, defaults, now)} for h in households]
+    )
+    await session.commit()
+    return len(households)
+
+
+@db_operation
+async def claim_due_households(
+    session: AsyncSession, batch_size: int, now: datetime | None = None
+) -> list[tuple[Household, datetime]]:
+    """
+    Claim up to `batch_size` due households that no live replica holds, and
+    lease their slot for JOB_LEASE_SECONDS. Returns (household, scheduled_at)
+    pairs; scheduled_at is the notification time without the jitter.
+    """
+    now = now or datetime.utcnow()
+    result = await session.execute(
+        select(Household)
+        .where(
+            Household.active == True,
+            Household.next_run_at <= now,
+            or_(Household.claimed_until.is_(None), Household.claimed_until <= now)
+        )
+        .order_by(Household.next_run_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    households = list(result.scalars().all())
+    if households:
+        await session.execute(
+            update(Household)
+            .where(Household.id.in_([h.id for h in households]))
+            .values(claimed_until=now + timedelta(seconds=config.JOB_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+    await session.commit()
+    return [(h, h.next_run_at - household_jitter(h.id)) for h in households]
+
+
+@db_operation
+async def release_household(
+    session: AsyncSession, household_id: int, defaults: tuple[int, int], ok: bool, now: datetime | None = None
+) -> None:
+    """
+    Release a claimed slot: after a successful run move on to the next week,
+    otherwise keep the slot and retry it after DISPATCH_RETRY_SECONDS.
+    """
+    now = now or datetime.utcnow()
+    household = await session.get(Household, household_id)
+    if household is None:
+        return
+    if ok:
+        household.next_run_at = household_next_run(household, defaults, now)
+        household.claimed_until = None
+    else:
+        household.claimed_until = now + timedelta(seconds=config.DISPATCH_RETRY_SECONDS)
+    await session.commit()
+
+
+async def dispatch_due(
+    session_factory: async_sessionmaker,
+    defaults: tuple[int, int],
+    run: Callable[[Household, datetime], Awaitable[bool | None]],
+    batch_size: int = config.DISPATCH_BATCH_SIZE,
+    workers: int = config.DISPATCH_WORKERS,
+    queue_size: int = config.DISPATCH_QUEUE_SIZE
+) -> int:
+    """
+    Drain the due-queue with `workers` concurrent jobs. At most `workers +
+    queue_size` households are claimed but not finished at any time; claiming
+    waits for room. A run that raises or returns False keeps its slot for a
+    retry. Returns the number of households dispatched.
+    """
+    queue: asyncio.Queue[tuple[Household, datetime] | None] = asyncio.Queue()
+    capacity = asyncio.Semaphore(workers + queue_size)
+    dispatched = 0
+    
+    async def worker() -> None:
+        while (item := await queue.get()) is not None:
+            household, scheduled_at = item
+            DISPATCH_QUEUE_DEPTH.dec()
+            DISPATCH_IN_FLIGHT.inc()
+            due_at = scheduled_at + household_jitter(household.id)
+            DISPATCH_LAG_SECONDS.observe(max((datetime.utcnow() - due_at).total_seconds(), 0))
+            ok = False
+            try:
+                ok = await run(household, scheduled_at) is not False
+            except Exception:
+                logger.exception(f"Scheduled run failed for household {household.id}")
+            finally:
+                DISPATCH_IN_FLIGHT.dec()
+            try:
+                async with session_factory() as session:
+                    await release_household(session, household.id, defaults, ok)
+            except Exception:
+                # The lease runs out and another scan picks the household up
+                logger.exception(f"Failed to release household {household.id}")
+            finally:
+                capacity.release()
+    
+    pool = [asyncio.create_task(worker()) for _ in range(workers)]
+    try:
+        while True:
+            # Wait for one free slot, then take whatever else is free right now
+            await capacity.acquire()
+            reserved = 1
+            while reserved < batch_size and not capacity.locked():
+                await capacity.acquire()
+                reserved += 1
+            
+            async with session_factory() as session:
+                claimed = await claim_due_households(session, reserved)
+            for _ in range(reserved - len(claimed)):
+                capacity.release()
+            if not claimed:
+                break
+            
+            dispatched += len(claimed)
+            for item in claimed:
+                DISPATCH_QUEUE_DEPTH.inc()
+                queue.put_nowait(item)
+    finally:
+        for _ in pool:
+            queue.put_nowait(None)
+        await asyncio.gather(*pool)
+    return dispatched
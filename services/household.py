@@ -0,0 +1,122 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from config import config
+from database import Household, Member
+from metrics import db_operation
+
+
+@db_operation
+async def get_household(session: AsyncSession, chat_id: int) -> Household | None:
+    """Get the household bound to a group chat."""
+    result = await session.execute(
+        select(Household).where(Household.chat_id == chat_id)
+    )
+    return result.scalar_one_or_none()
+
+
+@db_operation
+async def get_or_create_household(
+    session: AsyncSession,
+    chat_id: int,
+    title: str | None = None,
+    admin_id: int | None = None
+) -> Household:
+    """Get the household for a group chat, creating it on first contact."""
+    household = await get_household(session, chat_id)
+    if household:
+        return household
+    
+    household = Household(chat_id=chat_id, title=title, admin_id=admin_id)
+    session.add(household)
+    await session.commit()
+    return household
+
+
+@db_operation
+async def get_user_household(session: AsyncSession, telegram_id: int) -> Household | None:
+    """Get the household a user most recently joined (or administers)."""
+    result = await session.execute(
+        select(Household)
+        .join(Member)
+        .where(Member.telegram_id == telegram_id)
+        .order_by(Member.created_at.desc())
+        .limit(1)
+    )
+    household = result.scalar_one_or_none()
+    if household:
+        return household
+    
+    result = await session.execute(
+        select(Household)
+        .where(Household.admin_id == telegram_id)
+        .order_by(Household.created_at.desc())
+        .limit(1)
+    )
+    return result.scalar_one_or_none()
+
+
+async def resolve_household(session: AsyncSession, chat_id: int, telegram_id: int) -> Household | None:
+    """
+    Resolve the household an update belongs to.
+    Group chats map directly; private chats fall back to the user's membership
+    and finally to the default household from config.
+    """
+    if chat_id != telegram_id:
+        return await get_household(session, chat_id)
+    
+    household = await get_user_household(session, telegram_id)
+    if household is None and config.GROUP_CHAT_ID:
+        household = await get_household(session, config.GROUP_CHAT_ID)
+    return household
+
+
+@db_operation
+async def get_active_households(session: AsyncSession) -> list[Household]:
+    """Get all active households."""
+    result = await session.execute(
+        select(Household).where(Household.active == True).order_by(Household.id)
+    )
+    return list(result.scalars().all())
+
+
+async def ensure_default_household(session: AsyncSession) -> Household | None:
+    """Create the household configured via GROUP_CHAT_ID, if any."""
+    if not config.GROUP_CHAT_ID:
+        return None
+    return await get_or_create_household(
+        session, config.GROUP_CHAT_ID, admin_id=config.SUPERUSER_ID or None
+    )
+
+
+def is_household_admin(household: Household | None, user_id: int) -> bool:
+    """Check whether a user may manage a household."""
+    if config.SUPERUSER_ID and user_id == config.SUPERUSER_ID:
+        return True
+    return household is not None and household.admin_id == user_id
+
+
+def get_join_payload(household: Household) -> str:
+    """Build the /start deep-link payload that registers a user into a household."""
+    return f"join_{household.join_token}"
+
+
+def is_join_payload(args: str | None) -> bool:
+    """Whether a /start payload is a join link (including links from older versions)."""
+    return bool(args) and (args == "register" or args.startswith(("join_", "register_")))
+
+
+@db_operation
+async def get_join_household(session: AsyncSession, args: str) -> Household | None:
+    """
+    Find the household a join payload points to. A bare "register" refers to the
+    default household from config; links that carried a chat id are no longer valid.
+    """
+    if args == "register":
+        return await get_household(session, config.GROUP_CHAT_ID) if config.GROUP_CHAT_ID else None
+    if not args.startswith("join_"):
+        return None
+    result = await session.execute(
+        select(Household).where(Household.join_token == args.removeprefix("join_"))
+    )
+    return result.scalar_one_or_none()
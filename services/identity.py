@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Member
+from metrics import db_operation
+from services.cache import identity_cache
+from services.dispatcher import local_week
+from services.household import is_household_admin, resolve_household
+
+
+@dataclass(frozen=True)
+class Identity:
+    """Who is calling: their household (if any), membership and role."""
+    telegram_id: int
+    household_id: int | None = None
+    household_chat_id: int | None = None
+    household_timezone: str | None = None
+    member_id: int | None = None
+    is_admin: bool = False
+    
+    @property
+    def is_member(self) -> bool:
+        return self.member_id is not None
+    
+    @property
+    def manages_household(self) -> bool:
+        """Whether the caller may run admin actions on the resolved household."""
+        return self.household_id is not None and self.is_admin
+    
+    @property
+    def current_week(self) -> tuple[int, int]:
+        """ISO (week, year) now in the household's timezone, the week its weekly run announced."""
+        return local_week(self.household_timezone, datetime.utcnow())
+
+
+@db_operation
+async def load_identity(session: AsyncSession, chat_id: int, telegram_id: int) -> Identity:
+    """Resolve a caller's identity from the database."""
+    household = await resolve_household(session, chat_id, telegram_id)
+    if household is None:
+        return Identity(telegram_id=telegram_id, is_admin=is_household_admin(None, telegram_id))
+    
+    result = await session.execute(
+        select(Member.id).where(Member.household_id == household.id, Member.telegram_id == telegram_id)
+    )
+    return Identity(
+        telegram_id=telegram_id,
+        household_id=household.id,
+        household_chat_id=household.chat_id,
+        household_timezone=household.timezone,
+        member_id=result.scalar_one_or_none(),
+        is_admin=is_household_admin(household, telegram_id)
+    )
+
+
+async def get_identity(session: AsyncSession, chat_id: int, telegram_id: int) -> Identity:
+    """Cached identity of a caller in a chat."""
+    key = (chat_id, telegram_id)
+    identity = identity_cache.get(key)
+    if identity is None:
+        identity = await load_identity(session, chat_id, telegram_id)
+        identity_cache.set(key, identity)
+    return identity
@@ -0,0 +1,97 @@
+"""
+Coordination between bot replicas.
+
+`leader_lock` makes sure only one replica runs a job body at a time
+(Postgres advisory lock; a no-op on SQLite, which only ever has one
+process). The `job_runs` ledger makes sure each (job, period) pair runs
+exactly once, even when replicas fire the same job at slightly different
+times or one of them restarts.
+"""
+import hashlib
+import os
+import socket
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+
+from sqlalchemy import and_, or_, select, text, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from config import config
+from database import JobRun, dialect_insert, engine as default_engine
+from metrics import db_operation
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def lock_key(name: str) -> int:
+    """Stable signed 64-bit key for pg advisory locks."""
+    return int.from_bytes(hashlib.blake2b(name.encode(), digest_size=8).digest(), "big", signed=True)
+
+
+@asynccontextmanager
+async def leader_lock(name: str, engine: AsyncEngine | None = None) -> AsyncIterator[bool]:
+    """Try to become the only replica running `name`; yields whether we got it."""
+    engine = engine or default_engine
+    if engine.dialect.name != "postgresql":
+        yield True
+        return
+    
+    key = lock_key(name)
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = (await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})).scalar()
+        try:
+            yield bool(acquired)
+        finally:
+            if acquired:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+
+
+@db_operation
+async def claim_run(session: AsyncSession, job: str, period: str) -> bool:
+    """
+    Claim the run of `job` for `period`. Returns False if another replica
+    already ran it or is running it. Failed runs, and runs whose owner went
+    silent for longer than JOB_LEASE_SECONDS, can be claimed again.
+    """
+    now = datetime.utcnow()
+    result = await session.execute(
+        dialect_insert(session, JobRun)
+        .values(job=job, period=period, status="running", owner=OWNER, started_at=now)
+        .on_conflict_do_nothing(index_elements=["job", "period"])
+    )
+    if result.rowcount != 1:
+        stale = now - timedelta(seconds=config.JOB_LEASE_SECONDS)
+        result = await session.execute(
+            update(JobRun)
+            .where(
+                JobRun.job == job,
+                JobRun.period == period,
+                or_(
+                    JobRun.status == "failed",
+                    and_(JobRun.status == "running", JobRun.started_at < stale)
+                )
+            )
+            .values(status="running", owner=OWNER, started_at=now, finished_at=None)
+        )
+    await session.commit()
+    return result.rowcount == 1
+
+
+@db_operation
+async def get_run_status(session: AsyncSession, job: str, period: str) -> str | None:
+    """Status of the run of `job` for `period` (running, done, failed), or None if it never started."""
+    result = await session.execute(select(JobRun.status).where(JobRun.job == job, JobRun.period == period))
+    return result.scalar_one_or_none()
+
+
+@db_operation
+async def finish_run(session: AsyncSession, job: str, period: str, ok: bool = True) -> None:
+    """Mark a claimed run as done (or failed, so it may be retried)."""
+    await session.execute(
+        update(JobRun)
+        .where(JobRun.job == job, JobRun.period == period, JobRun.owner == OWNER)
+        .values(status="done" if ok else "failed", finished_at=datetime.utcnow())
+    )
+    await session.commit()
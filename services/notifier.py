@@ -1,47 +1,47 @@
-from aiogram import Bot
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from services.assignment import get_current_assignments, get_formatted_schedule
-from config import config
+from database import Household
+from services.assignment import get_formatted_schedule, get_member_tasks_index
+from services.outbox import enqueue_messages
 
 
-async def send_weekly_notification(bot: Bot, session: AsyncSession) -> None:
-    """Send weekly cleaning notification to the group chat."""
-    schedule = await get_formatted_schedule(session)
-    
-    message = (
+def format_weekly_message(schedule: str) -> str:
+    """Format the weekly group reminder."""
+    return (
         "🔔 *Weekly Cleaning Reminder!*\n\n"
         f"{schedule}\n\n"
         "Good luck everyone! 💪"
     )
-    
-    try:
-        await bot.send_message(
-            chat_id=config.GROUP_CHAT_ID,
-            text=message,
-            parse_mode="Markdown"
-        )
-    except Exception as e:
-        print(f"Failed to send notification: {e}")
-
-
-async def notify_member(bot: Bot, telegram_id: int, tasks: list[str]) -> None:
-    """Send a direct message to a member about their tasks."""
-    if not tasks:
-        return
-    
+
+
+def format_member_message(tasks: list[str]) -> str:
+    """Format a member's personal task reminder."""
     tasks_list = "\n".join(f"• {task}" for task in tasks)
-    message = (
+    return (
         "🧹 *Your Cleaning Tasks This Week:*\n\n"
         f"{tasks_list}\n\n"
         "Don't forget to complete them! 💪"
     )
+
+
+async def build_weekly_messages(
+    session: AsyncSession, household: Household, cached: bool = True, target_week: tuple[int, int] | None = None
+) -> list[tuple[int, str]]:
+    """
+    Build a household's weekly (chat_id, text) messages for the current week or `target_week`:
+    the group reminder plus one DM per member.
+    `cached=False` renders uncommitted assignments from the session without the caches.
+    """
+    schedule = await get_formatted_schedule(session, household.id, cached=cached, target_week=target_week)
+    messages = [(household.chat_id, format_weekly_message(schedule))]
     
-    try:
-        await bot.send_message(
-            chat_id=telegram_id,
-            text=message,
-            parse_mode="Markdown"
-        )
-    except Exception as e:
-        print(f"Failed to notify member {telegram_id}: {e}")
+    index = await get_member_tasks_index(session, household.id, cached=cached, target_week=target_week)
+    for telegram_id, tasks in index.items():
+        messages.append((telegram_id, format_member_message(list(tasks))))
+    return messages
+
+
+async def queue_weekly_notification(session: AsyncSession, household: Household, key: str) -> None:
+    """Queue the weekly reminder for a household's group chat in the outbox (caller commits)."""
+    schedule = await get_formatted_schedule(session, household.id)
+    await enqueue_messages(session, [(household.chat_id, format_weekly_message(schedule))], key)
@@ -0,0 +1,210 @@
+"""
+Transactional outbox for outgoing notifications.
+
+Messages are inserted into `outbox` in the same transaction as the work
+that produced them (e.g. the weekly shuffle), so they are committed or
+rolled back together and no transaction ever waits on Telegram. A worker
+claims due messages in batches, sends them through the rate-limited
+broadcaster and records the outcome: sent, retried later with exponential
+backoff, or dead-lettered after OUTBOX_MAX_ATTEMPTS or a permanent error
+(bot blocked, chat not found). Each message carries an idempotency key, so
+enqueueing it twice is a no-op. Delivery is at least once: a replica that
+dies between sending and recording leaves the message to be sent again
+when its lease runs out. Every replica runs a worker, but only the holder
+of the `outbox_drain` leader lock sends, so BROADCAST_RATE holds for the
+whole deployment rather than per replica.
+"""
+import asyncio
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramForbiddenError, TelegramNotFound
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import config
+from database import OutboxMessage, async_session, dialect_insert
+from metrics import OUTBOX_MESSAGES, db_operation
+from services.broadcast import Broadcaster, BroadcastStats, broadcaster as default_broadcaster
+from services.locks import leader_lock
+
+logger = logging.getLogger(__name__)
+
+# Errors that will not go away by retrying
+PERMANENT_ERRORS = (TelegramForbiddenError, TelegramBadRequest, TelegramNotFound)
+
+_wakeup = asyncio.Event()
+
+
+def wake_outbox() -> None:
+    """Tell this process's worker that new messages were committed."""
+    _wakeup.set()
+
+
+@db_operation
+async def enqueue_messages(
+    session: AsyncSession, messages: list[tuple[int, str]], key: str, parse_mode: str | None = "Markdown"
+) -> None:
+    """
+    Add (chat_id, text) messages to the outbox in the caller's transaction.
+    Each message's idempotency key is `key` plus its chat id.
+    """
+    if not messages:
+        return
+    await session.execute(
+        dialect_insert(session, OutboxMessage)
+        .values([
+            {"idempotency_key": f"{key}:{chat_id}", "chat_id": chat_id, "text": text, "parse_mode": parse_mode}
+            for chat_id, text in messages
+        ])
+        .on_conflict_do_nothing(index_elements=["idempotency_key"])
+    )
+
+
+def backoff(attempts: int) -> timedelta:
+    """Delay before the next try after `attempts` failed ones: exponential, capped, with jitter."""
+    delay = min(config.OUTBOX_BACKOFF_BASE * 2 ** (attempts - 1), config.OUTBOX_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+@db_operation
+async def claim_messages(session: AsyncSession, batch_size: int) -> list[OutboxMessage]:
+    """Claim due messages and push their next attempt past the lease, so no other replica takes them."""
+    now = datetime.utcnow()
+    result = await session.execute(
+        select(OutboxMessage)
+        .where(OutboxMessage.status == "pending", OutboxMessage.next_attempt_at <= now)
+        .order_by(OutboxMessage.next_attempt_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    messages = list(result.scalars().all())
+    if messages:
+        await session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id.in_([message.id for message in messages]))
+            .values(next_attempt_at=now + timedelta(seconds=config.OUTBOX_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        )
+    await session.commit()
+    return messages
+
+
+@db_operation
+async def record_results(
+    session: AsyncSession, results: list[tuple[OutboxMessage, Exception | None]]
+) -> int:
+    """Mark messages sent, schedule their retry, or dead-letter them. Returns the number dead-lettered."""
+    now = datetime.utcnow()
+    rows = []
+    dead_letters = 0
+    for message, error in results:
+        attempts = message.attempts + 1
+        row = {
+            "id": message.id, "attempts": attempts, "status": "sent", "sent_at": now,
+            "next_attempt_at": now, "last_error": None,
+        }
+        if error is not None:
+            dead = isinstance(error, PERMANENT_ERRORS) or attempts >= config.OUTBOX_MAX_ATTEMPTS
+            row.update(
+                status="dead" if dead else "pending",
+                sent_at=None,
+                next_attempt_at=now if dead else now + backoff(attempts),
+                last_error=f"{type(error).__name__}: {error}"[:500],
+            )
+            if dead:
+                dead_letters += 1
+                logger.warning(f"Dead-lettered outbox message {message.id} to {message.chat_id}: {error}")
+        OUTBOX_MESSAGES.labels("retry" if row["status"] == "pending" else row["status"]).inc()
+        rows.append(row)
+    await session.execute(update(OutboxMessage), rows)
+    await session.commit()
+    return dead_letters
+
+
+async def drain_outbox(
+    bot: Bot,
+    session_factory: async_sessionmaker = async_session,
+    sender: Broadcaster = default_broadcaster,
+    batch_size: int = config.OUTBOX_BATCH_SIZE
+) -> int:
+    """
+    Send every due message, batch by batch, and log the drain's throughput
+    and failures. Returns the number of messages attempted.
+    """
+    slots = asyncio.Semaphore(sender.concurrency)
+    stats = BroadcastStats()
+    dead_letters = 0
+    start = time.monotonic()
+    
+    async def deliver(message: OutboxMessage) -> tuple[OutboxMessage, Exception | None]:
+        async with slots:
+            parse_mode = {"parse_mode": message.parse_mode} if message.parse_mode else {}
+            return message, await sender.try_send(bot, message.chat_id, message.text, stats, **parse_mode)
+    
+    while True:
+        async with session_factory() as session:
+            messages = await claim_messages(session, batch_size)
+        if not messages:
+            break
+        
+        results = await asyncio.gather(*(deliver(message) for message in messages))
+        async with session_factory() as session:
+            dead_letters += await record_results(session, results)
+        stats.total += len(results)
+        stats.failed += sum(error is not None for _, error in results)
+    
+    if stats.total:
+        stats.sent = stats.total - stats.failed
+        stats.elapsed = time.monotonic() - start
+        logger.info(
+            f"Outbox drained: {stats}; {stats.failed - dead_letters} to retry later, "
+            f"{dead_letters} dead-lettered"
+        )
+    return stats.total
+
+
+async def run_outbox_worker(bot: Bot, session_factory: async_sessionmaker = async_session) -> None:
+    """
+    Drain the outbox whenever woken, and every OUTBOX_POLL_INTERVAL seconds for
+    retries and other replicas. A drain is skipped while another replica holds
+    the drain lock; that replica keeps claiming until the outbox is empty.
+    """
+    while True:
+        _wakeup.clear()
+        try:
+            async with leader_lock("outbox_drain") as leader:
+                if leader:
+                    await drain_outbox(bot, session_factory)
+        except Exception:
+            logger.exception("Outbox drain failed")
+        try:
+            await asyncio.wait_for(_wakeup.wait(), config.OUTBOX_POLL_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+
+
+@db_operation
+async def purge_sent_messages(
+    session: AsyncSession, older_than: timedelta | None = None, batch_size: int = config.OUTBOX_PURGE_BATCH
+) -> int:
+    """Delete sent messages older than OUTBOX_RETENTION_DAYS in batches; dead letters are kept."""
+    if older_than is None:
+        older_than = timedelta(days=config.OUTBOX_RETENTION_DAYS)
+    cutoff = datetime.utcnow() - older_than
+    deleted = 0
+    while True:
+        ids = (await session.execute(
+            select(OutboxMessage.id)
+            .where(OutboxMessage.status == "sent", OutboxMessage.sent_at < cutoff)
+            .limit(batch_size)
+        )).scalars().all()
+        if ids:
+            await session.execute(delete(OutboxMessage).where(OutboxMessage.id.in_(ids)))
+        await session.commit()
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            return deleted
@@ -0,0 +1,73 @@
+"""
+Read models for the hot read paths.
+
+Screens that only display names and ids do not need ORM entities: loading
+`Assignment`s with their `Member` and `Task` takes three queries and puts
+every object in the identity map. The functions here run one joined Core
+projection each and return plain NamedTuples, which are cheap to build and
+safe to cache or hand across threads.
+"""
+from typing import NamedTuple
+
+from sqlalchemy import Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import Assignment, Member, Task
+from metrics import db_operation
+
+
+class AssignmentRow(NamedTuple):
+    task_name: str
+    member_name: str
+    telegram_id: int
+
+
+class MemberRow(NamedTuple):
+    id: int
+    name: str
+
+
+class TaskRow(NamedTuple):
+    id: int
+    name: str
+
+
+def week_rows_query(household_id: int, yearweek: int) -> Select:
+    """Query for a household's week as (task name, member name, telegram id) rows."""
+    return (
+        select(Task.name, Member.name, Member.telegram_id)
+        .select_from(Assignment)
+        .join(Member, Assignment.member_id == Member.id)
+        .join(Task, Assignment.task_id == Task.id)
+        .where(
+            Assignment.household_id == household_id,
+            Assignment.year == yearweek // 100,
+            Assignment.yearweek == yearweek
+        )
+        .order_by(Task.name, Member.name)
+    )
+
+
+@db_operation
+async def get_week_rows(session: AsyncSession, household_id: int, yearweek: int) -> list[AssignmentRow]:
+    """Get a household's assignments in one week, ordered by task and member name."""
+    result = await session.execute(week_rows_query(household_id, yearweek))
+    return [AssignmentRow._make(row) for row in result.all()]
+
+
+@db_operation
+async def get_member_rows(session: AsyncSession, household_id: int) -> list[MemberRow]:
+    """Get all members of a household (active or not) for management lists."""
+    result = await session.execute(
+        select(Member.id, Member.name).where(Member.household_id == household_id).order_by(Member.name)
+    )
+    return [MemberRow._make(row) for row in result.all()]
+
+
+@db_operation
+async def get_task_rows(session: AsyncSession, household_id: int) -> list[TaskRow]:
+    """Get all tasks of a household (active or not) for management lists."""
+    result = await session.execute(
+        select(Task.id, Task.name).where(Task.household_id == household_id).order_by(Task.name)
+    )
+    return [TaskRow._make(row) for row in result.all()]
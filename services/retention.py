@@ -0,0 +1,138 @@
+"""
+Assignment history retention.
+
+`assignments` gains a row per member and task every week. Weeks older than
+ASSIGNMENT_RETENTION_WEEKS are rolled up into `assignment_summaries` (one
+row per member, task and year) and deleted in bounded batches; each batch
+deletes with RETURNING and adds exactly the rows it removed to the
+summaries in the same transaction, so a replica running concurrently can
+never count a week twice. When `assignments` is partitioned by year, the
+emptied partitions of past years are dropped afterwards.
+"""
+import logging
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from config import config
+from database import (
+    PARTITION_ASSIGNMENTS, Assignment, AssignmentSummary, async_session, create_assignment_partitions,
+    dialect_insert
+)
+from metrics import db_operation
+from services.assignment import yearweek_weeks_ago
+
+logger = logging.getLogger(__name__)
+
+
+def retention_horizon(weeks: int = config.ASSIGNMENT_RETENTION_WEEKS) -> int:
+    """Yearweek of the oldest week kept in `assignments` (never inside the solver's history window)."""
+    return yearweek_weeks_ago(max(weeks, config.ASSIGNMENT_HISTORY_WEEKS))
+
+
+@db_operation
+async def roll_up_batch(session: AsyncSession, before_yearweek: int, batch_size: int) -> int:
+    """
+    Move up to `batch_size` assignments older than `before_yearweek` into the
+    summaries and commit. Returns the number of rows moved.
+    """
+    ids = (await session.execute(
+        select(Assignment.id)
+        .where(Assignment.yearweek < before_yearweek)
+        .order_by(Assignment.yearweek)
+        .limit(batch_size)
+    )).scalars().all()
+    if not ids:
+        return 0
+    
+    deleted = await session.execute(
+        delete(Assignment)
+        .where(Assignment.id.in_(ids), Assignment.year <= before_yearweek // 100)
+        .returning(
+            Assignment.household_id, Assignment.member_id, Assignment.task_id,
+            Assignment.year, Assignment.yearweek
+        )
+        .execution_options(synchronize_session=False)
+    )
+    counts: Counter = Counter()
+    last_yearweek: dict[tuple[int, int, int, int], int] = {}
+    for household_id, member_id, task_id, year, yearweek in deleted.all():
+        key = (household_id, member_id, task_id, year)
+        counts[key] += 1
+        last_yearweek[key] = max(last_yearweek.get(key, 0), yearweek)
+    
+    if counts:
+        stmt = dialect_insert(session, AssignmentSummary).values([
+            {
+                "household_id": key[0], "member_id": key[1], "task_id": key[2], "year": key[3],
+                "times_assigned": count, "last_yearweek": last_yearweek[key],
+            }
+            for key, count in counts.items()
+        ])
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=["member_id", "task_id", "year"],
+            set_={
+                "times_assigned": AssignmentSummary.times_assigned + stmt.excluded.times_assigned,
+                "last_yearweek": stmt.excluded.last_yearweek,
+            }
+        ))
+    await session.commit()
+    return sum(counts.values())
+
+
+async def roll_up_assignments(
+    session_factory: async_sessionmaker = async_session,
+    before_yearweek: int | None = None,
+    batch_size: int = config.RETENTION_BATCH_SIZE
+) -> int:
+    """Roll up every assignment older than the retention horizon. Returns the number of rows moved."""
+    before_yearweek = before_yearweek or retention_horizon()
+    moved = 0
+    while True:
+        async with session_factory() as session:
+            batch = await roll_up_batch(session, before_yearweek, batch_size)
+        moved += batch
+        if batch < batch_size:
+            return moved
+
+
+@db_operation
+async def maintain_partitions(session: AsyncSession, before_yearweek: int) -> list[str]:
+    """
+    Create this and next year's `assignments` partitions and drop the
+    partitions of years entirely before `before_yearweek` (already rolled
+    up, so empty). Returns the dropped partition names.
+    """
+    year = datetime.utcnow().isocalendar()[0]
+    await create_assignment_partitions(await session.connection(), [year, year + 1])
+    
+    result = await session.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'assignments'::regclass"
+    ))
+    dropped = []
+    for name in result.scalars().all():
+        prefix, _, suffix = name.partition("_y")
+        if prefix == "assignments" and suffix.isdigit() and int(suffix) < before_yearweek // 100:
+            await session.execute(text(f'DROP TABLE "{name}"'))
+            dropped.append(name)
+    await session.commit()
+    return dropped
+
+
+async def apply_retention(session_factory: async_sessionmaker = async_session) -> int:
+    """Daily retention pass: roll up old weeks, then keep the partitions in shape."""
+    horizon = retention_horizon()
+    moved = await roll_up_assignments(session_factory, horizon)
+    if moved:
+        logger.info(f"Rolled up {moved} assignments older than week {horizon}")
+    
+    if PARTITION_ASSIGNMENTS:
+        async with session_factory() as session:
+            dropped = await maintain_partitions(session, horizon)
+        if dropped:
+            logger.info(f"Dropped assignment partitions: {', '.join(dropped)}")
+    return moved
@@ -0,0 +1,173 @@
+"""
+Typed, cached access to the `settings` key/value table.
+
+All rows are loaded with one query into an in-process cache and writes go
+through it. Other replicas learn about changes through Postgres
+LISTEN/NOTIFY; on SQLite (single process) or if the listener connection
+drops, the table is polled every SETTINGS_POLL_INTERVAL seconds instead.
+"""
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from sqlalchemy import select, text, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from config import config
+from database import Settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "settings_changed"
+
+# Known keys: type and default taken from config
+SETTING_TYPES: dict[str, tuple[type, Callable[[], Any]]] = {
+    "notification_day": (int, lambda: config.NOTIFICATION_DAY),
+    "notification_hour": (int, lambda: config.NOTIFICATION_HOUR),
+}
+
+SettingKey = tuple[int | None, str]
+ChangeCallback = Callable[[int | None, str, Any], Awaitable[None]]
+
+
+def parse_value(key: str, raw: str | None) -> Any:
+    """Convert a stored string to the key's type, falling back to its default."""
+    type_, default = SETTING_TYPES.get(key, (str, lambda: None))
+    if raw is None:
+        return default()
+    try:
+        return type_(raw)
+    except ValueError:
+        logger.warning(f"Invalid value {raw!r} for setting {key}, using default")
+        return default()
+
+
+class SettingsStore:
+    """In-process copy of the settings table with change callbacks."""
+    
+    def __init__(self):
+        self._values: dict[SettingKey, str] | None = None
+        self._callbacks: list[ChangeCallback] = []
+    
+    def on_change(self, callback: ChangeCallback) -> ChangeCallback:
+        """Register `callback(household_id, key, value)`, run whenever a setting changes."""
+        self._callbacks.append(callback)
+        return callback
+    
+    def clear(self) -> None:
+        self._values = None
+    
+    async def _load(self, session: AsyncSession) -> dict[SettingKey, str]:
+        result = await session.execute(select(Settings.household_id, Settings.key, Settings.value))
+        return {(household_id, key): value for household_id, key, value in result}
+    
+    async def _ensure_loaded(self, session: AsyncSession) -> dict[SettingKey, str]:
+        if self._values is None:
+            self._values = await self._load(session)
+        return self._values
+    
+    async def get(self, session: AsyncSession, key: str, household_id: int | None = None) -> Any:
+        """
+        Typed value of a setting. A household falls back to the bot-wide
+        value, and that to the config default.
+        """
+        values = await self._ensure_loaded(session)
+        raw = values.get((household_id, key))
+        if raw is None and household_id is not None:
+            raw = values.get((None, key))
+        return parse_value(key, raw)
+    
+    async def set(self, session: AsyncSession, key: str, value: Any, household_id: int | None = None) -> None:
+        """Store a setting, update the cache and tell other replicas."""
+        raw = str(value)
+        values = await self._ensure_loaded(session)
+        previous = values.get((household_id, key))
+        
+        # NULL household_id never conflicts in a unique index, so no upsert here
+        result = await session.execute(
+            update(Settings)
+            .where(
+                Settings.household_id.is_(None) if household_id is None else Settings.household_id == household_id,
+                Settings.key == key
+            )
+            .values(value=raw)
+        )
+        if result.rowcount == 0:
+            session.add(Settings(household_id=household_id, key=key, value=raw))
+        if session.bind.dialect.name == "postgresql":
+            await session.execute(text("SELECT pg_notify(:channel, :key)"), {"channel": CHANNEL, "key": key})
+        await session.commit()
+        
+        values[(household_id, key)] = raw
+        if previous != raw:
+            await self._notify(household_id, key, raw)
+    
+    async def refresh(self, session: AsyncSession) -> list[SettingKey]:
+        """Reload all settings and run callbacks for those that changed."""
+        new = await self._load(session)
+        old = self._values
+        self._values = new
+        if old is None:
+            return []
+        
+        changed = [k for k in old.keys() | new.keys() if old.get(k) != new.get(k)]
+        for household_id, key in changed:
+            await self._notify(household_id, key, new.get((household_id, key)))
+        return changed
+    
+    async def _notify(self, household_id: int | None, key: str, raw: str | None) -> None:
+        value = parse_value(key, raw)
+        for callback in self._callbacks:
+            try:
+                await callback(household_id, key, value)
+            except Exception:
+                logger.exception(f"Settings callback failed for {key}")
+    
+    async def watch(self, session_factory: async_sessionmaker, engine: AsyncEngine) -> None:
+        """Keep the cache in sync with other replicas until cancelled."""
+        while True:
+            if engine.dialect.name == "postgresql":
+                try:
+                    await self._listen(session_factory, engine)
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    logger.exception("Settings listener failed, polling until it reconnects")
+            
+            await asyncio.sleep(config.SETTINGS_POLL_INTERVAL)
+            try:
+                async with session_factory() as session:
+                    await self.refresh(session)
+            except Exception:
+                logger.exception("Failed to refresh settings")
+    
+    async def _listen(self, session_factory: async_sessionmaker, engine: AsyncEngine) -> None:
+        """LISTEN for change notifications on a dedicated connection."""
+        changed = asyncio.Event()
+        
+        def on_notify(*args: Any) -> None:
+            changed.set()
+        
+        async with engine.connect() as conn:
+            raw = (await conn.get_raw_connection()).driver_connection
+            await raw.add_listener(CHANNEL, on_notify)
+            try:
+                # Catch up on anything missed while not listening
+                async with session_factory() as session:
+                    await self.refresh(session)
+                while not raw.is_closed():
+                    try:
+                        await asyncio.wait_for(changed.wait(), config.SETTINGS_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        continue
+                    changed.clear()
+                    async with session_factory() as session:
+                        await self.refresh(session)
+            finally:
+                if not raw.is_closed():
+                    await raw.remove_listener(CHANNEL, on_notify)
+        raise ConnectionError("Settings listener connection closed")
+
+
+settings_store = SettingsStore()
@@ -0,0 +1,90 @@
+"""
+History-aware assignment solver.
+
+The cost of giving a member a task grows with how often (and how recently)
+they already did it. Solving happens in two stages:
+
+1. Who works: every member gets one slot per full "round" of the week's
+   slots, and the remaining slots go to the members with the lowest recent
+   load, so the work stays balanced over time.
+2. Who does what: the chosen members are matched to task slots by a
+   minimum-cost assignment (Hungarian method) on the per-task history cost.
+"""
+import numpy as np
+
+# Weight of an assignment one week older than the previous one
+HISTORY_DECAY = 0.85
+# Random tie-breaking so equal histories still rotate
+JITTER = 1e-3
+
+
+def build_cost_matrix(
+    n_members: int,
+    n_tasks: int,
+    history_members: np.ndarray,
+    history_tasks: np.ndarray,
+    history_ages: np.ndarray,
+    decay: float = HISTORY_DECAY
+) -> np.ndarray:
+    """
+    Build a (members x tasks) cost matrix from past assignments.
+    History is given as parallel arrays of member index, task index and age in
+    weeks (1 = last week).
+    """
+    if not len(history_members):
+        return np.zeros((n_members, n_tasks), dtype=np.float64)
+
+    weights = np.power(decay, np.asarray(history_ages, dtype=np.float64) - 1)
+    flat = np.asarray(history_members, dtype=np.int64) * n_tasks + np.asarray(history_tasks, dtype=np.int64)
+    cost = np.bincount(flat, weights=weights, minlength=n_members * n_tasks)
+    return cost.reshape(n_members, n_tasks)
+
+
+def select_members(cost: np.ndarray, n_slots: int, rng: np.random.Generator) -> np.ndarray:
+    """Pick the member index for every slot column, least-loaded members first."""
+    n_members = cost.shape[0]
+    full_rounds, remainder = divmod(n_slots, n_members)
+    load = cost.sum(axis=1) + rng.random(n_members) * JITTER
+    extra = np.argpartition(load, remainder)[:remainder] if remainder else np.empty(0, dtype=np.int64)
+    return np.concatenate([np.tile(np.arange(n_members), full_rounds), extra])
+
+
+def solve_assignment(
+    cost: np.ndarray,
+    required_people: list[int],
+    rng: np.random.Generator | None = None
+) -> list[list[int]]:
+    """
+    Assign members to task slots with minimum total cost.
+    Returns, for each task, the list of assigned member indices.
+    """
+    n_members, n_tasks = cost.shape
+    if n_members == 0 or n_tasks == 0:
+        return [[] for _ in range(n_tasks)]
+
+    # scipy.optimize takes about half a second to import; only the first shuffle pays for it
+    from scipy.optimize import linear_sum_assignment
+    
+    rng = rng or np.random.default_rng()
+    slot_tasks = np.repeat(np.arange(n_tasks), required_people)
+    columns = select_members(cost, len(slot_tasks), rng)
+
+    # slots x chosen members
+    matrix = cost[np.ix_(columns, slot_tasks)].T
+    matrix += rng.random(matrix.shape) * JITTER
+    rows, cols = linear_sum_assignment(matrix)
+
+    result: list[list[int]] = [[] for _ in range(n_tasks)]
+    for row, col in zip(rows, cols):
+        result[slot_tasks[row]].append(int(columns[col]))
+    return result
+
+
+def solve_week(n_members: int, history: np.ndarray, required_people: list[int]) -> list[list[int]]:
+    """
+    Solve one week from plain data: `history` is an (n, 3) array of member
+    index, task index and age. Module-level and free of ORM objects so it can
+    run in a worker process.
+    """
+    cost = build_cost_matrix(n_members, len(required_people), history[:, 0], history[:, 1], history[:, 2])
+    return solve_assignment(cost, required_people)
@@ -0,0 +1,236 @@
+"""
+Per-member, per-task fairness statistics.
+
+`member_task_stats` holds how often each member did each task and the
+latest week they did it. `replace_assignments` applies the difference
+between the rows it deletes and inserts in the same transaction, so the
+counters are always in step with the schedule and /stats never has to
+aggregate the assignment history. The counters include weeks planned
+ahead by the precompute; /stats subtracts those few rows when reading, so
+it only shows weeks up to the current one. Retention moves rows into the
+yearly summaries without touching these counters. `backfill_stats` builds
+them once from existing data.
+"""
+import logging
+from collections import Counter
+from collections.abc import Iterable
+
+from sqlalchemy import case, delete, func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import (
+    Assignment, AssignmentSummary, Household, Member, MemberTaskStats, Task, async_session, dialect_insert
+)
+from metrics import db_operation
+from services.locks import claim_run, finish_run
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_JOB = "member_task_stats_backfill"
+BACKFILL_VERSION = "v1"
+
+
+@db_operation
+async def record_assignment_changes(
+    session: AsyncSession,
+    household_id: int,
+    removed: Iterable[tuple[int, int, int]],
+    added: Iterable[tuple[int, int, int]]
+) -> None:
+    """
+    Apply deleted and inserted (member_id, task_id, yearweek) assignments to
+    the counters, in the caller's transaction.
+    """
+    delta: Counter = Counter()
+    latest: dict[tuple[int, int], int] = {}
+    for member_id, task_id, yearweek in added:
+        delta[member_id, task_id] += 1
+        latest[member_id, task_id] = max(latest.get((member_id, task_id), 0), yearweek)
+    # Pairs that lost a week without getting a new one may need an older last week
+    stale = set()
+    for member_id, task_id, _ in removed:
+        delta[member_id, task_id] -= 1
+        if (member_id, task_id) not in latest:
+            stale.add((member_id, task_id))
+    
+    changed = [pair for pair in delta if delta[pair] or pair in latest]
+    if changed:
+        # Executemany with a fixed statement: its compiled form is cached, whereas a
+        # VALUES list is compiled anew on the event loop for every shuffle
+        stmt = dialect_insert(session, MemberTaskStats)
+        current, new = MemberTaskStats.last_yearweek, stmt.excluded.last_yearweek
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["member_id", "task_id"],
+                set_={
+                    "times_assigned": MemberTaskStats.times_assigned + stmt.excluded.times_assigned,
+                    "last_yearweek": case(
+                        (new.is_(None), current), (current.is_(None), new), (new > current, new), else_=current
+                    ),
+                }
+            ),
+            [
+                {
+                    "member_id": member_id, "task_id": task_id, "household_id": household_id,
+                    "times_assigned": delta[member_id, task_id], "last_yearweek": latest.get((member_id, task_id)),
+                }
+                for member_id, task_id in changed
+            ]
+        )
+    
+    if stale:
+        pair = tuple_(MemberTaskStats.member_id, MemberTaskStats.task_id)
+        raw_last = (
+            select(func.max(Assignment.yearweek))
+            .where(Assignment.member_id == MemberTaskStats.member_id, Assignment.task_id == MemberTaskStats.task_id)
+            .scalar_subquery()
+        )
+        rolled_up_last = (
+            select(func.max(AssignmentSummary.last_yearweek))
+            .where(
+                AssignmentSummary.member_id == MemberTaskStats.member_id,
+                AssignmentSummary.task_id == MemberTaskStats.task_id
+            )
+            .scalar_subquery()
+        )
+        await session.execute(
+            update(MemberTaskStats)
+            .where(pair.in_(list(stale)))
+            .values(last_yearweek=func.coalesce(raw_last, rolled_up_last))
+            .execution_options(synchronize_session=False)
+        )
+
+
+@db_operation
+async def rebuild_household_stats(session: AsyncSession, household_id: int) -> int:
+    """Recompute a household's counters from its assignments and yearly summaries. Returns the row count."""
+    totals: dict[tuple[int, int], list[int]] = {}
+    raw = await session.execute(
+        select(Assignment.member_id, Assignment.task_id, func.count(), func.max(Assignment.yearweek))
+        .where(Assignment.household_id == household_id)
+        .group_by(Assignment.member_id, Assignment.task_id)
+    )
+    rolled_up = await session.execute(
+        select(
+            AssignmentSummary.member_id, AssignmentSummary.task_id,
+            func.sum(AssignmentSummary.times_assigned), func.max(AssignmentSummary.last_yearweek)
+        )
+        .where(AssignmentSummary.household_id == household_id)
+        .group_by(AssignmentSummary.member_id, AssignmentSummary.task_id)
+    )
+    for member_id, task_id, count, last_yearweek in [*raw.all(), *rolled_up.all()]:
+        entry = totals.setdefault((member_id, task_id), [0, last_yearweek])
+        entry[0] += count
+        entry[1] = max(entry[1], last_yearweek)
+    
+    await session.execute(delete(MemberTaskStats).where(MemberTaskStats.household_id == household_id))
+    if totals:
+        await session.execute(dialect_insert(session, MemberTaskStats), [
+            {
+                "member_id": member_id, "task_id": task_id, "household_id": household_id,
+                "times_assigned": count, "last_yearweek": last_yearweek,
+            }
+            for (member_id, task_id), (count, last_yearweek) in totals.items()
+        ])
+    await session.commit()
+    return len(totals)
+
+
+async def backfill_stats(session_factory: async_sessionmaker = async_session) -> int:
+    """
+    Build the counters of every household from existing data, once per
+    BACKFILL_VERSION across all replicas. Returns the number of households rebuilt.
+    """
+    async with session_factory() as session:
+        if not await claim_run(session, BACKFILL_JOB, BACKFILL_VERSION):
+            return 0
+        household_ids = (await session.execute(select(Household.id))).scalars().all()
+        
+        try:
+            for household_id in household_ids:
+                async with session_factory() as household_session:
+                    await rebuild_household_stats(household_session, household_id)
+        except Exception:
+            await finish_run(session, BACKFILL_JOB, BACKFILL_VERSION, ok=False)
+            raise
+        await finish_run(session, BACKFILL_JOB, BACKFILL_VERSION)
+    
+    logger.info(f"Backfilled member task stats for {len(household_ids)} households")
+    return len(household_ids)
+
+
+@db_operation
+async def get_household_stats(
+    session: AsyncSession, household_id: int, current_yearweek: int
+) -> list[tuple[str, str, int, int | None]]:
+    """
+    Get (member name, task name, times assigned, last yearweek) for a household's
+    active members, counting weeks up to `current_yearweek` only.
+    """
+    # Weeks planned ahead: at most PRECOMPUTE_WEEKS of rows per household
+    planned = (
+        select(Assignment.member_id, Assignment.task_id, func.count().label("weeks"))
+        .where(
+            Assignment.household_id == household_id,
+            Assignment.year >= current_yearweek // 100,
+            Assignment.yearweek > current_yearweek
+        )
+        .group_by(Assignment.member_id, Assignment.task_id)
+        .subquery()
+    )
+    past_last = func.coalesce(
+        select(func.max(Assignment.yearweek))
+        .where(
+            Assignment.member_id == MemberTaskStats.member_id,
+            Assignment.task_id == MemberTaskStats.task_id,
+            Assignment.yearweek <= current_yearweek
+        )
+        .scalar_subquery(),
+        select(func.max(AssignmentSummary.last_yearweek))
+        .where(
+            AssignmentSummary.member_id == MemberTaskStats.member_id,
+            AssignmentSummary.task_id == MemberTaskStats.task_id
+        )
+        .scalar_subquery()
+    )
+    times = MemberTaskStats.times_assigned - func.coalesce(planned.c.weeks, 0)
+    result = await session.execute(
+        select(
+            Member.name, Task.name, times,
+            case((MemberTaskStats.last_yearweek > current_yearweek, past_last), else_=MemberTaskStats.last_yearweek)
+        )
+        .select_from(MemberTaskStats)
+        .join(Member, MemberTaskStats.member_id == Member.id)
+        .join(Task, MemberTaskStats.task_id == Task.id)
+        .outerjoin(
+            planned,
+            (planned.c.member_id == MemberTaskStats.member_id) & (planned.c.task_id == MemberTaskStats.task_id)
+        )
+        .where(
+            MemberTaskStats.household_id == household_id,
+            times > 0,
+            Member.active == True
+        )
+        .order_by(Member.name, times.desc(), Task.name)
+    )
+    return [tuple(row) for row in result.all()]
+
+
+def format_stats(rows: list[tuple[str, str, int, int | None]]) -> str:
+    """Format household stats as one block per member."""
+    if not rows:
+        return "📊 No stats yet. They appear after the first shuffle."
+    
+    max_task_len = max(len(task) for _, task, _, _ in rows)
+    lines = ["📊 *Task Stats*", "", "```"]
+    member = None
+    for name, task, count, last_yearweek in rows:
+        if name != member:
+            if member is not None:
+                lines.append("")
+            lines.append(name)
+            member = name
+        last = f"{last_yearweek // 100}-W{last_yearweek % 100:02d}" if last_yearweek else "-"
+        lines.append(f"  {task:<{max_task_len}} {count:>3}×  last {last}")
+    lines.append("```")
+    return "\n".join(lines)
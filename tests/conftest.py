@@ -1,11 +1,25 @@
 import pytest
 import pytest_asyncio
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from database import Base, Member, Task, Assignment
+from database import Base, Household, Member, Task, Assignment
+from services.cache import schedule_cache, member_tasks_index, identity_cache
+from services.settings import settings_store
 
 # Use SQLite in-memory for fast testing
 TEST_DB_URL = "sqlite+aiosqlite:///:memory:"
 
+@pytest.fixture(autouse=True)
+def clear_caches():
+    schedule_cache.clear()
+    member_tasks_index.clear()
+    identity_cache.clear()
+    settings_store.clear()
+    yield
+    schedule_cache.clear()
+    member_tasks_index.clear()
+    identity_cache.clear()
+    settings_store.clear()
+
 @pytest_asyncio.fixture
 async def db_engine():
     engine = create_async_engine(TEST_DB_URL, echo=False)
@@ -22,12 +36,22 @@ async def db_session(db_engine):
     async with async_session() as session:
         yield session
 
+@pytest_asyncio.fixture
+async def household(db_session):
+    h = Household(chat_id=-1001, title="Flat", admin_id=1000)
+    db_session.add(h)
+    await db_session.commit()
+    return h
+
 @pytest.fixture
-def member_factory(db_session):
-    async def _create_members(count=3):
+def member_factory(db_session, household):
+    async def _create_members(count=3, household_id=None):
         members = []
         for i in range(count):
-            m = Member(telegram_id=1000+i, name=f"User{i}", username=f"user{i}")
+            m = Member(
+                household_id=household_id or household.id,
+                telegram_id=1000+i, name=f"User{i}", username=f"user{i}"
+            )
             db_session.add(m)
             members.append(m)
         await db_session.commit()
@@ -35,11 +59,14 @@ def member_factory(db_session):
     return _create_members
 
 @pytest.fixture
-def task_factory(db_session):
-    async def _create_tasks(count=2, required_people=1):
+def task_factory(db_session, household):
+    async def _create_tasks(count=2, required_people=1, household_id=None):
         tasks = []
         for i in range(count):
-            t = Task(name=f"Task{i}", required_people=required_people)
+            t = Task(
+                household_id=household_id or household.id,
+                name=f"Task{i}", required_people=required_people
+            )
             db_session.add(t)
             tasks.append(t)
         await db_session.commit()
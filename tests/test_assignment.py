@@ -1,22 +1,37 @@
 import pytest
-from sqlalchemy import select
-from database import Member, Task, Assignment
-from services.assignment import shuffle_assignments, get_current_assignments
+from datetime import date, timedelta
+from sqlalchemy import event, select
+from sqlalchemy.orm import selectinload
+from database import Household, Member, Task, Assignment, pack_yearweek
+from services.assignment import (
+    shuffle_assignments, get_current_week, get_current_yearweek, ensure_current_assignments,
+    format_upcoming_schedule, get_upcoming_assignments, load_weeks, precompute_assignments, upcoming_weeks
+)
+from services.cache import schedule_cache
+
+async def get_current_assignments(session, household_id):
+    """A household's assignments in the current week, with members and tasks loaded."""
+    result = await session.execute(
+        select(Assignment)
+        .options(selectinload(Assignment.member), selectinload(Assignment.task))
+        .where(Assignment.household_id == household_id, Assignment.yearweek == get_current_yearweek())
+    )
+    return list(result.scalars().all())
 
 @pytest.mark.asyncio
-async def test_shuffle_basics(db_session, member_factory, task_factory):
+async def test_shuffle_basics(db_session, household, member_factory, task_factory):
     """Test basic shuffle functionality."""
     # Setup: 3 members, 2 tasks (1 person each)
     await member_factory(count=3)
     await task_factory(count=2, required_people=1)
     
     # Run shuffle
-    result = await shuffle_assignments(db_session)
+    result = await shuffle_assignments(db_session, household.id)
     
     # Verify exact number of assignments (2 tasks * 1 person = 2 assignments)
     assert len(result) == 2  # 2 tasks in dict
     
-    assignments = await get_current_assignments(db_session)
+    assignments = await get_current_assignments(db_session, household.id)
     assert len(assignments) == 2
     
     # Verify assigned members are unique (since we have enough members)
@@ -24,7 +39,7 @@ async def test_shuffle_basics(db_session, member_factory, task_factory):
     assert len(set(assigned_members)) == 2
 
 @pytest.mark.asyncio
-async def test_shuffle_not_enough_members(db_session, member_factory, task_factory):
+async def test_shuffle_not_enough_members(db_session, household, member_factory, task_factory):
     """Test shuffle when tasks require more people than available."""
     # Setup: 2 members, 3 tasks (1 person each) -> Need 3 slots
     await member_factory(count=2)
@@ -32,8 +47,8 @@ async def test_shuffle_not_enough_members(db_session, member_factory, task_facto
     await task_factory(count=3, required_people=1)
     
     # Run shuffle
-    await shuffle_assignments(db_session)
-    assignments = await get_current_assignments(db_session)
+    await shuffle_assignments(db_session, household.id)
+    assignments = await get_current_assignments(db_session, household.id)
     
     # Should have 3 assignments
     assert len(assignments) == 3
@@ -45,14 +60,14 @@ async def test_shuffle_not_enough_members(db_session, member_factory, task_facto
     assert len(unique_ids) == 2  # Both members used
 
 @pytest.mark.asyncio
-async def test_shuffle_multi_person_task(db_session, member_factory, task_factory):
+async def test_shuffle_multi_person_task(db_session, household, member_factory, task_factory):
     """Test task requiring multiple people."""
     await member_factory(count=4)
     # 1 task requiring 3 people
     await task_factory(count=1, required_people=3)
     
-    await shuffle_assignments(db_session)
-    assignments = await get_current_assignments(db_session)
+    await shuffle_assignments(db_session, household.id)
+    assignments = await get_current_assignments(db_session, household.id)
     
     assert len(assignments) == 3
     assert assignments[0].task.name == "Task0"
@@ -62,31 +77,149 @@ async def test_shuffle_multi_person_task(db_session, member_factory, task_factor
     assert len(assigned_ids) == 3
 
 @pytest.mark.asyncio
-async def test_empty_shuffle(db_session):
+async def test_empty_shuffle(db_session, household):
     """Test shuffle with no data."""
-    result = await shuffle_assignments(db_session)
+    result = await shuffle_assignments(db_session, household.id)
     assert result == {}
     
-    assignments = await get_current_assignments(db_session)
+    assignments = await get_current_assignments(db_session, household.id)
     assert len(assignments) == 0
 
 @pytest.mark.asyncio
-async def test_reshuffle_clears_previous(db_session, member_factory, task_factory):
+async def test_reshuffle_clears_previous(db_session, household, member_factory, task_factory):
     """Test that shuffling again clears previous assignments for the week."""
     await member_factory(count=3)
     await task_factory(count=2)
     
     # First shuffle
-    await shuffle_assignments(db_session)
-    first_assignments = await get_current_assignments(db_session)
+    await shuffle_assignments(db_session, household.id)
+    first_assignments = await get_current_assignments(db_session, household.id)
     assert len(first_assignments) == 2
     
     # Second shuffle
-    await shuffle_assignments(db_session)
-    second_assignments = await get_current_assignments(db_session)
+    await shuffle_assignments(db_session, household.id)
+    second_assignments = await get_current_assignments(db_session, household.id)
     assert len(second_assignments) == 2
     
     # Total assignments should still be 2 (previous ones deleted)
     result = await db_session.execute(select(Assignment))
     all_assignments = result.scalars().all()
     assert len(all_assignments) == 2
+
+@pytest.mark.asyncio
+async def test_shuffle_is_scoped_to_household(db_session, household, member_factory, task_factory):
+    """Test that shuffling one household leaves other households untouched."""
+    other = Household(chat_id=-2002, title="Other Flat")
+    db_session.add(other)
+    await db_session.commit()
+    
+    await member_factory(count=2)
+    await task_factory(count=2)
+    await member_factory(count=2, household_id=other.id)
+    await task_factory(count=1, household_id=other.id)
+    
+    await shuffle_assignments(db_session, other.id)
+    await shuffle_assignments(db_session, household.id)
+    await shuffle_assignments(db_session, household.id)
+    
+    own = await get_current_assignments(db_session, household.id)
+    foreign = await get_current_assignments(db_session, other.id)
+    assert len(own) == 2
+    assert len(foreign) == 1
+    assert all(a.member.household_id == household.id for a in own)
+    assert foreign[0].member.household_id == other.id
+
+@pytest.mark.asyncio
+async def test_shuffle_rotates_away_from_last_week(db_session, household, member_factory, task_factory):
+    """Test that members don't get the task they did last week."""
+    members = await member_factory(count=2)
+    tasks = await task_factory(count=2)
+    
+    week, year = get_current_week()
+    last_week = date.fromisocalendar(year, week, 1) - timedelta(weeks=1)
+    last_year, last_week_number, _ = last_week.isocalendar()
+    for member, task in zip(members, tasks):
+        db_session.add(Assignment(
+            household_id=household.id, member_id=member.id, task_id=task.id,
+            week_number=last_week_number, year=last_year
+        ))
+    await db_session.commit()
+    
+    for _ in range(3):
+        result = await shuffle_assignments(db_session, household.id)
+        assert result == {"Task0": ["User1"], "Task1": ["User0"]}
+
+@pytest.mark.asyncio
+async def test_shuffle_writes_in_one_transaction(db_engine, db_session, household, member_factory, task_factory):
+    """Test that a reshuffle is one commit with a single multi-row INSERT."""
+    await member_factory(count=6)
+    await task_factory(count=3, required_people=2)
+    await shuffle_assignments(db_session, household.id)
+    
+    statements = []
+    commits = []
+    
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(" ".join(statement.split()[:3]).upper())
+    
+    def on_commit(conn):
+        commits.append(conn)
+    
+    event.listen(db_engine.sync_engine, "before_cursor_execute", on_execute)
+    event.listen(db_engine.sync_engine, "commit", on_commit)
+    try:
+        await shuffle_assignments(db_session, household.id)
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", on_execute)
+        event.remove(db_engine.sync_engine, "commit", on_commit)
+    
+    assert len(commits) == 1
+    assert statements.count("DELETE FROM ASSIGNMENTS") == 1
+    assert statements.count("INSERT INTO ASSIGNMENTS") == 1
+    assert len(await get_current_assignments(db_session, household.id)) == 6
+
+@pytest.mark.asyncio
+async def test_precompute_plans_rotating_weeks_once(db_session, household, member_factory, task_factory):
+    """Test that upcoming weeks are planned in one go, rotate, and stay put once planned."""
+    members = await member_factory(count=2)
+    tasks = await task_factory(count=2)
+    
+    planned = await precompute_assignments(db_session, household.id, weeks=4)
+    assert planned == upcoming_weeks(4)
+    
+    weeks = await load_weeks(db_session, household.id, planned)
+    task0_doers = [
+        next(member_id for member_id, task_id in weeks[pack_yearweek(year, week)] if task_id == tasks[0].id)
+        for week, year in planned
+    ]
+    # Each planned week sees the ones before it as history
+    assert all(a != b for a, b in zip(task0_doers, task0_doers[1:]))
+    assert await get_current_assignments(db_session, household.id) == []
+    
+    assert await precompute_assignments(db_session, household.id, weeks=4) == []
+    
+    # A member leaving makes the planned weeks outdated
+    members[0].active = False
+    await db_session.commit()
+    schedule_cache.set((household.id, *planned[0]), "stale table")
+    assert await precompute_assignments(db_session, household.id, weeks=4) == planned
+    assert (household.id, *planned[0]) not in schedule_cache
+    upcoming = await get_upcoming_assignments(db_session, household.id, 4)
+    assert [(week, year) for week, year, _ in upcoming] == planned
+    assert "Week" in format_upcoming_schedule(upcoming)
+
+@pytest.mark.asyncio
+async def test_weekly_run_keeps_a_fitting_precomputed_week(db_session, household, member_factory, task_factory):
+    """Test that the weekly run only shuffles when the week is missing or outdated."""
+    await member_factory(count=3)
+    await task_factory(count=2)
+    
+    assert await ensure_current_assignments(db_session, household.id)
+    before = {(a.member_id, a.task_id) for a in await get_current_assignments(db_session, household.id)}
+    assert not await ensure_current_assignments(db_session, household.id)
+    after = {(a.member_id, a.task_id) for a in await get_current_assignments(db_session, household.id)}
+    assert before == after
+    
+    db_session.add(Task(household_id=household.id, name="Windows", required_people=2))
+    await db_session.commit()
+    assert await ensure_current_assignments(db_session, household.id)
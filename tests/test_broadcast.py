@@ -0,0 +1,77 @@
+import asyncio
+import time
+import pytest
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+from aiogram.methods import SendMessage
+from services.broadcast import Broadcaster, BroadcastStats, TokenBucket
+
+class FakeBot:
+    """Records sends; raises the queued error for a chat once."""
+    
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = errors or {}
+    
+    async def send_message(self, chat_id, text, **kwargs):
+        error = self.errors.pop(chat_id, None)
+        if error:
+            raise error
+        self.sent.append((chat_id, text, time.monotonic()))
+
+def method(chat_id):
+    return SendMessage(chat_id=chat_id, text="x")
+
+async def send_all(sender, bot, messages):
+    stats = BroadcastStats(total=len(messages))
+    delivered = await asyncio.gather(*(sender.send(bot, chat_id, text, stats) for chat_id, text in messages))
+    stats.sent = sum(delivered)
+    stats.failed = stats.total - stats.sent
+    return stats
+
+@pytest.mark.asyncio
+async def test_send_delivers_everything():
+    bot = FakeBot()
+    stats = await send_all(Broadcaster(rate=1000), bot, [(i, f"msg{i}") for i in range(20)])
+    
+    assert stats.total == stats.sent == 20
+    assert stats.failed == 0
+    assert sorted(chat_id for chat_id, _, _ in bot.sent) == list(range(20))
+
+@pytest.mark.asyncio
+async def test_send_retries_after_flood_control():
+    bot = FakeBot({3: TelegramRetryAfter(method(3), "Too Many Requests", retry_after=0)})
+    stats = await send_all(Broadcaster(rate=1000), bot, [(i, "hi") for i in range(5)])
+    
+    assert stats.sent == 5
+    assert stats.retried == 1
+
+@pytest.mark.asyncio
+async def test_send_reports_permanent_failures():
+    bot = FakeBot({1: TelegramForbiddenError(method(1), "bot was blocked by the user")})
+    sender = Broadcaster(rate=1000)
+    stats = await send_all(sender, bot, [(1, "hi"), (2, "hi")])
+    
+    assert stats.sent == 1
+    assert stats.failed == 1
+    assert stats.retried == 0
+    assert stats.errors == {"TelegramForbiddenError": 1}
+    
+    bot.errors[1] = TelegramForbiddenError(method(1), "bot was blocked by the user")
+    assert isinstance(await sender.try_send(bot, 1, "hi"), TelegramForbiddenError)
+
+@pytest.mark.asyncio
+async def test_send_spaces_messages_to_the_same_chat():
+    bot = FakeBot()
+    await send_all(Broadcaster(rate=1000, per_chat_interval=0.1), bot, [(7, "one"), (7, "two")])
+    
+    (_, _, first), (_, _, second) = bot.sent
+    assert second - first >= 0.09
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=50, capacity=1)
+    start = time.monotonic()
+    for _ in range(6):
+        await bucket.acquire()
+    
+    assert time.monotonic() - start >= 0.09
@@ -0,0 +1,68 @@
+import pytest
+from sqlalchemy import event
+from services.assignment import get_formatted_schedule, get_member_task_names, shuffle_assignments
+from services.cache import LRUCache, schedule_cache, member_tasks_index, invalidate_schedule
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    
+    assert "a" in cache
+    assert "b" not in cache
+    assert cache.stats() == {"hits": 1, "misses": 0, "size": 2, "maxsize": 2}
+
+def test_lru_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("services.cache.time.monotonic", lambda: now[0])
+    cache = LRUCache(maxsize=2, ttl=10)
+    cache.set("a", 1)
+    
+    assert cache.get("a") == 1
+    now[0] += 11
+    assert cache.get("a") is None
+    assert cache.misses == 1
+
+@pytest.mark.asyncio
+async def test_schedule_is_cached_until_invalidated(db_session, household, member_factory, task_factory):
+    await member_factory(count=2)
+    await task_factory(count=2)
+    
+    hits = schedule_cache.hits
+    empty = await get_formatted_schedule(db_session, household.id)
+    assert await get_formatted_schedule(db_session, household.id) == empty
+    assert schedule_cache.hits == hits + 1
+    
+    # Shuffling invalidates the household's entry
+    await shuffle_assignments(db_session, household.id)
+    schedule = await get_formatted_schedule(db_session, household.id)
+    assert schedule != empty
+    assert "Task0" in schedule
+    
+    invalidate_schedule(household.id)
+    assert len(schedule_cache) == 0
+
+@pytest.mark.asyncio
+async def test_member_tasks_served_from_index(db_engine, db_session, household, member_factory, task_factory):
+    members = await member_factory(count=2)
+    await task_factory(count=2)
+    result = await shuffle_assignments(db_session, household.id)
+    
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db_engine.sync_engine, "before_cursor_execute", listener)
+    try:
+        tasks = [await get_member_task_names(db_session, household.id, m.telegram_id) for m in members]
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", listener)
+    
+    # Rebuilt by the shuffle: no queries needed
+    assert statements == []
+    assert sorted(t for names in tasks for t in names) == sorted(result)
+    
+    # A cold index falls back to one bulk query
+    member_tasks_index.clear()
+    assert await get_member_task_names(db_session, household.id, members[0].telegram_id) == tasks[0]
+    assert await get_member_task_names(db_session, household.id, 999) == []
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+import time
+import numpy as np
+import pytest
+from prometheus_client import REGISTRY
+from metrics import watch_event_loop
+from services import cpu
+from services.solver import solve_week
+
+@pytest.fixture
+def executor(monkeypatch):
+    def use(kind):
+        monkeypatch.setattr("services.cpu.config.CPU_EXECUTOR", kind)
+        cpu.shutdown_executor()
+    yield use
+    cpu.shutdown_executor()
+
+@pytest.mark.asyncio
+async def test_run_cpu_uses_the_configured_pool(executor):
+    executor("thread")
+    assert await cpu.run_cpu(lambda: threading.current_thread().name) != threading.current_thread().name
+    
+    executor("inline")
+    assert await cpu.run_cpu(lambda: threading.current_thread().name) == threading.current_thread().name
+
+@pytest.mark.asyncio
+async def test_solver_runs_in_a_worker_process(executor):
+    executor("process")
+    history = np.array([(0, 0, 1), (1, 1, 1)], dtype=np.int64)
+    slots = await cpu.run_cpu(solve_week, 2, history, [1, 1])
+    # Everyone rotates away from last week's task
+    assert slots == [[1], [0]]
+
+@pytest.mark.asyncio
+async def test_watchdog_reports_stalls():
+    before = REGISTRY.get_sample_value("event_loop_stalls_total") or 0
+    watchdog = asyncio.create_task(watch_event_loop(interval=0.01, threshold=0.05))
+    await asyncio.sleep(0.02)
+    time.sleep(0.1)
+    await asyncio.sleep(0.02)
+    watchdog.cancel()
+    
+    assert REGISTRY.get_sample_value("event_loop_stalls_total") == before + 1
@@ -1,10 +1,13 @@
 import pytest
-from sqlalchemy import select
-from database import Member, Task, Settings
+from sqlalchemy import event, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database import Assignment, Household, Member, Task, Settings, SchemaVersion, init_db
 
 @pytest.mark.asyncio
-async def test_create_and_retrieve_member(db_session):
-    member = Member(telegram_id=123, name="Test User", username="testuser")
+async def test_create_and_retrieve_member(db_session, household):
+    member = Member(household_id=household.id, telegram_id=123, name="Test User", username="testuser")
     db_session.add(member)
     await db_session.commit()
     
@@ -16,8 +19,8 @@ async def test_create_and_retrieve_member(db_session):
     assert retrieved.active is True
 
 @pytest.mark.asyncio
-async def test_update_member(db_session):
-    member = Member(telegram_id=456, name="Old Name")
+async def test_update_member(db_session, household):
+    member = Member(household_id=household.id, telegram_id=456, name="Old Name")
     db_session.add(member)
     await db_session.commit()
     
@@ -29,8 +32,8 @@ async def test_update_member(db_session):
     assert retrieved.name == "New Name"
 
 @pytest.mark.asyncio
-async def test_delete_member(db_session):
-    member = Member(telegram_id=789, name="To Delete")
+async def test_delete_member(db_session, household):
+    member = Member(household_id=household.id, telegram_id=789, name="To Delete")
     db_session.add(member)
     await db_session.commit()
     
@@ -50,3 +53,91 @@ async def test_settings(db_session):
     result = await db_session.execute(select(Settings).where(Settings.key == "test_key"))
     retrieved = result.scalar_one()
     assert retrieved.value == "test_value"
+
+@pytest.mark.asyncio
+async def test_member_can_join_several_households(db_session, household):
+    other = Household(chat_id=-2002, title="Other Flat")
+    db_session.add(other)
+    await db_session.commit()
+    
+    db_session.add(Member(household_id=household.id, telegram_id=321, name="Roomie"))
+    db_session.add(Member(household_id=other.id, telegram_id=321, name="Roomie"))
+    await db_session.commit()
+    
+    result = await db_session.execute(select(Member).where(Member.telegram_id == 321))
+    assert len(result.scalars().all()) == 2
+    
+    # Still unique within a single household
+    db_session.add(Member(household_id=household.id, telegram_id=321, name="Duplicate"))
+    with pytest.raises(IntegrityError):
+        await db_session.commit()
+
+@pytest.mark.asyncio
+async def test_init_db_skips_ddl_when_fingerprint_matches():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    statements = []
+    event.listen(engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    try:
+        assert await init_db(engine)
+        first_boot = len(statements)
+        assert not await init_db(engine)
+        
+        # The restart only read the fingerprint
+        restart = statements[first_boot:]
+        assert len(restart) == 1 and "schema_version" in restart[0]
+        
+        async with engine.begin() as conn:
+            await conn.execute(update(SchemaVersion).values(fingerprint="stale"))
+        assert await init_db(engine)
+    finally:
+        await engine.dispose()
+
+LEGACY_SCHEMA = [
+    "CREATE TABLE members (id INTEGER PRIMARY KEY, telegram_id BIGINT NOT NULL UNIQUE, name VARCHAR(100) NOT NULL,"
+    " username VARCHAR(100), active BOOLEAN, created_at DATETIME)",
+    "CREATE TABLE tasks (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL UNIQUE, required_people INTEGER,"
+    " active BOOLEAN)",
+    "CREATE TABLE assignments (id INTEGER PRIMARY KEY, member_id INTEGER NOT NULL REFERENCES members (id),"
+    " task_id INTEGER NOT NULL REFERENCES tasks (id), week_number INTEGER NOT NULL, year INTEGER NOT NULL,"
+    " created_at DATETIME)",
+    "CREATE TABLE settings (id INTEGER PRIMARY KEY, key VARCHAR(50) NOT NULL UNIQUE, value VARCHAR(200) NOT NULL)",
+    "INSERT INTO members (id, telegram_id, name, active) VALUES (1, 11, 'Old', 1)",
+    "INSERT INTO tasks (id, name, required_people, active) VALUES (1, 'Dishes', 1, 1)",
+    "INSERT INTO assignments (member_id, task_id, week_number, year) VALUES (1, 1, 7, 2025)",
+    "INSERT INTO settings (key, value) VALUES ('notification_hour', '9')",
+]
+
+@pytest.mark.asyncio
+async def test_init_db_upgrades_legacy_database(monkeypatch):
+    from services.assignment import shuffle_assignments
+    
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    try:
+        async with engine.begin() as conn:
+            for statement in LEGACY_SCHEMA:
+                await conn.execute(text(statement))
+        
+        # Without a household to move the rows into, the new fingerprint is not stored
+        monkeypatch.setattr("database.config.GROUP_CHAT_ID", 0)
+        with pytest.raises(RuntimeError):
+            await init_db(engine)
+        
+        monkeypatch.setattr("database.config.GROUP_CHAT_ID", -1001)
+        assert await init_db(engine)
+        assert not await init_db(engine)
+        
+        async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+            household = (await session.execute(select(Household))).scalar_one()
+            assert household.chat_id == -1001 and household.join_token
+            member = (await session.execute(select(Member))).scalar_one()
+            assert member.household_id == household.id
+            assert (await session.execute(select(Task.household_id))).scalar_one() == household.id
+            assignment = (await session.execute(select(Assignment))).scalar_one()
+            assert (assignment.household_id, assignment.yearweek) == (household.id, 202507)
+            # Settings without a household stay the bot-wide defaults
+            assert (await session.execute(select(Settings.household_id))).scalar_one() is None
+            
+            await shuffle_assignments(session, household.id)
+            assert (await session.execute(select(Assignment.id))).all()
+    finally:
+        await engine.dispose()
@@ -0,0 +1,154 @@
+import asyncio
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from config import config
+from database import Household
+from services.dispatcher import (
+    claim_due_households, compute_next_run, dispatch_due, household_jitter, household_next_run, release_household,
+    reschedule_households
+)
+
+def test_compute_next_run():
+    monday_8am = datetime(2025, 2, 10, 8, 0)
+    assert compute_next_run(0, 9, "UTC", monday_8am) == datetime(2025, 2, 10, 9, 0)
+    assert compute_next_run(0, 8, "UTC", monday_8am) == datetime(2025, 2, 17, 8, 0)
+    assert compute_next_run(4, 18, "UTC", monday_8am) == datetime(2025, 2, 14, 18, 0)
+    # Local time is converted back to UTC
+    assert compute_next_run(0, 9, "Asia/Tashkent", monday_8am) == datetime(2025, 2, 17, 4, 0)
+
+def test_compute_next_run_across_dst():
+    # Berlin switches to summer time on 2025-03-30
+    friday = datetime(2025, 3, 28, 12, 0)
+    assert compute_next_run(0, 9, "Europe/Berlin", friday) == datetime(2025, 3, 31, 7, 0)
+
+@pytest.mark.asyncio
+async def test_claim_due_households_leases_the_slot(db_session):
+    now = datetime(2025, 2, 10, 9, 30)
+    due = [Household(chat_id=-i, next_run_at=now - timedelta(minutes=i)) for i in range(1, 4)]
+    later = Household(chat_id=-10, next_run_at=now + timedelta(hours=1))
+    db_session.add_all(due + [later])
+    await db_session.commit()
+    
+    first = await claim_due_households(db_session, batch_size=2, now=now)
+    second = await claim_due_households(db_session, batch_size=2, now=now)
+    third = await claim_due_households(db_session, batch_size=2, now=now)
+    
+    # Most overdue first, each household claimed once
+    assert [h.chat_id for h, _ in first] == [-3, -2]
+    assert [h.chat_id for h, _ in second] == [-1]
+    assert third == []
+    
+    # The slot only moves on once the run succeeded
+    household_id = first[0][0].id
+    assert (await db_session.get(Household, household_id)).next_run_at == now - timedelta(minutes=3)
+    await release_household(db_session, household_id, (0, 9), ok=True, now=now)
+    household = await db_session.get(Household, household_id)
+    assert household.next_run_at == datetime(2025, 2, 17, 9, 0) + household_jitter(household_id)
+    assert household.claimed_until is None
+    
+    # A replica that died mid-run loses its lease (and the later household is due by then)
+    lease_over = now + timedelta(seconds=config.JOB_LEASE_SECONDS)
+    reclaimed = await claim_due_households(db_session, batch_size=5, now=lease_over)
+    assert [h.chat_id for h, _ in reclaimed] == [-2, -1, -10]
+
+@pytest.mark.asyncio
+async def test_failed_runs_are_retried(db_engine, db_session):
+    db_session.add(Household(chat_id=-1, next_run_at=datetime.utcnow() - timedelta(minutes=1)))
+    await db_session.commit()
+    factory = async_sessionmaker(db_engine, expire_on_commit=False)
+    
+    async def broken(household, scheduled_at):
+        raise RuntimeError("boom")
+    
+    async def busy(household, scheduled_at):
+        return False
+    
+    ran = []
+    
+    async def run(household, scheduled_at):
+        ran.append(scheduled_at)
+    
+    for failing in (broken, busy):
+        assert await dispatch_due(factory, (0, 9), failing) == 1
+        # Kept for a retry, but not before DISPATCH_RETRY_SECONDS
+        assert await dispatch_due(factory, (0, 9), run) == 0
+        household = (await db_session.execute(select(Household).execution_options(populate_existing=True))).scalar_one()
+        assert household.claimed_until > datetime.utcnow()
+        household.claimed_until = datetime.utcnow()
+        await db_session.commit()
+    
+    assert await dispatch_due(factory, (0, 9), run) == 1
+    await db_session.refresh(household)
+    assert household.next_run_at > datetime.utcnow() and household.claimed_until is None
+    assert await dispatch_due(factory, (0, 9), run) == 0
+    assert len(ran) == 1
+
+@pytest.mark.asyncio
+async def test_dispatch_due_runs_with_bounded_workers(db_engine, db_session):
+    db_session.add_all([Household(chat_id=-i) for i in range(1, 6)])
+    await db_session.commit()
+    assert await reschedule_households(db_session, (0, 9), only_unscheduled=True) == 5
+    
+    # Make everyone due
+    for household in (await db_session.execute(select(Household))).scalars():
+        household.next_run_at = datetime.utcnow() - timedelta(minutes=1)
+    await db_session.commit()
+    
+    running = 0
+    peak = 0
+    ran = []
+    
+    async def run(household, scheduled_at):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        ran.append(household.chat_id)
+        running -= 1
+    
+    factory = async_sessionmaker(db_engine, expire_on_commit=False)
+    assert await dispatch_due(factory, (0, 9), run, batch_size=2, workers=2) == 5
+    assert sorted(ran) == [-5, -4, -3, -2, -1]
+    assert peak <= 2
+    assert await dispatch_due(factory, (0, 9), run) == 0
+
+def test_household_jitter_spreads_runs_within_the_window():
+    offsets = [household_jitter(household_id, 900) for household_id in range(1, 1001)]
+    assert all(timedelta(0) <= offset < timedelta(seconds=900) for offset in offsets)
+    assert len(set(offsets)) > 500
+    # Deterministic, and off when the window is 0
+    assert household_jitter(42, 900) == household_jitter(42, 900)
+    assert household_jitter(42, 0) == timedelta(0)
+
+def test_jittered_slot_is_kept_until_it_has_run():
+    household = Household(id=7, chat_id=-7)
+    jitter = household_jitter(7)
+    monday_9am = datetime(2025, 2, 10, 9, 0)
+    
+    # Rescheduling after 9:00 but before this household's turn keeps this week
+    assert household_next_run(household, (0, 9), monday_9am + jitter / 2) == monday_9am + jitter
+    # Once it ran, the next run is a week later
+    assert household_next_run(household, (0, 9), monday_9am + jitter) == monday_9am + timedelta(weeks=1) + jitter
+
+@pytest.mark.asyncio
+async def test_dispatch_claims_only_what_it_has_room_for(db_engine, db_session, monkeypatch):
+    db_session.add_all([Household(chat_id=-i, next_run_at=datetime.utcnow() - timedelta(minutes=1)) for i in range(1, 11)])
+    await db_session.commit()
+    
+    factory = async_sessionmaker(db_engine, expire_on_commit=False)
+    claims = []
+    original = claim_due_households
+    
+    async def spy(session, batch_size, now=None):
+        claimed = await original(session, batch_size, now)
+        claims.append(len(claimed))
+        return claimed
+    
+    async def run(household, scheduled_at):
+        await asyncio.sleep(0.01)
+    
+    monkeypatch.setattr("services.dispatcher.claim_due_households", spy)
+    assert await dispatch_due(factory, (0, 9), run, batch_size=100, workers=2, queue_size=1) == 10
+    assert max(claims) <= 3
@@ -0,0 +1,92 @@
+import pytest
+from datetime import datetime, timedelta
+from aiogram.fsm.storage.base import StorageKey
+from sqlalchemy import event, func, select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database import FsmState
+from fsm_storage import DatabaseStorage, purge_expired_states
+from handlers.admin import AddTaskStates
+
+KEY = StorageKey(bot_id=1, chat_id=-1001, user_id=1000)
+
+@pytest.fixture
+def session_factory(db_engine):
+    return async_sessionmaker(db_engine, expire_on_commit=False)
+
+async def count_rows(session_factory):
+    async with session_factory() as session:
+        return (await session.execute(select(func.count()).select_from(FsmState))).scalar()
+
+@pytest.mark.asyncio
+async def test_state_survives_restart(session_factory):
+    storage = DatabaseStorage(session_factory)
+    await storage.set_state(KEY, AddTaskStates.waiting_for_name)
+    await storage.update_data(KEY, {"household_id": 7})
+    await storage.update_data(KEY, {"name": "Kitchen"})
+    
+    # A fresh storage (another replica, or after a restart) sees the same conversation
+    other = DatabaseStorage(session_factory)
+    assert await other.get_state(KEY) == AddTaskStates.waiting_for_name.state
+    assert await other.get_data(KEY) == {"household_id": 7, "name": "Kitchen"}
+    assert await other.get_state(StorageKey(bot_id=1, chat_id=-1001, user_id=1001)) is None
+    
+    # Clearing removes the row entirely
+    await storage.set_state(KEY, None)
+    await storage.set_data(KEY, {})
+    assert await count_rows(session_factory) == 0
+    assert await storage.get_state(KEY) is None
+    assert await storage.get_data(KEY) == {}
+
+@pytest.mark.asyncio
+async def test_reads_are_cached(db_engine, session_factory):
+    storage = DatabaseStorage(session_factory)
+    await storage.set_state(KEY, "some:state")
+    
+    statements = []
+    event.listen(db_engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    for _ in range(3):
+        assert await storage.get_state(KEY) == "some:state"
+        assert await storage.get_data(KEY) == {}
+    assert len(statements) == 1
+    
+    # Mutating returned data doesn't leak into the cache
+    (await storage.get_data(KEY))["oops"] = True
+    assert await storage.get_data(KEY) == {}
+
+@pytest.mark.asyncio
+async def test_expired_states(session_factory):
+    storage = DatabaseStorage(session_factory, cache_ttl=0)
+    for user_id in range(5):
+        key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+        await storage.set_state(key, "old:state")
+        await storage.set_data(key, {"stale": True})
+    await storage.set_state(KEY, "fresh:state")
+    
+    async with session_factory() as session:
+        await session.execute(
+            update(FsmState).where(FsmState.chat_id >= 0).values(expires_at=datetime.utcnow() - timedelta(seconds=1))
+        )
+        await session.commit()
+    
+    expired = StorageKey(bot_id=1, chat_id=0, user_id=0)
+    assert await storage.get_state(expired) is None
+    # Starting over on an expired row doesn't bring back its old data
+    await storage.set_state(expired, "new:state")
+    assert await storage.get_data(expired) == {}
+    
+    assert await purge_expired_states(session_factory, batch_size=2) == 4
+    assert await count_rows(session_factory) == 2
+
+@pytest.mark.asyncio
+async def test_expired_cache_entries_are_reread(session_factory, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("services.cache.time.monotonic", lambda: now[0])
+    storage = DatabaseStorage(session_factory, cache_ttl=10)
+    await storage.set_state(KEY, "some:state")
+    assert await storage.get_state(KEY) == "some:state"
+    
+    now[0] += 11
+    await storage.set_data(KEY, {"step": 1})
+    assert await storage.get_state(KEY) == "some:state"
+    now[0] += 11
+    assert await storage.get_data(KEY) == {"step": 1}
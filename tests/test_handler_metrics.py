@@ -0,0 +1,62 @@
+import asyncio
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.methods.base import Response
+from aiogram.types import Message, Update
+from prometheus_client import REGISTRY
+from middlewares import BotApiMetricsMiddleware, HandlerMetricsMiddleware, UpdateMetricsMiddleware
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+def make_update(update_id: int, text: str) -> Update:
+    return Update.model_validate({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    })
+
+async def fake_telegram(make_request, bot, method):
+    await asyncio.sleep(0.05)
+    return Response[bool](ok=True, result=True)
+
+@pytest.mark.asyncio
+async def test_handler_time_split_and_errors():
+    bot = Bot(token="42:TEST")
+    bot.session.middleware(BotApiMetricsMiddleware())
+    bot.session.middleware(fake_telegram)
+    
+    router = Router()
+    
+    @router.message(lambda message: message.text == "typing")
+    async def metrics_typing(message: Message):
+        await message.bot.send_chat_action(message.chat.id, "typing")
+    
+    @router.message(lambda message: message.text == "boom")
+    async def metrics_boom(message: Message):
+        raise ValueError("boom")
+    
+    dp = Dispatcher()
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.include_router(router)
+    
+    updates_before = sample("bot_updates_total", type="message")
+    await dp.feed_update(bot, make_update(1, "typing"))
+    with pytest.raises(ValueError):
+        await dp.feed_update(bot, make_update(2, "boom"))
+    
+    assert sample("bot_updates_total", type="message") == updates_before + 2
+    assert sample("bot_handler_duration_seconds_count", handler="metrics_typing") == 1
+    assert sample("bot_api_request_duration_seconds_count", method="sendChatAction") >= 1
+    bot_api = sample("bot_handler_time_spent_seconds_sum", handler="metrics_typing", part="bot_api")
+    own = sample("bot_handler_time_spent_seconds_sum", handler="metrics_typing", part="own")
+    assert bot_api >= 0.05
+    assert own < bot_api
+    assert sample("bot_handler_errors_total", handler="metrics_boom", error="ValueError") == 1
+    await bot.session.close()
@@ -0,0 +1,49 @@
+import pytest
+from database import Household, Member
+from services.household import (
+    get_or_create_household, resolve_household, is_household_admin, get_join_household, get_join_payload,
+    is_join_payload
+)
+
+@pytest.mark.asyncio
+async def test_get_or_create_household(db_session):
+    first = await get_or_create_household(db_session, -500, title="Flat", admin_id=42)
+    second = await get_or_create_household(db_session, -500, title="Renamed", admin_id=99)
+    
+    assert first.id == second.id
+    assert second.admin_id == 42
+
+@pytest.mark.asyncio
+async def test_resolve_household(db_session, household):
+    other = Household(chat_id=-2002, title="Other Flat")
+    db_session.add(other)
+    await db_session.commit()
+    db_session.add(Member(household_id=other.id, telegram_id=77, name="Roomie"))
+    await db_session.commit()
+    
+    # Group chats resolve by chat id, private chats by membership
+    assert (await resolve_household(db_session, household.chat_id, 77)).id == household.id
+    assert (await resolve_household(db_session, 77, 77)).id == other.id
+    # Household admins resolve without being members
+    assert (await resolve_household(db_session, 1000, 1000)).id == household.id
+    assert await resolve_household(db_session, 5, 5) is None
+
+@pytest.mark.asyncio
+async def test_join_payload_roundtrip(db_session, household, monkeypatch):
+    payload = get_join_payload(household)
+    assert is_join_payload(payload)
+    assert str(household.chat_id) not in payload
+    assert (await get_join_household(db_session, payload)).id == household.id
+    assert await get_join_household(db_session, "join_oops") is None
+    # Links that carried the chat id can be guessed and no longer work
+    assert is_join_payload(f"register_{household.chat_id}")
+    assert await get_join_household(db_session, f"register_{household.chat_id}") is None
+    assert not is_join_payload(None)
+    
+    monkeypatch.setattr("services.household.config.GROUP_CHAT_ID", household.chat_id)
+    assert (await get_join_household(db_session, "register")).id == household.id
+
+def test_is_household_admin(household):
+    assert is_household_admin(household, 1000)
+    assert not is_household_admin(household, 1001)
+    assert not is_household_admin(None, 1000)
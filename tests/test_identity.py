@@ -0,0 +1,92 @@
+import pytest
+from aiogram.types import Chat, User
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database import Member
+from middlewares import IdentityMiddleware
+from services.cache import identity_cache, invalidate_identity
+from services.identity import get_identity, load_identity
+
+@pytest.mark.asyncio
+async def test_load_identity(db_session, household):
+    roomie = Member(household_id=household.id, telegram_id=2000, name="Roomie")
+    db_session.add(roomie)
+    await db_session.commit()
+    
+    member = await load_identity(db_session, household.chat_id, roomie.telegram_id)
+    assert member.household_id == household.id
+    assert member.household_chat_id == household.chat_id
+    assert member.member_id == roomie.id
+    assert not member.is_admin
+    
+    # The admin isn't a member but manages the household, also from a private chat
+    admin = await load_identity(db_session, household.admin_id, household.admin_id)
+    assert admin.household_id == household.id
+    assert not admin.is_member
+    assert admin.manages_household
+    
+    stranger = await load_identity(db_session, 5, 5)
+    assert stranger.household_id is None
+    assert not stranger.manages_household
+
+@pytest.mark.asyncio
+async def test_get_identity_cached_until_invalidated(db_session, household):
+    first = await get_identity(db_session, household.chat_id, 77)
+    assert not first.is_member
+    
+    db_session.add(Member(household_id=household.id, telegram_id=77, name="Roomie"))
+    await db_session.commit()
+    assert await get_identity(db_session, household.chat_id, 77) is first
+    
+    invalidate_identity(77)
+    assert (await get_identity(db_session, household.chat_id, 77)).is_member
+
+@pytest.mark.asyncio
+async def test_middleware_injects_identity(db_engine, household):
+    opened = 0
+    factory = async_sessionmaker(db_engine, expire_on_commit=False)
+    
+    def session_factory():
+        nonlocal opened
+        opened += 1
+        return factory()
+    
+    middleware = IdentityMiddleware(session_factory)
+    seen = []
+    
+    async def handler(event, data):
+        seen.append(data["identity"])
+    
+    data = {
+        "event_from_user": User(id=household.admin_id, is_bot=False, first_name="Admin"),
+        "event_chat": Chat(id=household.chat_id, type="group"),
+    }
+    for _ in range(3):
+        await middleware(handler, object(), dict(data))
+    
+    assert opened == 1
+    assert all(identity.manages_household for identity in seen)
+    assert identity_cache.hits >= 2
+    
+    await middleware(handler, object(), {})
+    assert seen[-1] is None
+@pytest.mark.asyncio
+async def test_middleware_reloads_expired_identity(db_engine, household, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("services.cache.time.monotonic", lambda: now[0])
+    monkeypatch.setattr(identity_cache, "ttl", 10)
+    middleware = IdentityMiddleware(async_sessionmaker(db_engine, expire_on_commit=False))
+    seen = []
+    
+    async def handler(event, data):
+        seen.append(data["identity"])
+    
+    data = {
+        "event_from_user": User(id=household.admin_id, is_bot=False, first_name="Admin"),
+        "event_chat": Chat(id=household.chat_id, type="group"),
+    }
+    await middleware(handler, object(), dict(data))
+    now[0] += 11
+    await middleware(handler, object(), dict(data))
+    
+    assert all(identity is not None and identity.manages_household for identity in seen)
+    assert seen[0] is not seen[1]
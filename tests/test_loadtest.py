@@ -0,0 +1,42 @@
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database import Assignment
+from loadtest.fake_api import FakeBotAPI
+from loadtest.generator import SimUser, make_tap, menu_buttons, seed
+
+def test_menu_buttons():
+    assert set(menu_buttons(is_admin=False)) == {"my_schedule", "full_schedule"}
+    admin = menu_buttons(is_admin=True)
+    assert "admin_panel" in admin and "manage_members" in admin
+    assert "add_task" not in admin and "test_notification" not in admin
+    assert "shuffle_now" not in admin
+    assert "shuffle_now" in menu_buttons(is_admin=True, writes=True)
+
+@pytest.mark.asyncio
+async def test_seed(db_engine):
+    users = await seed(async_sessionmaker(db_engine, expire_on_commit=False), households=2, members=3, tasks=2)
+    assert len(users) == 6
+    assert sum(u.is_admin for u in users) == 2
+    
+    async with async_sessionmaker(db_engine)() as session:
+        assert (await session.execute(select(func.count()).select_from(Assignment))).scalar() > 0
+
+@pytest.mark.asyncio
+async def test_fake_api_resolves_taps_on_reply():
+    api = FakeBotAPI()
+    async with TestClient(TestServer(api.create_app())) as client:
+        future = api.push(make_tap(SimUser(5, -1, is_admin=False), "my_schedule"), 5)
+        
+        response = await client.post("/bot42:TEST/getUpdates", data={"offset": 0, "timeout": 1})
+        updates = (await response.json())["result"]
+        assert [u["callback_query"]["data"] for u in updates] == ["my_schedule"]
+        assert not future.done()
+        
+        await client.post("/bot42:TEST/editMessageText", data={"chat_id": 5, "message_id": 1, "text": "hi"})
+        end_to_end, processing = future.result()
+        assert end_to_end >= processing >= 0
+        
+        response = await client.post("/bot42:TEST/getUpdates", data={"offset": updates[0]["update_id"] + 1})
+        assert (await response.json())["result"] == []
@@ -0,0 +1,40 @@
+import pytest
+from datetime import datetime, timedelta
+from sqlalchemy import update
+from database import JobRun
+from services.locks import claim_run, finish_run, leader_lock, lock_key
+
+@pytest.mark.asyncio
+async def test_run_is_claimed_once(db_session):
+    assert await claim_run(db_session, "weekly_shuffle:1", "2025-W07")
+    assert not await claim_run(db_session, "weekly_shuffle:1", "2025-W07")
+    
+    # Other periods and jobs are independent
+    assert await claim_run(db_session, "weekly_shuffle:1", "2025-W08")
+    assert await claim_run(db_session, "weekly_shuffle:2", "2025-W07")
+    
+    await finish_run(db_session, "weekly_shuffle:1", "2025-W07")
+    assert not await claim_run(db_session, "weekly_shuffle:1", "2025-W07")
+
+@pytest.mark.asyncio
+async def test_failed_and_stale_runs_can_be_taken_over(db_session):
+    await claim_run(db_session, "job", "a")
+    await finish_run(db_session, "job", "a", ok=False)
+    assert await claim_run(db_session, "job", "a")
+    
+    await claim_run(db_session, "job", "b")
+    await db_session.execute(
+        update(JobRun).where(JobRun.period == "b").values(started_at=datetime.utcnow() - timedelta(days=1))
+    )
+    await db_session.commit()
+    assert await claim_run(db_session, "job", "b")
+
+@pytest.mark.asyncio
+async def test_leader_lock_is_a_noop_on_sqlite(db_engine):
+    async with leader_lock("weekly_shuffle", db_engine) as leader:
+        assert leader
+
+def test_lock_key_is_stable():
+    assert lock_key("weekly_shuffle") == lock_key("weekly_shuffle")
+    assert lock_key("weekly_shuffle") != lock_key("other")
+    assert -2**63 <= lock_key("weekly_shuffle") < 2**63
@@ -0,0 +1,57 @@
+import pytest
+from prometheus_client import REGISTRY
+from metrics import db_operation, instrument_engine, metrics_handler, pool_options
+from services.cache import schedule_cache
+from services.read_models import get_week_rows
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+@pytest.mark.asyncio
+async def test_queries_labelled_by_service_function(db_engine, db_session, household):
+    instrument_engine(db_engine.sync_engine)
+    before = sample("db_query_duration_seconds_count", operation="get_week_rows", statement="SELECT")
+    
+    await get_week_rows(db_session, household.id, 202507)
+    
+    after = sample("db_query_duration_seconds_count", operation="get_week_rows", statement="SELECT")
+    assert after == before + 1
+
+@pytest.mark.asyncio
+async def test_db_operation_restores_label():
+    from metrics import current_operation
+    
+    @db_operation
+    async def outer():
+        assert current_operation.get() == "outer"
+        await inner()
+        return current_operation.get()
+    
+    @db_operation
+    async def inner():
+        assert current_operation.get() == "inner"
+    
+    assert await outer() == "outer"
+    assert current_operation.get() == "other"
+
+def test_pool_options():
+    assert pool_options("sqlite+aiosqlite:///:memory:") == {}
+    options = pool_options("postgresql+asyncpg://localhost/db")
+    assert options["pool_size"] > 0 and options["max_overflow"] >= 0
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint():
+    response = await metrics_handler(None)
+    assert response.content_type == "text/plain"
+    assert b"db_query_duration_seconds" in response.body
+
+def test_cache_stats_are_exported():
+    hits = sample("cache_hits_total", cache="schedule")
+    misses = sample("cache_misses_total", cache="schedule")
+    schedule_cache.set((1, 7, 2025), "table")
+    schedule_cache.get((1, 7, 2025))
+    schedule_cache.get((2, 7, 2025))
+    assert sample("cache_hits_total", cache="schedule") == hits + 1
+    assert sample("cache_misses_total", cache="schedule") == misses + 1
+    assert sample("cache_entries", cache="schedule") == 1
+    assert sample("cache_entries", cache="member_tasks") == 0
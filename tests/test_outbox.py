@@ -0,0 +1,169 @@
+import asyncio
+import pytest
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from aiogram.exceptions import TelegramForbiddenError
+from aiogram.methods import SendMessage
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database import Assignment, OutboxMessage
+from services.broadcast import Broadcaster
+from services.outbox import drain_outbox, enqueue_messages, purge_sent_messages, run_outbox_worker
+
+class FakeBot:
+    """Records sends; raises the queued error for a chat every time."""
+    
+    def __init__(self, errors=None):
+        self.sent = []
+        self.errors = errors or {}
+    
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.errors:
+            raise self.errors[chat_id]
+        self.sent.append((chat_id, text))
+
+async def outbox_rows(session):
+    result = await session.execute(
+        select(OutboxMessage.chat_id, OutboxMessage.status, OutboxMessage.attempts, OutboxMessage.next_attempt_at)
+        .order_by(OutboxMessage.chat_id)
+    )
+    return result.all()
+
+@pytest.mark.asyncio
+async def test_enqueue_is_idempotent(db_session):
+    await enqueue_messages(db_session, [(1, "hi"), (2, "hi")], "weekly:1:2025-W07")
+    await enqueue_messages(db_session, [(1, "hi again"), (3, "hi")], "weekly:1:2025-W07")
+    await db_session.commit()
+    
+    assert [chat_id for chat_id, *_ in await outbox_rows(db_session)] == [1, 2, 3]
+
+@pytest.mark.asyncio
+async def test_drain_sends_and_marks_messages(db_engine, db_session):
+    await enqueue_messages(db_session, [(i, f"msg{i}") for i in range(5)], "test")
+    await db_session.commit()
+    
+    bot = FakeBot()
+    factory = async_sessionmaker(db_engine, expire_on_commit=False)
+    assert await drain_outbox(bot, factory, Broadcaster(rate=1000), batch_size=2) == 5
+    assert sorted(bot.sent) == [(i, f"msg{i}") for i in range(5)]
+    assert {status for _, status, _, _ in await outbox_rows(db_session)} == {"sent"}
+    # Nothing is sent twice
+    assert await drain_outbox(bot, factory, Broadcaster(rate=1000)) == 0
+    assert await purge_sent_messages(db_session, timedelta(0)) == 5
+
+@pytest.mark.asyncio
+async def test_drain_logs_throughput_and_failures(db_engine, db_session, caplog):
+    blocked = TelegramForbiddenError(SendMessage(chat_id=2, text="x"), "bot was blocked by the user")
+    bot = FakeBot({1: RuntimeError("temporary"), 2: blocked})
+    await enqueue_messages(db_session, [(i, "hi") for i in range(4)], "test")
+    await db_session.commit()
+    
+    factory = async_sessionmaker(db_engine, expire_on_commit=False)
+    with caplog.at_level("INFO", logger="services.outbox"):
+        assert await drain_outbox(bot, factory, Broadcaster(rate=1000)) == 4
+    report = [record.message for record in caplog.records if record.message.startswith("Outbox drained")]
+    assert len(report) == 1
+    assert "2/4 sent" in report[0] and "msg/s" in report[0]
+    assert "1 to retry later, 1 dead-lettered" in report[0]
+
+@pytest.mark.asyncio
+async def test_only_the_drain_lock_holder_sends(monkeypatch):
+    leader = False
+    drains = []
+    
+    @asynccontextmanager
+    async def fake_lock(name):
+        yield leader
+    
+    async def fake_drain(bot, session_factory):
+        drains.append(bot)
+    
+    monkeypatch.setattr("services.outbox.leader_lock", fake_lock)
+    monkeypatch.setattr("services.outbox.drain_outbox", fake_drain)
+    monkeypatch.setattr("services.outbox.config.OUTBOX_POLL_INTERVAL", 0.01)
+    worker = asyncio.create_task(run_outbox_worker("bot"))
+    await asyncio.sleep(0.05)
+    assert drains == []
+    
+    leader = True
+    await asyncio.sleep(0.05)
+    worker.cancel()
+    assert drains
+
+@pytest.mark.asyncio
+async def test_failures_are_retried_then_dead_lettered(db_engine, db_session, monkeypatch):
+    monkeypatch.setattr("services.outbox.config.OUTBOX_MAX_ATTEMPTS", 2)
+    blocked = TelegramForbiddenError(SendMessage(chat_id=2, text="x"), "bot was blocked by the user")
+    bot = FakeBot({1: RuntimeError("temporary"), 2: blocked})
+    await enqueue_messages(db_session, [(1, "hi"), (2, "hi")], "test")
+    await db_session.commit()
+    
+    factory = async_sessionmaker(db_engine, expire_on_commit=False)
+    sender = Broadcaster(rate=1000)
+    before = datetime.utcnow()
+    await drain_outbox(bot, factory, sender)
+    (_, status1, attempts1, retry_at), (_, status2, attempts2, _) = await outbox_rows(db_session)
+    # A transient error backs off; a blocked bot is dead-lettered at once
+    assert (status1, attempts1) == ("pending", 1)
+    assert retry_at >= before + timedelta(seconds=4)
+    assert (status2, attempts2) == ("dead", 1)
+    
+    # Retrying is bounded by OUTBOX_MAX_ATTEMPTS
+    await db_session.execute(OutboxMessage.__table__.update().values(next_attempt_at=before))
+    await db_session.commit()
+    await drain_outbox(bot, factory, sender)
+    assert [(status, attempts) for _, status, attempts, _ in await outbox_rows(db_session)] == [
+        ("dead", 2), ("dead", 1)
+    ]
+    # Dead letters are kept for inspection
+    assert await purge_sent_messages(db_session, timedelta(0)) == 0
+
+@pytest.mark.asyncio
+async def test_weekly_run_commits_schedule_and_messages_together(
+    db_engine, db_session, household, member_factory, task_factory, monkeypatch
+):
+    import scheduler
+    
+    await member_factory(2)
+    await task_factory(2)
+    factory = async_sessionmaker(db_engine, expire_on_commit=False)
+    monkeypatch.setattr("scheduler.async_session", factory)
+    
+    # A failure after the shuffle leaves neither assignments nor messages behind
+    async def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+    monkeypatch.setattr("scheduler.enqueue_messages", broken)
+    with pytest.raises(RuntimeError):
+        await scheduler.weekly_shuffle_and_notify(household)
+    assert (await db_session.execute(select(Assignment.id))).all() == []
+    assert await outbox_rows(db_session) == []
+    
+    monkeypatch.undo()
+    monkeypatch.setattr("scheduler.async_session", factory)
+    await scheduler.weekly_shuffle_and_notify(household)
+    assert len((await db_session.execute(select(Assignment.id))).all()) == 2
+    # The group reminder and a DM per member
+    assert [chat_id for chat_id, *_ in await outbox_rows(db_session)] == [-1001, 1000, 1001]
+@pytest.mark.asyncio
+async def test_weekly_run_targets_the_week_in_the_household_timezone(
+    db_engine, db_session, household, member_factory, task_factory, monkeypatch
+):
+    import scheduler
+    
+    await member_factory(2)
+    await task_factory(2)
+    household.timezone = "Asia/Tashkent"
+    await db_session.commit()
+    monkeypatch.setattr("scheduler.async_session", async_sessionmaker(db_engine, expire_on_commit=False))
+    
+    # Monday 02:00 in Tashkent is still Sunday in UTC
+    assert await scheduler.weekly_shuffle_and_notify(household, datetime(2025, 2, 9, 21, 0))
+    weeks = (await db_session.execute(select(Assignment.year, Assignment.week_number).distinct())).all()
+    assert weeks == [(2025, 7)]
+    keys = (await db_session.execute(select(OutboxMessage.idempotency_key))).scalars().all()
+    assert all(key.startswith(f"weekly:{household.id}:2025-W07:") for key in keys)
+    # The group reminder is headed by that week too
+    group_text = (await db_session.execute(
+        select(OutboxMessage.text).where(OutboxMessage.chat_id == household.chat_id)
+    )).scalar_one()
+    assert "Week 7/2025" in group_text
@@ -0,0 +1,19 @@
+import pytest
+from sqlalchemy import text
+from services.read_models import week_rows_query
+
+async def explain(session, query) -> str:
+    """Return SQLite's query plan for a statement as one string."""
+    sql = query.compile(session.bind, compile_kwargs={"literal_binds": True})
+    result = await session.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+    return "\n".join(row[-1] for row in result.all())
+
+@pytest.mark.asyncio
+async def test_week_rows_use_yearweek_index(db_session):
+    plan = await explain(db_session, week_rows_query(1, 202507))
+    
+    assert "ix_assignments_household_yearweek" in plan
+    assert "SCAN assignments" not in plan
+    # Members and tasks are looked up by primary key
+    assert "SCAN members" not in plan
+    assert "SCAN tasks" not in plan
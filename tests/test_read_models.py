@@ -0,0 +1,41 @@
+import pytest
+from sqlalchemy import event
+from services.assignment import get_current_yearweek, get_formatted_schedule, shuffle_assignments
+from services.read_models import AssignmentRow, MemberRow, TaskRow, get_member_rows, get_task_rows, get_week_rows
+
+@pytest.mark.asyncio
+async def test_schedule_is_rendered_from_one_projection(db_engine, db_session, household, member_factory, task_factory):
+    members = await member_factory(3)
+    await task_factory(3)
+    await shuffle_assignments(db_session, household.id)
+    db_session.expunge_all()
+    
+    statements = []
+    def on_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db_engine.sync_engine, "before_cursor_execute", on_execute)
+    try:
+        schedule = await get_formatted_schedule(db_session, household.id)
+    finally:
+        event.remove(db_engine.sync_engine, "before_cursor_execute", on_execute)
+    
+    assert len(statements) == 1
+    # Nothing was loaded into the identity map
+    assert len(db_session.identity_map) == 0
+    for member in members:
+        assert member.name in schedule
+
+@pytest.mark.asyncio
+async def test_rows_are_plain_named_tuples(db_session, household, member_factory, task_factory):
+    members = await member_factory(2)
+    tasks = await task_factory(2)
+    await shuffle_assignments(db_session, household.id)
+    
+    rows = await get_week_rows(db_session, household.id, get_current_yearweek())
+    assert all(type(row) is AssignmentRow for row in rows)
+    assert [row.task_name for row in rows] == ["Task0", "Task1"]
+    assert {row.telegram_id for row in rows} == {1000, 1001}
+    
+    assert await get_member_rows(db_session, household.id) == [MemberRow(m.id, m.name) for m in members]
+    assert await get_task_rows(db_session, household.id) == [TaskRow(t.id, t.name) for t in tasks]
+    assert await get_member_rows(db_session, household.id + 1) == []
@@ -0,0 +1,73 @@
+import pytest
+from datetime import date, timedelta
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database import Assignment, AssignmentSummary, pack_yearweek
+from services.assignment import get_assignment_history, get_current_week, yearweek_weeks_ago
+from services.retention import retention_horizon, roll_up_assignments
+
+def weeks_ago(weeks):
+    week, year = get_current_week()
+    y, w, _ = (date.fromisocalendar(year, week, 1) - timedelta(weeks=weeks)).isocalendar()
+    return w, y
+
+async def add_weeks(session, household_id, member, task, ages):
+    rows = []
+    for age in ages:
+        week, year = weeks_ago(age)
+        rows.append({
+            "household_id": household_id, "member_id": member.id, "task_id": task.id,
+            "week_number": week, "year": year, "yearweek": pack_yearweek(year, week),
+        })
+    await session.execute(insert(Assignment), rows)
+    await session.commit()
+
+@pytest.mark.asyncio
+async def test_old_weeks_are_rolled_up_in_batches(db_engine, db_session, household, member_factory, task_factory):
+    member, = await member_factory(count=1)
+    task, = await task_factory(count=1)
+    await add_weeks(db_session, household.id, member, task, range(1, 61))
+    
+    moved = await roll_up_assignments(
+        async_sessionmaker(db_engine, expire_on_commit=False), yearweek_weeks_ago(20), batch_size=7
+    )
+    
+    assert moved == 40
+    remaining = await db_session.scalar(select(func.count()).select_from(Assignment))
+    assert remaining == 20
+    summaries = (await db_session.execute(select(AssignmentSummary))).scalars().all()
+    assert sum(s.times_assigned for s in summaries) == 40
+    assert {s.year for s in summaries} == {weeks_ago(age)[1] for age in range(21, 61)}
+    assert max(s.last_yearweek for s in summaries) == pack_yearweek(*reversed(weeks_ago(21)))
+    
+    # A second pass finds nothing left to move and counts nothing twice
+    assert await roll_up_assignments(async_sessionmaker(db_engine), yearweek_weeks_ago(20)) == 0
+    db_session.expire_all()
+    summaries = (await db_session.execute(select(AssignmentSummary))).scalars().all()
+    assert sum(s.times_assigned for s in summaries) == 40
+
+@pytest.mark.asyncio
+async def test_roll_up_adds_to_existing_summaries(db_engine, db_session, household, member_factory, task_factory):
+    member, = await member_factory(count=1)
+    task, = await task_factory(count=1)
+    session_factory = async_sessionmaker(db_engine, expire_on_commit=False)
+    
+    await add_weeks(db_session, household.id, member, task, [30])
+    await roll_up_assignments(session_factory, yearweek_weeks_ago(20))
+    await add_weeks(db_session, household.id, member, task, [31, 32])
+    await roll_up_assignments(session_factory, yearweek_weeks_ago(20))
+    
+    total = await db_session.scalar(select(func.sum(AssignmentSummary.times_assigned)))
+    assert total == 3
+
+@pytest.mark.asyncio
+async def test_retention_never_cuts_into_solver_history(db_session, household, member_factory, task_factory, monkeypatch):
+    from config import config
+    monkeypatch.setattr(config, "ASSIGNMENT_HISTORY_WEEKS", 26)
+    assert retention_horizon(4) == yearweek_weeks_ago(26)
+    
+    member, = await member_factory(count=1)
+    task, = await task_factory(count=1)
+    await add_weeks(db_session, household.id, member, task, [1, 26, 27])
+    history = await get_assignment_history(db_session, household.id, 26)
+    assert sorted(age for _, _, age in history) == [1, 26]
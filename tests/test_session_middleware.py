@@ -0,0 +1,51 @@
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database import Household, Task
+from middlewares import DbSessionMiddleware
+
+@pytest.fixture
+def checkouts(db_engine):
+    counter = []
+    event.listen(db_engine.sync_engine, "checkout", lambda *args: counter.append(1))
+    return counter
+
+@pytest.mark.asyncio
+async def test_session_is_lazy_and_shared(db_engine, checkouts):
+    middleware = DbSessionMiddleware(async_sessionmaker(db_engine, expire_on_commit=False))
+    
+    async def untouched(event, data):
+        return "ok"
+    
+    assert await middleware(untouched, object(), {}) == "ok"
+    assert checkouts == []
+    
+    async def nested(event, data):
+        # A handler calling another handler reuses the same session
+        await data["session"].execute(select(Household))
+        return await inner(data["session"])
+    
+    async def inner(session):
+        await session.execute(select(Task))
+    
+    await middleware(nested, object(), {})
+    assert len(checkouts) == 1
+
+@pytest.mark.asyncio
+async def test_commit_and_rollback(db_engine, db_session):
+    middleware = DbSessionMiddleware(async_sessionmaker(db_engine, expire_on_commit=False))
+    
+    async def create(event, data):
+        data["session"].add(Household(chat_id=-1))
+    
+    async def fail(event, data):
+        data["session"].add(Household(chat_id=-2))
+        await data["session"].flush()
+        raise RuntimeError("boom")
+    
+    await middleware(create, object(), {})
+    with pytest.raises(RuntimeError):
+        await middleware(fail, object(), {})
+    
+    result = await db_session.execute(select(Household.chat_id))
+    assert result.scalars().all() == [-1]
@@ -0,0 +1,61 @@
+import pytest
+from sqlalchemy import event, func, select
+from config import config
+from database import Settings
+from services.settings import SettingsStore
+
+@pytest.mark.asyncio
+async def test_defaults_and_single_load(db_engine, db_session, household):
+    db_session.add_all([
+        Settings(key="notification_day", value="4"),
+        Settings(household_id=household.id, key="notification_hour", value="18"),
+    ])
+    await db_session.commit()
+    
+    statements = []
+    event.listen(db_engine.sync_engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    
+    store = SettingsStore()
+    assert await store.get(db_session, "notification_day") == 4
+    assert await store.get(db_session, "notification_hour") == config.NOTIFICATION_HOUR
+    # Household values fall back to the bot-wide ones
+    assert await store.get(db_session, "notification_day", household.id) == 4
+    assert await store.get(db_session, "notification_hour", household.id) == 18
+    assert len(statements) == 1
+
+@pytest.mark.asyncio
+async def test_set_writes_through_and_notifies(db_session):
+    store = SettingsStore()
+    changes = []
+    
+    @store.on_change
+    async def record(household_id, key, value):
+        changes.append((household_id, key, value))
+    
+    await store.set(db_session, "notification_day", 3)
+    await store.set(db_session, "notification_day", 5)
+    await store.set(db_session, "notification_day", 5)
+    
+    assert await store.get(db_session, "notification_day") == 5
+    assert changes == [(None, "notification_day", 3), (None, "notification_day", 5)]
+    # Bot-wide rows are updated in place, not duplicated
+    count = await db_session.execute(select(func.count()).select_from(Settings))
+    assert count.scalar() == 1
+
+@pytest.mark.asyncio
+async def test_refresh_picks_up_other_replicas(db_session):
+    ours, theirs = SettingsStore(), SettingsStore()
+    changes = []
+    
+    @ours.on_change
+    async def record(household_id, key, value):
+        changes.append((key, value))
+    
+    assert await ours.get(db_session, "notification_hour") == config.NOTIFICATION_HOUR
+    await theirs.set(db_session, "notification_hour", 7)
+    assert await ours.get(db_session, "notification_hour") == config.NOTIFICATION_HOUR
+    
+    assert await ours.refresh(db_session) == [(None, "notification_hour")]
+    assert await ours.get(db_session, "notification_hour") == 7
+    assert changes == [("notification_hour", 7)]
+    assert await ours.refresh(db_session) == []
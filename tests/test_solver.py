@@ -0,0 +1,38 @@
+import numpy as np
+from services.solver import build_cost_matrix, solve_assignment
+
+def test_cost_matrix_decays_with_age():
+    cost = build_cost_matrix(
+        2, 2,
+        np.array([0, 1]), np.array([0, 0]), np.array([1, 5])
+    )
+    assert cost[0, 0] == 1.0
+    assert 0 < cost[1, 0] < cost[0, 0]
+    assert cost[0, 1] == cost[1, 1] == 0.0
+
+def test_solver_avoids_repeating_tasks():
+    # Member 0 did task 0 and member 1 did task 1 last week: they should swap
+    cost = build_cost_matrix(2, 2, np.array([0, 1]), np.array([0, 1]), np.array([1, 1]))
+    result = solve_assignment(cost, [1, 1], rng=np.random.default_rng(0))
+    assert result == [[1], [0]]
+
+def test_solver_fills_multi_slot_tasks_with_distinct_members():
+    cost = build_cost_matrix(5, 2, np.array([]), np.array([]), np.array([]))
+    result = solve_assignment(cost, [3, 2], rng=np.random.default_rng(0))
+    assert [len(slots) for slots in result] == [3, 2]
+    assert len({m for slots in result for m in slots}) == 5
+
+def test_solver_balances_load_when_short_of_members():
+    cost = build_cost_matrix(2, 3, np.array([]), np.array([]), np.array([]))
+    result = solve_assignment(cost, [1, 1, 1], rng=np.random.default_rng(0))
+    counts = np.bincount([m for slots in result for m in slots], minlength=2)
+    assert sorted(counts) == [1, 2]
+
+def test_solver_prefers_least_loaded_members():
+    # Members 0 and 1 worked recently, member 2 did not
+    cost = build_cost_matrix(3, 1, np.array([0, 1]), np.array([0, 0]), np.array([1, 2]))
+    result = solve_assignment(cost, [1], rng=np.random.default_rng(0))
+    assert result == [[2]]
+
+def test_solver_handles_empty_input():
+    assert solve_assignment(np.zeros((0, 2)), [1, 1]) == [[], []]
@@ -0,0 +1,94 @@
+import pytest
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from database import Assignment, AssignmentSummary, MemberTaskStats, pack_yearweek
+from services.assignment import (
+    get_current_yearweek, precompute_assignments, replace_assignments, shuffle_assignments
+)
+from services.stats import backfill_stats, format_stats, get_household_stats
+
+async def stats_by_pair(session):
+    rows = await session.execute(
+        select(MemberTaskStats.member_id, MemberTaskStats.task_id, MemberTaskStats.times_assigned, MemberTaskStats.last_yearweek)
+    )
+    return {(member_id, task_id): (count, last) for member_id, task_id, count, last in rows.all()}
+
+async def counts_from_assignments(session):
+    rows = (await session.execute(select(Assignment.member_id, Assignment.task_id))).all()
+    counts = {}
+    for pair in rows:
+        counts[tuple(pair)] = counts.get(tuple(pair), 0) + 1
+    return counts
+
+@pytest.mark.asyncio
+async def test_shuffles_keep_stats_in_step(db_session, household, member_factory, task_factory):
+    await member_factory(count=3)
+    await task_factory(count=2)
+    
+    # Reshuffling the same week replaces its rows; the counters follow
+    for _ in range(4):
+        await shuffle_assignments(db_session, household.id)
+    
+    stats = await stats_by_pair(db_session)
+    expected = await counts_from_assignments(db_session)
+    assert {pair: count for pair, (count, _) in stats.items() if count} == expected
+    assert all(
+        last == get_current_yearweek() for count, last in stats.values() if count
+    )
+    assert all(last is None for count, last in stats.values() if not count)
+
+@pytest.mark.asyncio
+async def test_removing_a_week_restores_the_previous_last_week(db_session, household, member_factory, task_factory):
+    member, = await member_factory(count=1)
+    task, = await task_factory(count=1)
+    
+    def row(year, week):
+        return {
+            "household_id": household.id, "member_id": member.id, "task_id": task.id,
+            "week_number": week, "year": year, "yearweek": pack_yearweek(year, week),
+        }
+    
+    await replace_assignments(db_session, household.id, [(5, 2025)], [row(2025, 5)])
+    await replace_assignments(db_session, household.id, [(6, 2025)], [row(2025, 6)])
+    assert (await stats_by_pair(db_session))[member.id, task.id] == (2, 202506)
+    
+    await replace_assignments(db_session, household.id, [(6, 2025)], [])
+    assert (await stats_by_pair(db_session))[member.id, task.id] == (1, 202505)
+
+@pytest.mark.asyncio
+async def test_backfill_counts_raw_and_rolled_up_weeks_once(db_engine, db_session, household, member_factory, task_factory):
+    member, = await member_factory(count=1)
+    task, = await task_factory(count=1)
+    await db_session.execute(insert(Assignment), [{
+        "household_id": household.id, "member_id": member.id, "task_id": task.id,
+        "week_number": 3, "year": 2025, "yearweek": 202503,
+    }])
+    db_session.add(AssignmentSummary(
+        household_id=household.id, member_id=member.id, task_id=task.id,
+        year=2023, times_assigned=4, last_yearweek=202340
+    ))
+    await db_session.commit()
+    
+    session_factory = async_sessionmaker(db_engine, expire_on_commit=False)
+    assert await backfill_stats(session_factory) == 1
+    assert await backfill_stats(session_factory) == 0
+    assert (await stats_by_pair(db_session))[member.id, task.id] == (5, 202503)
+    
+    rows = await get_household_stats(db_session, household.id, 202503)
+    assert rows == [(member.name, task.name, 5, 202503)]
+    text = format_stats(rows)
+    assert "2025-W03" in text and "5×" in text
+@pytest.mark.asyncio
+async def test_stats_leave_out_planned_weeks(db_session, household, member_factory, task_factory):
+    await member_factory(count=2)
+    await task_factory(count=2)
+    
+    # A fresh household with only planned weeks has no stats yet
+    assert await precompute_assignments(db_session, household.id, weeks=2)
+    current = get_current_yearweek()
+    assert await get_household_stats(db_session, household.id, current) == []
+    
+    await shuffle_assignments(db_session, household.id)
+    rows = await get_household_stats(db_session, household.id, current)
+    assert sum(count for _, _, count, _ in rows) == 2
+    assert all(last == current for *_, last in rows)
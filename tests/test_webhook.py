@@ -0,0 +1,69 @@
+import asyncio
+import pytest
+from aiogram import Bot, Dispatcher, Router
+from aiogram.types import Message
+from aiohttp.test_utils import TestClient, TestServer
+
+from config import config
+from webhook import create_app
+
+def make_update(update_id: int, text: str = "hi") -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": 1, "type": "private"},
+            "from": {"id": 1, "is_bot": False, "first_name": "Test"},
+            "text": text,
+        },
+    }
+
+@pytest.fixture
+def webhook_config(monkeypatch):
+    monkeypatch.setattr(config, "WEBHOOK_PATH", "/webhook")
+    monkeypatch.setattr(config, "WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(config, "WEBHOOK_MAX_IN_FLIGHT", 1)
+
+@pytest.mark.asyncio
+async def test_webhook_rejects_bad_secret(webhook_config):
+    dp = Dispatcher()
+    bot = Bot(token="42:TEST")
+    
+    async with TestClient(TestServer(create_app(dp, bot))) as client:
+        response = await client.post("/webhook", json=make_update(1))
+        assert response.status == 401
+        # Metrics are not exposed on the public listener
+        assert (await client.get(config.METRICS_PATH)).status == 404
+
+@pytest.mark.asyncio
+async def test_webhook_acks_fast_and_bounds_in_flight(webhook_config):
+    release = asyncio.Event()
+    handled = []
+    router = Router()
+    
+    @router.message()
+    async def on_message(message: Message):
+        handled.append(message.message_id)
+        await release.wait()
+    
+    dp = Dispatcher()
+    dp.include_router(router)
+    bot = Bot(token="42:TEST")
+    headers = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+    
+    async with TestClient(TestServer(create_app(dp, bot))) as client:
+        # Answered while the handler is still running
+        first = await client.post("/webhook", json=make_update(1), headers=headers)
+        assert first.status == 200
+        
+        # The only slot is busy, so the next request waits
+        second = asyncio.create_task(client.post("/webhook", json=make_update(2), headers=headers))
+        await asyncio.sleep(0.05)
+        assert not second.done()
+        assert handled == [1]
+        
+        release.set()
+        assert (await second).status == 200
+        await asyncio.sleep(0.05)
+        assert handled == [1, 2]
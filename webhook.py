@@ -0,0 +1,93 @@
+import asyncio
+import logging
+from typing import Any
+
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedRequestHandler(SimpleRequestHandler):
+    """
+    Webhook handler that answers Telegram right away and processes updates
+    in background tasks, with at most `max_in_flight` running at once.
+    When the limit is reached new requests wait for a free slot, which pushes
+    back on Telegram instead of piling up unbounded tasks.
+    """
+    
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, max_in_flight: int, **kwargs: Any):
+        super().__init__(dispatcher, bot, handle_in_background=True, **kwargs)
+        self._slots = asyncio.Semaphore(max_in_flight)
+    
+    @property
+    def in_flight(self) -> int:
+        return len(self._background_feed_update_tasks)
+    
+    async def _handle_request_background(self, bot: Bot, request: web.Request) -> web.Response:
+        update = await request.json(loads=bot.session.json_loads)
+        await self._slots.acquire()
+        task = asyncio.create_task(self._process_update(bot, update))
+        self._background_feed_update_tasks.add(task)
+        task.add_done_callback(self._background_feed_update_tasks.discard)
+        return web.json_response({}, dumps=bot.session.json_dumps)
+    
+    async def _process_update(self, bot: Bot, update: dict[str, Any]) -> None:
+        try:
+            await self._background_feed_update(bot, update)
+        except Exception:
+            logger.exception("Failed to process webhook update")
+        finally:
+            self._slots.release()
+    
+    async def close(self) -> None:
+        """Let in-flight updates finish before closing the bot session."""
+        if self._background_feed_update_tasks:
+            await asyncio.wait(self._background_feed_update_tasks, timeout=10)
+        await super().close()
+
+
+def create_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    """Build the aiohttp application that receives webhook updates."""
+    app = web.Application()
+    handler = BoundedRequestHandler(
+        dp,
+        bot,
+        max_in_flight=config.WEBHOOK_MAX_IN_FLIGHT,
+        secret_token=config.WEBHOOK_SECRET
+    )
+    handler.register(app, path=config.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def register_webhook(bot: Bot, dispatcher: Dispatcher) -> None:
+    """Point Telegram at our public webhook URL."""
+    url = config.WEBHOOK_BASE_URL.rstrip("/") + config.WEBHOOK_PATH
+    await bot.set_webhook(
+        url,
+        secret_token=config.WEBHOOK_SECRET,
+        allowed_updates=dispatcher.resolve_used_update_types(),
+        max_connections=min(config.WEBHOOK_MAX_IN_FLIGHT, 100)
+    )
+    logger.info(f"Webhook registered at {url}")
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Serve webhook updates until cancelled."""
+    dp.startup.register(register_webhook)
+    app = create_app(dp, bot)
+    
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, config.WEB_SERVER_HOST, config.WEB_SERVER_PORT)
+    await site.start()
+    logger.info(f"Listening for webhook updates on {config.WEB_SERVER_HOST}:{config.WEB_SERVER_PORT}")
+    
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()